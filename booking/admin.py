@@ -1,17 +1,230 @@
 from django.contrib import admin
-from .models import TravelOption, Booking
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.html import format_html
+from .models import (
+    TravelOption, Booking, SeatHold, WaitlistEntry, OutboxEvent, BookingRollup, ArchivedTravelOption,
+    ArchivedBooking, RequestProfile,
+)
+from .analytics import booking_analytics
+from .autocomplete import city_index
+from .pagination import EstimatedCountPaginator
+from .profiling import summary
+
+DASHBOARD_PERIODS = [7, 30, 90, 365]
+
+
+class CityFilter(admin.SimpleListFilter):
+    """City facet read from the in-memory city index instead of a DISTINCT over the table"""
+    
+    def lookups(self, request, model_admin):
+        if not city_index.ready:
+            city_index.rebuild()
+        keys, display = city_index.snapshot
+        return [(key, display[key]) for key in keys]
+    
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(**{self.parameter_name: self.value()})
+        return queryset
+
+
+class SourceFilter(CityFilter):
+    title = 'source'
+    parameter_name = 'source_key'
+
+
+class DestinationFilter(CityFilter):
+    title = 'destination'
+    parameter_name = 'destination_key'
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """Changelist settings whose cost does not grow with the table"""
+    paginator = EstimatedCountPaginator
+    # Skips the second, unfiltered COUNT(*) behind "N results (M total)".
+    show_full_result_count = False
+
 
 @admin.register(TravelOption)
-class TravelOptionAdmin(admin.ModelAdmin):
-    list_display = ['travel_id', 'type', 'source', 'destination', 'date_time', 'price', 'available_seats']
-    list_filter = ['type', 'source', 'destination', 'date_time']
-    search_fields = ['source', 'destination']
-    ordering = ['date_time']
+class TravelOptionAdmin(ScalableAdmin):
+    list_display = ['travel_id', 'type', 'source', 'destination', 'date_time', 'arrival_time', 'price', 'available_seats', 'capacity']
+    list_filter = ['type', SourceFilter, DestinationFilter, 'date_time']
+    # Prefix matches on the indexed city keys; also serves the booking autocompletes.
+    search_fields = ['^source_key', '^destination_key']
+    # Ends in the primary key so the admin does not append a tie-breaker the index lacks.
+    ordering = ['date_time', 'travel_id']
 
 @admin.register(Booking)
-class BookingAdmin(admin.ModelAdmin):
+class BookingAdmin(ScalableAdmin):
     list_display = ['booking_id', 'user', 'travel_option', 'number_of_seats', 'total_price', 'booking_date', 'status']
+    list_select_related = ['user', 'travel_option']
     list_filter = ['status', 'booking_date']
-    search_fields = ['user__username', 'travel_option__source', 'travel_option__destination']
+    search_fields = ['=user__username', '^travel_option__source_key', '^travel_option__destination_key']
+    autocomplete_fields = ['user', 'travel_option']
     readonly_fields = ['booking_date']
-    ordering = ['-booking_date']
+    ordering = ['-booking_date', '-booking_id']
+
+
+@admin.register(SeatHold)
+class SeatHoldAdmin(ScalableAdmin):
+    list_display = ['hold_id', 'user', 'travel_option', 'number_of_seats', 'total_price', 'created_at', 'expires_at']
+    list_select_related = ['user', 'travel_option']
+    autocomplete_fields = ['user', 'travel_option']
+    ordering = ['expires_at', 'hold_id']
+
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(ScalableAdmin):
+    list_display = ['entry_id', 'user', 'travel_option', 'number_of_seats', 'status', 'created_at', 'promoted_at']
+    list_select_related = ['user', 'travel_option']
+    list_filter = ['status']
+    autocomplete_fields = ['user', 'travel_option']
+    raw_id_fields = ['hold']
+    ordering = ['-created_at', '-entry_id']
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(ScalableAdmin):
+    list_display = ['event_id', 'topic', 'travel_option_id', 'status', 'attempts', 'created_at', 'processed_at']
+    list_filter = ['status', 'topic']
+    search_fields = ['=travel_option_id']
+    ordering = ['-event_id']
+    actions = ['retry_events']
+    
+    @admin.action(description='Retry selected events')
+    def retry_events(self, request, queryset):
+        retried = queryset.exclude(status='done').update(
+            status='pending', attempts=0, available_at=timezone.now(), locked_until=None,
+        )
+        self.message_user(request, f'{retried} events queued for retry.')
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(ScalableAdmin):
+    """Profiles stored by ``ProfilingMiddleware``; the stats and query log download as files"""
+    list_display = ['profile_id', 'view_name', 'method', 'status_code', 'duration_ms', 'db_queries', 'db_ms', 'user', 'created_at']
+    list_select_related = ['user']
+    list_filter = ['view_name']
+    search_fields = ['^path']
+    ordering = ['-created_at', '-profile_id']
+    exclude = ['stats', 'queries']
+    readonly_fields = ['downloads', 'slowest_queries', 'top_functions']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def get_urls(self):
+        return [
+            path('<int:profile_id>/stats/', self.admin_site.admin_view(self.download_stats), name='booking_requestprofile_stats'),
+            path('<int:profile_id>/queries/', self.admin_site.admin_view(self.download_queries), name='booking_requestprofile_queries'),
+        ] + super().get_urls()
+    
+    def download_stats(self, request, profile_id):
+        """The pstats dump, for ``python -m pstats`` or snakeviz"""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        profile = get_object_or_404(RequestProfile, profile_id=profile_id)
+        response = HttpResponse(bytes(profile.stats), content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="profile-{profile_id}.pstats"'
+        return response
+    
+    def download_queries(self, request, profile_id):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        profile = get_object_or_404(RequestProfile, profile_id=profile_id)
+        response = JsonResponse(profile.queries, safe=False, json_dumps_params={'indent': 2})
+        response['Content-Disposition'] = f'attachment; filename="profile-{profile_id}-queries.json"'
+        return response
+    
+    @admin.display(description='Downloads')
+    def downloads(self, obj):
+        return format_html(
+            '<a href="{}">pstats</a> &middot; <a href="{}">query log</a>',
+            reverse('admin:booking_requestprofile_stats', args=[obj.profile_id]),
+            reverse('admin:booking_requestprofile_queries', args=[obj.profile_id]),
+        )
+    
+    @admin.display(description='Slowest queries')
+    def slowest_queries(self, obj):
+        slowest = sorted(obj.queries, key=lambda query: -query['duration_ms'])[:10]
+        return format_html('<pre>{}</pre>', '\n\n'.join(
+            f"{query['duration_ms']:.2f} ms  {query['caller'] or '?'}\n{query['sql']}" for query in slowest
+        ))
+    
+    @admin.display(description='Top functions (cumulative)')
+    def top_functions(self, obj):
+        return format_html('<pre>{}</pre>', summary(obj.stats))
+
+
+class ArchiveAdmin(ScalableAdmin):
+    """Read-only history; rows only arrive through ``archive_departed``"""
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedTravelOption)
+class ArchivedTravelOptionAdmin(ArchiveAdmin):
+    list_display = ['travel_id', 'type', 'source', 'destination', 'date_time', 'price', 'available_seats', 'capacity', 'archived_at']
+    list_filter = ['type', 'date_time']
+    search_fields = ['=travel_id']
+    ordering = ['-date_time', '-travel_id']
+
+
+@admin.register(ArchivedBooking)
+class ArchivedBookingAdmin(ArchiveAdmin):
+    list_display = ['booking_id', 'user', 'travel_option', 'number_of_seats', 'total_price', 'booking_date', 'status']
+    list_select_related = ['user', 'travel_option']
+    list_filter = ['status']
+    search_fields = ['=user__username', '=booking_id']
+    ordering = ['-booking_id']
+
+
+@admin.register(BookingRollup)
+class BookingRollupAdmin(admin.ModelAdmin):
+    """Bookings dashboard; reads only the rollups, never ``Booking``"""
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+    
+    def changelist_view(self, request, extra_context=None):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        try:
+            days = int(request.GET.get('days', 30))
+        except ValueError:
+            days = 30
+        if days not in DASHBOARD_PERIODS:
+            days = 30
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Booking analytics',
+            'opts': self.model._meta,
+            'days': days,
+            'periods': DASHBOARD_PERIODS,
+            'totals': booking_analytics.totals(days),
+            'daily': booking_analytics.daily(days),
+            'routes': booking_analytics.routes(days),
+            **(extra_context or {}),
+        }
+        return TemplateResponse(request, 'admin/booking/bookingrollup/dashboard.html', context)
@@ -0,0 +1,225 @@
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, F, Max, Min, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from .models import ArchivedBooking, Booking, BookingRollup, OutboxEvent, TravelOption
+from .outbox import ROLLUP, handler
+
+ROLLUP_TOTALS = ['bookings', 'seats', 'revenue', 'cancellations', 'cancelled_seats', 'cancelled_revenue']
+ROUTE_COLUMNS = ['type', 'source', 'destination', 'source_key', 'destination_key']
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+MONEY_TOTALS = {'revenue', 'cancelled_revenue'}
+# Archived bookings join ``ArchivedTravelOption``, which has the same route columns.
+BOOKING_TABLES = (Booking, ArchivedBooking)
+
+
+def booking_totals():
+    """Aggregates of a ``Booking`` queryset matching ``ROLLUP_TOTALS``"""
+    cancelled = Q(status='cancelled')
+    return {
+        'bookings': Count('booking_id'),
+        'seats': Coalesce(Sum('number_of_seats'), 0),
+        'revenue': Coalesce(Sum('total_price'), Value(Decimal('0')), output_field=MONEY),
+        'cancellations': Count('booking_id', filter=cancelled),
+        'cancelled_seats': Coalesce(Sum('number_of_seats', filter=cancelled), 0),
+        'cancelled_revenue': Coalesce(Sum('total_price', filter=cancelled), Value(Decimal('0')), output_field=MONEY),
+    }
+
+
+def rollup_totals():
+    """Sums of ``ROLLUP_TOTALS`` over rollup rows"""
+    return {
+        name: Coalesce(Sum(name), Value(Decimal('0')), output_field=MONEY) if name in MONEY_TOTALS else Coalesce(Sum(name), 0)
+        for name in ROLLUP_TOTALS
+    }
+
+
+def with_rates(row):
+    """Add net seats, net revenue and the cancellation rate to a totals row"""
+    row['net_seats'] = row['seats'] - row['cancelled_seats']
+    row['net_revenue'] = row['revenue'] - row['cancelled_revenue']
+    row['cancellation_rate'] = row['cancellations'] / row['bookings'] * 100 if row['bookings'] else 0.0
+    return row
+
+
+class BookingAnalytics:
+    """Maintains ``BookingRollup`` from booking events and reads it back.
+
+    Bookings queue rollup events in their own transaction, so a rolled back
+    booking leaves no trace; the outbox worker turns them into per-cell
+    deltas applied with ``F()`` increments, away from the bookers' hot rows.
+    """
+
+    def _routes(self, bookings):
+        """Route columns of each booking's option, loading those not cached in one query"""
+        routes, missing = {}, set()
+        for booking in bookings:
+            if Booking.travel_option.is_cached(booking):
+                option = booking.travel_option
+                routes[option.travel_id] = {name: getattr(option, name) for name in ROUTE_COLUMNS}
+            else:
+                missing.add(booking.travel_option_id)
+        if missing - set(routes):
+            for row in TravelOption.objects.filter(travel_id__in=missing - set(routes)).values('travel_id', *ROUTE_COLUMNS):
+                routes[row.pop('travel_id')] = row
+        return routes
+
+    def events(self, bookings, cancelled_only=False):
+        """JSON payloads counting ``bookings``, or only their cancellation"""
+        bookings = list(bookings)
+        routes = self._routes(bookings)
+        return [
+            {
+                'booking_id': booking.booking_id,
+                'day': timezone.localdate(booking.booking_date).isoformat(),
+                **routes[booking.travel_option_id],
+                'seats': booking.number_of_seats,
+                'revenue': str(booking.total_price),
+                'booked': not cancelled_only,
+                'cancelled': cancelled_only or booking.status == 'cancelled',
+            }
+            for booking in bookings
+        ]
+
+    def _deltas(self, events):
+        deltas, labels = defaultdict(Counter), {}
+        for event in events:
+            key = (date.fromisoformat(event['day']), event['type'], event['source_key'], event['destination_key'])
+            labels[key] = (event['source'], event['destination'])
+            seats, revenue = event['seats'], Decimal(event['revenue'])
+            delta = deltas[key]
+            if event['booked']:
+                delta.update(bookings=1, seats=seats, revenue=revenue)
+            if event['cancelled']:
+                delta.update(cancellations=1, cancelled_seats=seats, cancelled_revenue=revenue)
+        return deltas, labels
+
+    def apply(self, deltas, labels):
+        """Add ``{(day, type, source_key, destination_key): Counter}`` to the rollups"""
+        for key, delta in deltas.items():
+            day, travel_type, source_key, destination_key = key
+            cell = BookingRollup.objects.filter(day=day, type=travel_type, source_key=source_key, destination_key=destination_key)
+            increments = {name: F(name) + value for name, value in delta.items()}
+            if cell.update(**increments):
+                continue
+            source, destination = labels[key]
+            try:
+                with transaction.atomic():
+                    BookingRollup.objects.create(
+                        day=day, type=travel_type, source_key=source_key, destination_key=destination_key,
+                        source=source, destination=destination, **delta,
+                    )
+            except IntegrityError:
+                # Another booker created the cell first.
+                cell.update(**increments)
+
+    def apply_events(self, events):
+        self.apply(*self._deltas(events))
+
+    def bookings_created(self, bookings):
+        """Count new bookings now; those created already cancelled count as cancellations too"""
+        self.apply_events(self.events(bookings))
+
+    def backfill(self, chunk_size=10000, on_chunk=None):
+        """Recompute every rollup from ``Booking`` and ``ArchivedBooking`` in booking id chunks.
+
+        Archived bookings keep their ids, so each chunk counts the live and
+        the archived rows in its id range and a booking archived mid-run is
+        counted once, on whichever side it was when its chunk was locked.
+        Rollups are cleared first and the high-water booking id is taken
+        afterwards; later bookings are counted by their own events. Each
+        chunk is read in one transaction with its bookings locked, so no
+        cancellation lands halfway. That transaction drops the chunk's
+        queued events, which the recount covers, and takes back the events
+        the worker applied since the rollups were cleared. Returns the
+        number of bookings read.
+        """
+        with transaction.atomic():
+            # Wait out workers applying rollup events, so every event applied
+            # to the cleared rollups is stamped after ``started``.
+            list(OutboxEvent.objects.select_for_update().filter(topic=ROLLUP, status='pending').values_list('pk'))
+            started = timezone.now()
+            BookingRollup.objects.all().delete()
+            high_water = max(model.objects.aggregate(last=Max('booking_id'))['last'] or 0 for model in BOOKING_TABLES)
+        last = read = 0
+        while last < high_water:
+            upper = min(last + chunk_size, high_water)
+            with transaction.atomic():
+                read += self._backfill_chunk(last, upper, started)
+            last = upper
+            if on_chunk:
+                on_chunk(last, high_water, read)
+        return read
+
+    def _backfill_chunk(self, last, upper, started):
+        """Recount bookings with ids in ``(last, upper]``; returns how many were read"""
+        list(Booking.objects.select_for_update().filter(booking_id__gt=last, booking_id__lte=upper).values_list('pk'))
+        events = OutboxEvent.objects.filter(
+            topic=ROLLUP, payload__booking_id__gt=last, payload__booking_id__lte=upper,
+        )
+        queued = list(events.select_for_update().filter(status='pending').values_list('pk', flat=True))
+        applied = list(events.filter(status='done', processed_at__gte=started).values_list('payload', flat=True))
+        OutboxEvent.objects.filter(pk__in=queued).update(status='done', processed_at=timezone.now())
+        # Archiving moves a booking under its row lock, so after the lock
+        # above it is in exactly one of the tables.
+        rows = [
+            row
+            for model in BOOKING_TABLES
+            for row in model.objects.filter(booking_id__gt=last, booking_id__lte=upper)
+            .annotate(day=TruncDate('booking_date'))
+            .values('day', 'travel_option__type', 'travel_option__source_key', 'travel_option__destination_key')
+            .annotate(
+                source=Min('travel_option__source'),
+                destination=Min('travel_option__destination'),
+                **booking_totals(),
+            )
+            .order_by()
+        ]
+        deltas, labels, read = defaultdict(Counter), {}, 0
+        for row in rows:
+            key = (row['day'], row['travel_option__type'], row['travel_option__source_key'], row['travel_option__destination_key'])
+            deltas[key].update({name: row[name] for name in ROLLUP_TOTALS})
+            labels[key] = (row['source'], row['destination'])
+            read += row['bookings']
+        # The recount already includes what those events added.
+        for key, delta in self._deltas(applied)[0].items():
+            deltas[key].subtract(delta)
+        self.apply(
+            {key: Counter({name: value for name, value in delta.items() if value}) for key, delta in deltas.items()},
+            labels,
+        )
+        return read
+
+    def period(self, days=30, end=None):
+        end = end or timezone.localdate()
+        return BookingRollup.objects.filter(day__gt=end - timedelta(days=days), day__lte=end)
+
+    def daily(self, days=30, end=None):
+        """Totals per booking day, newest first"""
+        rows = self.period(days, end).values('day').annotate(**rollup_totals()).order_by('-day')
+        return [with_rates(row) for row in rows]
+
+    def routes(self, days=30, end=None, limit=25):
+        """Routes with the most net revenue over the period"""
+        rows = (
+            self.period(days, end)
+            .values('source_key', 'destination_key')
+            .annotate(source=Min('source'), destination=Min('destination'), **rollup_totals())
+            .annotate(net=F('revenue') - F('cancelled_revenue'))
+            .order_by('-net', 'source_key', 'destination_key')[:limit]
+        )
+        return [with_rates(row) for row in rows]
+
+    def totals(self, days=30, end=None):
+        return with_rates(self.period(days, end).aggregate(**rollup_totals()))
+
+
+booking_analytics = BookingAnalytics()
+
+
+@handler(ROLLUP)
+def apply_rollup_events(events):
+    booking_analytics.apply_events(events)
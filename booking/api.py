@@ -0,0 +1,88 @@
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+
+# Fields partners may select with ``?fields=``; all of them by default.
+API_FIELDS = [
+    'travel_id', 'type', 'source', 'destination', 'date_time',
+    'price', 'available_seats', 'capacity', 'occupancy',
+]
+MAX_PAGE_SIZE = 50000
+CHUNK_SIZE = 1000
+# Rows encoded per chunk written to the client.
+FLUSH_ROWS = 200
+
+
+class InvalidFields(ValueError):
+    """Raised when ``fields`` names something outside ``API_FIELDS``"""
+
+
+def parse_fields(value):
+    """Return the requested output fields, in request order"""
+    if not value:
+        return list(API_FIELDS)
+    fields = list(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in API_FIELDS]
+    if unknown or not fields:
+        raise InvalidFields(', '.join(unknown))
+    return fields
+
+
+class SearchResultStream:
+    """Frame rows from a keyset stream as one JSON document.
+
+    Rows are ``values()`` dicts carrying the requested fields plus the
+    paginator's ordering keys. One row past ``limit`` is requested so the
+    trailing ``next`` cursor is only emitted when another page exists.
+    Iterate it synchronously under WSGI or with ``async for`` under ASGI;
+    either way it is written out ``FLUSH_ROWS`` rows at a time.
+    """
+
+    def __init__(self, paginator, fields, after=None, limit=1000, chunk_size=CHUNK_SIZE):
+        self.paginator = paginator
+        self.fields = fields
+        self.after = after
+        self.limit = limit
+        self.chunk_size = chunk_size
+        self.encoder = DjangoJSONEncoder(separators=(',', ':'))
+
+    def _row(self, row, first):
+        encoded = self.encoder.encode({name: row[name] for name in self.fields})
+        return encoded if first else ',' + encoded
+
+    def _end(self, last, more):
+        next_cursor = self.paginator.encode_cursor(last) if more else None
+        return '],"next":' + json.dumps(next_cursor) + '}'
+
+    def __iter__(self):
+        parts, count, last = ['{"results":['], 0, None
+        for row in self.paginator.stream(self.after, self.limit + 1, self.chunk_size):
+            if count == self.limit:
+                parts.append(self._end(last, True))
+                break
+            parts.append(self._row(row, count == 0))
+            count, last = count + 1, row
+            if len(parts) >= FLUSH_ROWS:
+                yield ''.join(parts)
+                parts = []
+        else:
+            parts.append(self._end(last, False))
+        yield ''.join(parts)
+
+    async def __aiter__(self):
+        rows = self.paginator.astream(self.after, self.limit + 1, self.chunk_size)
+        parts, count, last = ['{"results":['], 0, None
+        try:
+            async for row in rows:
+                if count == self.limit:
+                    parts.append(self._end(last, True))
+                    break
+                parts.append(self._row(row, count == 0))
+                count, last = count + 1, row
+                if len(parts) >= FLUSH_ROWS:
+                    yield ''.join(parts)
+                    parts = []
+            else:
+                parts.append(self._end(last, False))
+        finally:
+            await rows.aclose()
+        yield ''.join(parts)
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class BookingConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "booking"
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from .instrumentation import install_query_timer
+
+        connection_created.connect(install_query_timer, dispatch_uid="booking.install_query_timer")
+        # Registers the outbox handlers.
+        from . import analytics, notifications  # noqa: F401
@@ -0,0 +1,92 @@
+from datetime import timedelta
+from django.db import models, transaction
+from django.utils import timezone
+from .autocomplete import city_index
+from .models import ArchivedBooking, ArchivedTravelOption, Booking, SeatHold, TravelOption
+from .price_calendar import price_calendar
+from .routes import route_graph
+from .search_cache import search_cache
+
+OPTION_COLUMNS = [
+    'travel_id', 'type', 'source', 'destination', 'source_key', 'destination_key',
+    'date_time', 'arrival_time', 'price', 'available_seats', 'capacity',
+]
+BOOKING_COLUMNS = [
+    'booking_id', 'user_id', 'travel_option_id', 'number_of_seats', 'seat_numbers', 'total_price', 'booking_date',
+    'status',
+]
+
+
+def departed_before(days):
+    """Cutoff for options that departed more than ``days`` days ago"""
+    return timezone.now() - timedelta(days=days)
+
+
+def archive_batch(cutoff, batch_size=100, booking_chunk_size=2000):
+    """Move up to ``batch_size`` options departed before ``cutoff``, with their bookings.
+
+    Everything happens in one transaction, so a batch is either fully in the
+    archive or still fully live, and a rerun resumes after the last committed
+    batch. Options a checkout has locked are skipped until the next run.
+    Only the pages, calendar cells and index entries of the moved options
+    are touched, so live searches keep their caches while a run goes on.
+    Returns ``(options, bookings)`` moved.
+    """
+    archived_at = timezone.now()
+    with transaction.atomic():
+        travel_ids = list(
+            TravelOption.objects.select_for_update(skip_locked=True)
+            .filter(date_time__lt=cutoff)
+            .order_by('date_time', 'travel_id')
+            .values_list('travel_id', flat=True)[:batch_size]
+        )
+        if not travel_ids:
+            return 0, 0
+
+        options = list(TravelOption.objects.filter(travel_id__in=travel_ids).values(*OPTION_COLUMNS))
+        ArchivedTravelOption.objects.bulk_create(
+            [ArchivedTravelOption(archived_at=archived_at, **row) for row in options],
+            ignore_conflicts=True,
+        )
+        # Bookings are copied in booking id chunks so memory stays bounded.
+        bookings, last = 0, 0
+        while True:
+            rows = list(
+                Booking.objects.filter(travel_option_id__in=travel_ids, booking_id__gt=last)
+                .order_by('booking_id')
+                .values(*BOOKING_COLUMNS)[:booking_chunk_size]
+            )
+            if not rows:
+                break
+            ArchivedBooking.objects.bulk_create(
+                [ArchivedBooking(archived_at=archived_at, **row) for row in rows],
+                ignore_conflicts=True,
+            )
+            bookings += len(rows)
+            last = rows[-1]['booking_id']
+
+        Booking.objects.filter(travel_option_id__in=travel_ids).delete()
+        SeatHold.objects.filter(travel_option_id__in=travel_ids).delete()
+        # The queryset's own delete retires every cached page and rebuilds the
+        # indexes; departed options only need their own entries dropped.
+        models.QuerySet.delete(TravelOption.objects.filter(travel_id__in=travel_ids))
+        price_calendar.refresh(price_calendar.cells_of(options))
+        search_cache.options_removed(travel_ids)
+        city_index.discard([name for row in options for name in (row['source'], row['destination'])])
+        route_graph.options_removed(travel_ids)
+    return len(travel_ids), bookings
+
+
+def archive_departed(cutoff, batch_size=100, max_batches=None, on_batch=None):
+    """Archive departed options batch by batch; returns ``(options, bookings)`` moved"""
+    options = bookings = batches = 0
+    while max_batches is None or batches < max_batches:
+        moved_options, moved_bookings = archive_batch(cutoff, batch_size)
+        if not moved_options:
+            break
+        options += moved_options
+        bookings += moved_bookings
+        batches += 1
+        if on_batch:
+            on_batch(options, bookings)
+    return options, bookings
@@ -0,0 +1,172 @@
+import re
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent
+VENDOR_DIR = APP_DIR / 'vendor'
+STATIC_DIR = APP_DIR / 'static'
+
+# Vendored stylesheet -> trimmed copy under ``static``, as collected by ``collectstatic``.
+BUNDLES = {
+    'bootstrap.min.css': 'booking/vendor/bootstrap/bootstrap.min.css',
+    'fontawesome.min.css': 'booking/vendor/fontawesome/css/all.min.css',
+}
+
+# Files whose words may be class names: templates and form widget attrs.
+CLASS_SOURCES = [APP_DIR / 'templates', APP_DIR / 'forms.py']
+
+# Classes no source spells out: assembled in templates (``fa-{{ type }}``,
+# ``alert-{{ message.tags }}``) or toggled by Bootstrap's collapse and alert plugins.
+DYNAMIC_CLASSES = {
+    'fa-plane', 'fa-train', 'fa-bus',
+    'alert-success', 'alert-info', 'alert-warning', 'alert-danger',
+    'collapsing', 'collapsed', 'show',
+}
+
+# Grouping at-rules whose bodies are trimmed like the top level.
+GROUPING_RULES = {'@media', '@supports', '@container', '@layer'}
+
+STRING_OR_COMMENT = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|/\*.*?\*/', re.S)
+STRING = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'')
+CLASS_NAME = re.compile(r'\.((?:\\.|[\w-])+)')
+NEGATION = re.compile(r':not\([^()]*\)')
+WORD = re.compile(r'[\w-]+')
+CUSTOM_PROPERTY = re.compile(r'--[\w-]+:[^;}]*')
+KEYFRAMES = re.compile(r'@(?:-\w+-)?keyframes\s+(\S+)')
+
+
+def used_classes(sources=None):
+    """Every word of the class sources, plus ``DYNAMIC_CLASSES``"""
+    words = set(DYNAMIC_CLASSES)
+    for source in sources or CLASS_SOURCES:
+        for path in sorted(source.rglob('*')) if source.is_dir() else [source]:
+            if path.is_file():
+                words.update(WORD.findall(path.read_text(encoding='utf-8')))
+    return words
+
+
+def strip_comments(css):
+    """Drop comments outside strings; returns ``(css, banners)`` keeping ``/*!`` licence banners"""
+    banners = []
+
+    def replace(match):
+        text = match.group()
+        if not text.startswith('/*'):
+            return text
+        if text.startswith('/*!'):
+            banners.append(text)
+        return ''
+
+    return STRING_OR_COMMENT.sub(replace, css), banners
+
+
+def statements(css):
+    """Split CSS into top-level ``(prelude, body)`` pairs; ``body`` is None for ``@charset``-like statements"""
+    found, start, depth, position = [], 0, 0, 0
+    while position < len(css):
+        char = css[position]
+        if char in '"\'':
+            position = STRING.match(css, position).end()
+            continue
+        if char == '{':
+            if depth == 0:
+                brace = position
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                found.append((css[start:brace].strip(), css[brace + 1:position]))
+                start = position + 1
+        elif char == ';' and depth == 0:
+            found.append((css[start:position].strip(), None))
+            start = position + 1
+        position += 1
+    return found
+
+
+def selectors(prelude):
+    """Split a selector list on its top-level commas"""
+    parts, depth, start = [], 0, 0
+    for position, char in enumerate(prelude):
+        if char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            parts.append(prelude[start:position])
+            start = position + 1
+    parts.append(prelude[start:])
+    return [part.strip() for part in parts if part.strip()]
+
+
+def selector_used(selector, classes):
+    """Whether every class the selector requires is in ``classes``; negated classes are not required"""
+    return all(name.replace('\\', '') in classes for name in CLASS_NAME.findall(NEGATION.sub('', selector)))
+
+
+def trim_rules(css, classes):
+    kept = []
+    for prelude, body in statements(css):
+        if body is None:
+            kept.append(f'{prelude};')
+        elif prelude.startswith('@') and prelude.split('(')[0].split()[0].lower() in GROUPING_RULES:
+            inner = trim_rules(body, classes)
+            if inner:
+                kept.append(f'{prelude}{{{inner}}}')
+        elif prelude.startswith('@'):
+            kept.append(f'{prelude}{{{body}}}')
+        else:
+            used = [selector for selector in selectors(prelude) if selector_used(selector, classes)]
+            if used:
+                kept.append(f'{",".join(used)}{{{body}}}')
+    return ''.join(kept)
+
+
+def drop_unreferenced(css):
+    """Drop ``@keyframes`` and ``@font-face`` rules nothing else in ``css`` refers to"""
+    rules = statements(css)
+    # Custom properties only name fonts for classes that may have been trimmed away.
+    references = CUSTOM_PROPERTY.sub('', ''.join(
+        f'{prelude}{{{body}}}' for prelude, body in rules
+        if body is not None and not KEYFRAMES.match(prelude) and not prelude.startswith('@font-face')
+    ))
+    words = set(WORD.findall(references))
+    kept = []
+    for prelude, body in rules:
+        if body is None:
+            kept.append(f'{prelude};')
+            continue
+        keyframes = KEYFRAMES.match(prelude)
+        if keyframes and keyframes.group(1) not in words:
+            continue
+        if prelude.startswith('@font-face'):
+            family = re.search(r'font-family:\s*("[^"]*"|\'[^\']*\'|[^;}]+)', body)
+            if family and family.group(1).strip() not in references:
+                continue
+        kept.append(f'{prelude}{{{body}}}')
+    return ''.join(kept)
+
+
+def trim_css(css, classes):
+    """Keep the rules of ``css`` whose selectors only need ``classes``.
+
+    Selector lists are narrowed to their used selectors, emptied ``@media``
+    and similar blocks go, and so do keyframes and font faces left without
+    a user. Licence banners are kept; other comments, including source map
+    links, are dropped.
+    """
+    css, banners = strip_comments(css)
+    return '\n'.join(banners + [drop_unreferenced(trim_rules(css, classes))]) + '\n'
+
+
+def build(classes=None):
+    """Trim every vendored stylesheet into ``static``; returns ``{target: (source bytes, trimmed bytes)}``"""
+    classes = used_classes() if classes is None else classes
+    sizes = {}
+    for source, target in BUNDLES.items():
+        css = (VENDOR_DIR / source).read_text(encoding='utf-8')
+        trimmed = trim_css(css, classes)
+        path = STATIC_DIR / target
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(trimmed, encoding='utf-8', newline='\n')
+        sizes[target] = (len(css.encode()), len(trimmed.encode()))
+    return sizes
@@ -0,0 +1,80 @@
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from django.db import transaction
+from django.db.models import Count
+from .indexes import InMemoryIndex
+from .models import TravelOption, normalize_city
+from .search import prefix_range
+
+
+class CityIndex(InMemoryIndex):
+    """In-process prefix index of the city names travel options use.
+
+    Lookups bisect a sorted list of case-folded keys and never touch the
+    database. Inserts, edits and deletes made by this process are applied
+    incrementally once committed; a full rebuild runs in a background thread
+    when the index is older than ``AUTOCOMPLETE_REFRESH_SECONDS`` so writes
+    from other processes (and bulk changes) show up as well.
+    """
+
+    refresh_setting = 'AUTOCOMPLETE_REFRESH_SECONDS'
+
+    def __init__(self):
+        super().__init__()
+        # key -> Counter of spellings, weighted by how many options use them
+        self.spellings = {}
+        # (sorted keys, key -> display name), swapped as a whole on every change
+        self.snapshot = ([], {})
+
+    def _publish(self):
+        display = {key: counts.most_common(1)[0][0] for key, counts in self.spellings.items()}
+        self.snapshot = (sorted(display), display)
+
+    def rebuild(self):
+        """Reload every source and destination spelling from the database"""
+        spellings = defaultdict(Counter)
+        for column in ('source', 'destination'):
+            rows = TravelOption.objects.order_by().values_list(column).annotate(options=Count('travel_id'))
+            for name, options in rows:
+                spellings[normalize_city(name)][name] += options
+        with self.lock:
+            self.spellings = dict(spellings)
+            self._publish()
+            self.mark_built()
+
+    def _apply(self, names, delta):
+        if not self.ready:
+            return
+        with self.lock:
+            for name in names:
+                key = normalize_city(name)
+                counts = self.spellings.setdefault(key, Counter())
+                counts[name] += delta
+                if counts[name] <= 0:
+                    del counts[name]
+                if not counts:
+                    del self.spellings[key]
+            self._publish()
+
+    def add(self, names):
+        """Count ``names`` once committed, e.g. the cities of new options"""
+        transaction.on_commit(lambda: self._apply(names, 1))
+
+    def discard(self, names):
+        """Uncount ``names`` once committed"""
+        transaction.on_commit(lambda: self._apply(names, -1))
+
+    def suggest(self, prefix, limit=10):
+        """City names starting with ``prefix``, case-insensitively, in key order"""
+        self.refresh_if_stale()
+        key = normalize_city(prefix)
+        if not key:
+            return []
+        keys, display = self.snapshot
+        low, high = prefix_range(key)
+        start = bisect_left(keys, low)
+        end = bisect_left(keys, high, start, min(len(keys), start + limit))
+        return [display[key] for key in keys[start:end]]
+
+
+city_index = CityIndex()
@@ -0,0 +1,41 @@
+import hashlib
+from django.contrib import messages
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+class PageValidators:
+    """ETag and Last-Modified of a rendered page, for answering conditional GETs with 304.
+
+    The ETag hashes the data ``parts`` the page was built from together with
+    the full path and the user, since pages greet the signed-in user.
+    Pages with messages waiting to be shown get no validators: a 304 would
+    leave the messages undelivered. List pages pass no ``last_modified``,
+    since the newest row on a page gets older when a row drops off it; they
+    are validated by the ETag alone. Responses are ``private, no-cache`` so
+    browsers revalidate instead of guessing freshness from Last-Modified.
+    Needs ``request.user`` already resolved.
+    """
+
+    def __init__(self, request, last_modified, *parts):
+        self.last_modified = int(last_modified.timestamp()) if last_modified else None
+        self.etag = None
+        if not len(messages.get_messages(request)):
+            raw = repr((request.user.pk, request.get_full_path(), last_modified, parts))
+            self.etag = quote_etag(hashlib.sha1(raw.encode()).hexdigest())
+
+    def not_modified(self, request):
+        """A 304 response if the client's copy is current, else None"""
+        if self.etag is None:
+            return None
+        response = get_conditional_response(request, etag=self.etag, last_modified=self.last_modified)
+        return self.apply(response) if response is not None else None
+
+    def apply(self, response):
+        patch_vary_headers(response, ['Cookie'])
+        patch_cache_control(response, private=True, no_cache=True)
+        if self.etag is not None:
+            response.headers.setdefault('ETag', self.etag)
+            if self.last_modified:
+                response.headers.setdefault('Last-Modified', http_date(self.last_modified))
+        return response
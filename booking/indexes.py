@@ -0,0 +1,51 @@
+import threading
+import time
+from django.conf import settings
+from django.db import connection
+
+
+class InMemoryIndex:
+    """Base for in-process indexes derived from the travel option catalogue.
+
+    Subclasses implement ``rebuild()`` and call ``mark_built()`` when the new
+    data is in place. Once the index is older than the ``refresh_setting``
+    seconds, the next ``refresh_if_stale()`` starts a rebuild in a daemon
+    thread while the current data keeps serving lookups.
+    """
+
+    refresh_setting = None
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.built_at = None
+        self.rebuilding = False
+
+    @property
+    def ready(self):
+        return self.built_at is not None
+
+    def mark_built(self):
+        self.built_at = time.monotonic()
+
+    def rebuild(self):
+        raise NotImplementedError
+
+    def _rebuild_in_background(self):
+        try:
+            self.rebuild()
+        finally:
+            self.rebuilding = False
+            connection.close()
+
+    def refresh_if_stale(self):
+        if not self.ready or self.rebuilding:
+            return
+        if time.monotonic() - self.built_at < getattr(settings, self.refresh_setting):
+            return
+        self.rebuilding = True
+        threading.Thread(target=self._rebuild_in_background, daemon=True).start()
+
+    def invalidate(self):
+        """Schedule a background rebuild on the next lookup"""
+        if self.ready:
+            self.built_at = float('-inf')
@@ -0,0 +1,243 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.template.backends.django import DjangoTemplates
+
+# Seconds; roughly exponential so both cache hits and slow searches resolve.
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+current_metrics = ContextVar('current_request_metrics', default=None)
+# Set by ``booking.profiling`` for the requests it profiles.
+current_capture = ContextVar('current_profile_capture', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('started', 'view_seconds', 'db_seconds', 'db_queries', 'template_seconds')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_seconds = 0.0
+        self.db_seconds = 0.0
+        self.db_queries = 0
+        self.template_seconds = 0.0
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper adding query time to the active request and profile"""
+    metrics = current_metrics.get()
+    capture = current_capture.get()
+    if metrics is None and capture is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        if metrics is not None:
+            metrics.db_seconds += elapsed
+            metrics.db_queries += 1
+        if capture is not None:
+            capture.query(sql, many, elapsed)
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """connection_created receiver that hooks every new connection once"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class TimedTemplate:
+    """Wraps a backend template so its render time is charged to the request"""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        metrics = current_metrics.get()
+        if metrics is None:
+            return self.template.render(context, request)
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            metrics.template_seconds += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Django template backend that records top-level render time"""
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'total', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Per-URL-name request histograms kept in process memory"""
+
+    HISTOGRAMS = {
+        'request_duration_seconds': ('Wall time spent handling the request', DURATION_BUCKETS),
+        'view_duration_seconds': ('Time spent inside the view function', DURATION_BUCKETS),
+        'db_duration_seconds': ('Time spent executing SQL', DURATION_BUCKETS),
+        'template_duration_seconds': ('Time spent rendering templates', DURATION_BUCKETS),
+        'db_queries': ('SQL statements executed per request', QUERY_BUCKETS),
+    }
+
+    def __init__(self, namespace='travellykke'):
+        self.namespace = namespace
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def observe(self, view, metrics, total_seconds):
+        values = {
+            'request_duration_seconds': total_seconds,
+            'view_duration_seconds': metrics.view_seconds,
+            'db_duration_seconds': metrics.db_seconds,
+            'template_duration_seconds': metrics.template_seconds,
+            'db_queries': metrics.db_queries,
+        }
+        with self.lock:
+            histograms = self.views.get(view)
+            if histograms is None:
+                histograms = self.views[view] = {
+                    name: Histogram(buckets) for name, (_, buckets) in self.HISTOGRAMS.items()
+                }
+            for name, value in values.items():
+                histograms[name].observe(value)
+
+    def reset(self):
+        with self.lock:
+            self.views = {}
+
+    def render(self, extra_lines=()):
+        """Render all histograms in the Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            for name, (description, buckets) in self.HISTOGRAMS.items():
+                metric = f'{self.namespace}_{name}'
+                lines.append(f'# HELP {metric} {description}.')
+                lines.append(f'# TYPE {metric} histogram')
+                for view in sorted(self.views):
+                    histogram = self.views[view][name]
+                    label = view.replace('\\', '\\\\').replace('"', '\\"')
+                    cumulative = 0
+                    for bound, count in zip(buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f'{metric}_bucket{{view="{label}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{metric}_bucket{{view="{label}",le="+Inf"}} {histogram.count}')
+                    lines.append(f'{metric}_sum{{view="{label}"}} {histogram.total:.6f}')
+                    lines.append(f'{metric}_count{{view="{label}"}} {histogram.count}')
+        lines.extend(extra_lines)
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+class AsyncCapableMiddleware:
+    """Base for middleware that runs natively in both sync and async stacks"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.handle(request)
+
+
+class PerformanceMiddleware(AsyncCapableMiddleware):
+    """Record DB, view and template time per request.
+
+    Timings are emitted in a ``Server-Timing`` header and aggregated per URL
+    name into ``registry`` for the ``/metrics`` endpoint. Place it first in
+    ``MIDDLEWARE`` so the total covers the rest of the stack, and pair it with
+    ``ViewTimingMiddleware`` at the end.
+    """
+
+    def handle(self, request):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics):
+        total = time.perf_counter() - metrics.started
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name if match else None) or 'unmatched'
+        registry.observe(view, metrics, total)
+
+        response['Server-Timing'] = ', '.join([
+            f'db;desc="{metrics.db_queries} queries";dur={metrics.db_seconds * 1000:.2f}',
+            f'tpl;dur={metrics.template_seconds * 1000:.2f}',
+            f'view;dur={metrics.view_seconds * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+        return response
+
+
+class ViewTimingMiddleware(AsyncCapableMiddleware):
+    """Time the view itself; list it last in ``MIDDLEWARE``.
+
+    As the innermost middleware its ``get_response`` covers exactly the view
+    call and any ``TemplateResponse`` rendering.
+    """
+
+    def handle(self, request):
+        metrics = current_metrics.get()
+        if metrics is None:
+            return self.get_response(request)
+        started = time.perf_counter()
+        try:
+            return self.get_response(request)
+        finally:
+            metrics.view_seconds += time.perf_counter() - started
+
+    async def __acall__(self, request):
+        metrics = current_metrics.get()
+        if metrics is None:
+            return await self.get_response(request)
+        started = time.perf_counter()
+        try:
+            return await self.get_response(request)
+        finally:
+            metrics.view_seconds += time.perf_counter() - started
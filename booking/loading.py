@@ -0,0 +1,231 @@
+import csv
+import json
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import TravelOption, Booking
+
+# Fields refreshed when a schedule row matches an existing option. Seat counts
+# are left alone so reloading a schedule never undoes live bookings, and so is
+# capacity, which ``available_seats`` and the seat map are sized against; a
+# capacity change goes through the admin, which validates it against them.
+UPSERT_FIELDS = ['source', 'destination', 'arrival_time', 'price', 'updated_at']
+
+CITIES = [
+    ('New York', 10), ('Los Angeles', 9), ('Chicago', 8), ('Houston', 6), ('Phoenix', 5),
+    ('Philadelphia', 5), ('San Antonio', 3), ('San Diego', 4), ('Dallas', 6), ('San Jose', 3),
+    ('Austin', 4), ('Jacksonville', 2), ('San Francisco', 7), ('Columbus', 2), ('Charlotte', 3),
+    ('Indianapolis', 2), ('Seattle', 6), ('Denver', 5), ('Washington DC', 7), ('Boston', 6),
+    ('Nashville', 3), ('Detroit', 3), ('Portland', 3), ('Las Vegas', 5), ('Memphis', 2),
+    ('Louisville', 2), ('Baltimore', 3), ('Milwaukee', 2), ('Albuquerque', 1), ('Tucson', 1),
+    ('Sacramento', 2), ('Kansas City', 2), ('Atlanta', 7), ('Miami', 6), ('Minneapolis', 3),
+    ('New Orleans', 3), ('Cleveland', 2), ('Salt Lake City', 3), ('Orlando', 4), ('Pittsburgh', 2),
+]
+
+# (capacity range, price per "hop", typical departure hours, duration range in minutes)
+TRAVEL_PROFILES = {
+    'flight': ((120, 220), (90, 420), range(6, 23), (60, 360)),
+    'train': ((150, 400), (30, 160), range(5, 22), (120, 720)),
+    'bus': ((40, 60), (15, 80), range(0, 24), (120, 960)),
+}
+
+
+class RowError(ValueError):
+    """Raised when a schedule record cannot be turned into a travel option"""
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def read_records(handle, fmt):
+    """Yield schedule records as dicts from a CSV or JSON Lines file handle"""
+    if fmt == 'csv':
+        yield from csv.DictReader(handle)
+        return
+    for number, line in enumerate(handle, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as exc:
+            raise RowError(f'line {number}: {exc}') from exc
+
+
+def parse_moment(record, name):
+    """Read an aware datetime from ``record[name]``"""
+    value = record[name]
+    if not isinstance(value, datetime):
+        try:
+            value = parse_datetime(str(value).strip())
+        except ValueError:
+            value = None
+        if value is None:
+            raise RowError(f'invalid {name} {record[name]!r}')
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def parse_record(record):
+    """Build an unsaved TravelOption from a schedule record"""
+    try:
+        travel_type = str(record['type']).strip().lower()
+        source = str(record['source']).strip()
+        destination = str(record['destination']).strip()
+        date_time = record['date_time']
+        price = Decimal(str(record['price']))
+        available_seats = int(record['available_seats'])
+        capacity = record.get('capacity')
+        capacity = int(capacity) if capacity not in (None, '') else None
+        arrival_time = record.get('arrival_time') or None
+    except (KeyError, TypeError, ValueError, InvalidOperation) as exc:
+        raise RowError(f'invalid record {record!r}: {exc}') from exc
+
+    if travel_type not in dict(TravelOption.TRAVEL_TYPES):
+        raise RowError(f'unknown travel type {travel_type!r}')
+    if not source or not destination:
+        raise RowError('source and destination are required')
+    if available_seats < 0 or price < 0:
+        raise RowError('price and available_seats must not be negative')
+
+    date_time = parse_moment(record, 'date_time')
+    if arrival_time is not None:
+        arrival_time = parse_moment(record, 'arrival_time')
+        if arrival_time <= date_time:
+            raise RowError('arrival_time must be after date_time')
+
+    option = TravelOption(
+        type=travel_type,
+        source=source,
+        destination=destination,
+        date_time=date_time,
+        arrival_time=arrival_time,
+        price=price,
+        available_seats=available_seats,
+        capacity=capacity,
+    )
+    option.populate_derived_fields()
+    if option.available_seats > option.capacity:
+        raise RowError('available_seats exceeds capacity')
+    return option
+
+
+def upsert_options(options, batch_size=1000, on_batch=None, update=True):
+    """Insert or update travel options in batches keyed on their natural key.
+
+    Only one batch is held in memory at a time. With ``update=False`` rows
+    whose natural key already exists are skipped instead. Returns the number
+    of rows sent to the database.
+    """
+    conflict_options = {'ignore_conflicts': True}
+    if update:
+        conflict_options = {'update_conflicts': True, 'update_fields': UPSERT_FIELDS}
+        if connection.features.supports_update_conflicts_with_target:
+            conflict_options['unique_fields'] = TravelOption.NATURAL_KEY
+    written = 0
+    for batch in batched(options, batch_size):
+        # A batch may repeat a natural key; the last occurrence wins.
+        unique = {tuple(getattr(option, name) for name in TravelOption.NATURAL_KEY): option for option in batch}
+        with transaction.atomic():
+            TravelOption.objects.bulk_create(unique.values(), **conflict_options)
+        written += len(unique)
+        if on_batch:
+            on_batch(written)
+    return written
+
+
+def generate_options(count, seed, start=None, days=90, occupancy=0.35):
+    """Yield ``count`` realistic, reproducible travel options.
+
+    ``occupancy`` is the mean share of capacity already sold; the sold seats
+    are what ``generate_bookings`` later turns into booking rows.
+    """
+    rng = random.Random(seed)
+    start = start or timezone.now().replace(minute=0, second=0, microsecond=0)
+    names = [name for name, _ in CITIES]
+    weights = [weight for _, weight in CITIES]
+    types = list(TRAVEL_PROFILES)
+    durations = {}
+
+    for _ in range(count):
+        travel_type = rng.choices(types, weights=[3, 2, 4])[0]
+        (low_cap, high_cap), (low_price, high_price), hours, (shortest, longest) = TRAVEL_PROFILES[travel_type]
+        source, destination = rng.choices(names, weights=weights, k=2)
+        while destination == source:
+            destination = rng.choices(names, weights=weights)[0]
+        route = (travel_type, source, destination)
+        if route not in durations:
+            # Every departure on a route takes the same time.
+            durations[route] = timedelta(minutes=random.Random(':'.join(route)).randrange(shortest, longest, 5))
+
+        capacity = rng.randint(low_cap, high_cap)
+        sold = min(capacity, int(capacity * min(1.0, rng.betavariate(2, 2) * 2 * occupancy)))
+        departure = start + timedelta(
+            days=rng.randrange(days),
+            hours=rng.choice(hours) - start.hour,
+            minutes=rng.randrange(0, 60, 5),
+        )
+        yield TravelOption(
+            type=travel_type,
+            source=source,
+            destination=destination,
+            date_time=departure,
+            arrival_time=departure + durations[route],
+            price=Decimal(rng.uniform(low_price, high_price)).quantize(Decimal('0.01')),
+            capacity=capacity,
+            available_seats=capacity - sold,
+        )
+
+
+def generate_bookings(options, user_ids, seed, cancel_rate=0.05):
+    """Yield bookings that account for every sold seat of ``options``.
+
+    ``options`` yields ``(travel_id, price, capacity, available_seats,
+    date_time)`` tuples. A share of extra cancelled bookings is mixed in; they
+    do not hold seats.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    for travel_id, price, capacity, available_seats, date_time in options:
+        sold = capacity - available_seats
+        latest = min(now, date_time)
+        while sold > 0 or rng.random() < cancel_rate:
+            seats = rng.randint(1, 4)
+            status = 'cancelled' if sold <= 0 or rng.random() < cancel_rate else 'confirmed'
+            if status == 'confirmed':
+                seats = min(seats, sold)
+                sold -= seats
+            yield Booking(
+                user_id=rng.choice(user_ids),
+                travel_option_id=travel_id,
+                number_of_seats=seats,
+                total_price=price * seats,
+                booking_date=latest - timedelta(minutes=rng.randrange(60 * 24 * 60)),
+                status=status,
+            )
+
+
+def iter_option_rows(min_travel_id=0, chunk_size=2000):
+    """Walk travel options by primary key in bounded chunks"""
+    last = min_travel_id
+    while True:
+        rows = list(
+            TravelOption.objects.filter(travel_id__gt=last)
+            .order_by('travel_id')
+            .values_list('travel_id', 'price', 'capacity', 'available_seats', 'date_time')[:chunk_size]
+        )
+        if not rows:
+            return
+        yield from rows
+        last = rows[-1][0]
@@ -0,0 +1,35 @@
+import itertools
+import time
+from django.core.management.base import BaseCommand, CommandError
+from booking.archive import archive_departed, departed_before
+
+class Command(BaseCommand):
+    help = 'Move departed travel options and their bookings into the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=7, help='Archive options that departed this many days ago')
+        parser.add_argument('--batch-size', type=int, default=100, help='Options moved per transaction')
+        parser.add_argument('--max-batches', type=int, help='Stop after this many batches; rerun to resume')
+        parser.add_argument('--report-every', type=int, default=50, help='Batches between progress lines')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or options['older_than_days'] < 0:
+            raise CommandError('--batch-size must be positive and --older-than-days not negative')
+
+        started = time.perf_counter()
+        batches = itertools.count(1)
+
+        def on_batch(moved_options, moved_bookings):
+            if options['report_every'] and next(batches) % options['report_every'] == 0:
+                self.stdout.write(f'  {moved_options} options, {moved_bookings} bookings in {time.perf_counter() - started:.1f}s')
+
+        moved_options, moved_bookings = archive_departed(
+            departed_before(options['older_than_days']),
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches'],
+            on_batch=on_batch,
+        )
+        self.stdout.write(
+            f'Archived {moved_options} travel options and {moved_bookings} bookings '
+            f'in {time.perf_counter() - started:.2f}s'
+        )
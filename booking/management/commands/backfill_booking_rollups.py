@@ -0,0 +1,25 @@
+import itertools
+import time
+from django.core.management.base import BaseCommand, CommandError
+from booking.analytics import booking_analytics
+
+class Command(BaseCommand):
+    help = 'Rebuild the booking analytics rollups from live and archived bookings in id chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Booking ids aggregated per query')
+        parser.add_argument('--report-every', type=int, default=100, help='Chunks between progress lines')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+
+        started = time.perf_counter()
+        chunks = itertools.count(1)
+
+        def on_chunk(last, high_water, read):
+            if options['report_every'] and next(chunks) % options['report_every'] == 0:
+                self.stdout.write(f'  booking id {last}/{high_water}: {read} bookings in {time.perf_counter() - started:.1f}s')
+
+        read = booking_analytics.backfill(chunk_size=options['chunk_size'], on_chunk=on_chunk)
+        self.stdout.write(f'Rolled up {read} bookings in {time.perf_counter() - started:.2f}s')
@@ -0,0 +1,145 @@
+import json
+import random
+import time
+import tracemalloc
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from booking.loading import CITIES, generate_options, upsert_options
+from booking.models import TravelOption, normalize_city
+from booking.routes import LEG_COLUMNS, ConnectionQuery, route_graph
+from .benchmark_views import percentile
+
+
+class Command(BaseCommand):
+    help = 'Build the connection graph over a seeded catalogue and time multi-leg searches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--options', type=int, default=100000, help='Travel options to seed')
+        parser.add_argument('--days', type=int, default=30, help='Days the seeded departures are spread over')
+        parser.add_argument('--queries', type=int, default=500, help='Searches per sort order')
+        parser.add_argument('--max-legs', type=int, default=3)
+        parser.add_argument('--limit', type=int, default=5, help='Itineraries per search')
+        parser.add_argument('--updates', type=int, default=1000, help='Incremental option and seat updates to time')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--memory', action='store_true', help='Trace a second build to report graph memory')
+        parser.add_argument('--json', dest='json_path', help='Write results as JSON to this path ("-" for stdout)')
+        parser.add_argument('--use-existing-db', action='store_true', help='Benchmark the configured database without seeding')
+
+    def handle(self, *args, **options):
+        old_name = None
+        try:
+            if not options['use_existing_db']:
+                old_name = connection.settings_dict['NAME']
+                connection.creation.create_test_db(verbosity=0, autoclobber=True)
+                start = timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+                upsert_options(
+                    generate_options(options['options'], options['seed'], start=start, days=options['days']),
+                    5000, update=False,
+                )
+            results = self.run(options)
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.print_results(results)
+        if options['json_path'] == '-':
+            self.stdout.write(json.dumps(results, indent=2))
+        elif options['json_path']:
+            with open(options['json_path'], 'w') as handle:
+                json.dump(results, handle, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Wrote {options["json_path"]}'))
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        started = time.perf_counter()
+        route_graph.rebuild()
+        build_seconds = time.perf_counter() - started
+        legs = route_graph.graph[2]
+        if not legs:
+            raise CommandError('No upcoming travel options to build a graph from')
+
+        memory_mib = None
+        if options['memory']:
+            tracemalloc.start()
+            try:
+                route_graph.rebuild()
+                memory_mib = round(tracemalloc.get_traced_memory()[0] / 2 ** 20, 1)
+            finally:
+                tracemalloc.stop()
+
+        first = min(leg.departs_at for leg in legs.values()).date()
+        last = max(leg.departs_at for leg in legs.values()).date()
+        names = [name for name, _ in CITIES]
+        weights = [weight for _, weight in CITIES]
+        searches = {}
+        for sort in ('price', 'arrival'):
+            latencies, found, itineraries = [], 0, 0
+            for _ in range(options['queries']):
+                origin, destination = rng.choices(names, weights=weights, k=2)
+                while destination == origin:
+                    destination = rng.choices(names, weights=weights)[0]
+                query = ConnectionQuery(
+                    origin=normalize_city(origin),
+                    destination=normalize_city(destination),
+                    date=first + timedelta(days=rng.randrange((last - first).days + 1)),
+                    seats=1,
+                    max_legs=options['max_legs'],
+                    min_layover=timedelta(minutes=45),
+                    max_duration=timedelta(hours=24),
+                    sort=sort,
+                    limit=options['limit'],
+                )
+                started = time.perf_counter()
+                result = route_graph.search(query)
+                latencies.append((time.perf_counter() - started) * 1000)
+                found += bool(result)
+                itineraries += len(result)
+            latencies.sort()
+            searches[sort] = {
+                'queries': len(latencies),
+                'p50_ms': round(percentile(latencies, 0.50), 3),
+                'p95_ms': round(percentile(latencies, 0.95), 3),
+                'p99_ms': round(percentile(latencies, 0.99), 3),
+                'max_ms': round(latencies[-1], 3),
+                'found_ratio': round(found / len(latencies), 3),
+                'itineraries_mean': round(itineraries / len(latencies), 2),
+            }
+
+        # Incremental maintenance, applied directly as the commit hooks would.
+        travel_ids = rng.sample(list(legs), min(options['updates'], len(legs)))
+        rows = list(TravelOption.objects.filter(travel_id__in=travel_ids).values(*LEG_COLUMNS))
+        started = time.perf_counter()
+        route_graph._upsert(rows)
+        upsert_us = (time.perf_counter() - started) / max(len(rows), 1) * 1e6
+        started = time.perf_counter()
+        for travel_id in travel_ids:
+            route_graph._adjust_seats({travel_id: -1})
+        seats_us = (time.perf_counter() - started) / max(len(travel_ids), 1) * 1e6
+
+        return {
+            'graph': {
+                'legs': len(legs),
+                'cities': len(route_graph.graph[0]),
+                'build_s': round(build_seconds, 3),
+                'memory_mib': memory_mib,
+                'upsert_us': round(upsert_us, 1),
+                'seat_update_us': round(seats_us, 1),
+            },
+            'searches': searches,
+        }
+
+    def print_results(self, results):
+        graph = results['graph']
+        self.stdout.write(
+            f"graph: {graph['legs']} legs over {graph['cities']} cities built in {graph['build_s']:.2f}s"
+            + (f", {graph['memory_mib']} MiB" if graph['memory_mib'] is not None else '')
+        )
+        self.stdout.write(f"incremental: {graph['upsert_us']:.1f} us/option upsert, {graph['seat_update_us']:.1f} us/seat update")
+        self.stdout.write(f"{'sort':<10}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'found':>8}")
+        for sort, stats in results['searches'].items():
+            self.stdout.write(
+                f"{sort:<10}{stats['queries']:>6}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}"
+                f"{stats['p99_ms']:>10.2f}{stats['max_ms']:>10.2f}{stats['found_ratio']:>8.0%}"
+            )
@@ -0,0 +1,105 @@
+import threading
+import time
+from decimal import Decimal
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+from django.utils import timezone
+from booking.models import BookingRollup, OutboxEvent, TravelOption, Booking
+from booking.reservations import reserve_seats, SeatsUnavailable
+
+class Command(BaseCommand):
+    help = 'Hammer a single travel option with concurrent bookers and report bookings/sec'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bookers', type=int, default=50, help='Number of concurrent booking threads')
+        parser.add_argument('--seats', type=int, default=1000, help='Seats on the contended travel option')
+        parser.add_argument('--seats-per-booking', type=int, default=1)
+        parser.add_argument('--use-existing-db', action='store_true', help='Run against the configured database instead of a throwaway one')
+        parser.add_argument('--keep', action='store_true', help='With --use-existing-db, keep the benchmark option, users and events afterwards')
+
+    def handle(self, *args, **options):
+        bookers = options['bookers']
+        seats_per_booking = options['seats_per_booking']
+        if bookers < 1 or seats_per_booking < 1:
+            raise CommandError('--bookers and --seats-per-booking must be positive')
+
+        # Every booking queues outbox events, so by default run on a scratch
+        # database rather than feed benchmark rows to the live worker.
+        old_name = None
+        try:
+            if not options['use_existing_db']:
+                old_name = connection.settings_dict['NAME']
+                connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            self.run(options)
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run(self, options):
+        bookers = options['bookers']
+        seats_per_booking = options['seats_per_booking']
+        travel_option = TravelOption.objects.create(
+            type='flight',
+            source='Benchmark',
+            destination='Benchmark',
+            date_time=timezone.now() + timedelta(days=30),
+            price=Decimal('100.00'),
+            available_seats=options['seats'],
+        )
+        prefix = f'bench-{travel_option.travel_id}-'
+        User.objects.bulk_create(User(username=f'{prefix}{i}') for i in range(bookers))
+        users = list(User.objects.filter(username__startswith=prefix))
+
+        barrier = threading.Barrier(bookers + 1)
+        counts = [0] * bookers
+        rejections = [0] * bookers
+
+        def book(index, user):
+            try:
+                barrier.wait()
+                while True:
+                    try:
+                        reserve_seats(user, travel_option, seats_per_booking)
+                    except SeatsUnavailable:
+                        rejections[index] += 1
+                        break
+                    counts[index] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=book, args=(i, user)) for i, user in enumerate(users)]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        travel_option.refresh_from_db()
+        bookings = sum(counts)
+        booked_seats = Booking.objects.filter(travel_option=travel_option).aggregate(
+            total=Sum('number_of_seats'))['total'] or 0
+        oversold = booked_seats + travel_option.available_seats - options['seats']
+
+        self.stdout.write(f'bookers:        {bookers}')
+        self.stdout.write(f'bookings:       {bookings}')
+        self.stdout.write(f'elapsed:        {elapsed:.3f}s')
+        self.stdout.write(f'bookings/sec:   {bookings / elapsed if elapsed else 0:.1f}')
+        self.stdout.write(f'seats left:     {travel_option.available_seats}')
+        self.stdout.write(f'oversold seats: {oversold}')
+
+        if options['use_existing_db'] and not options['keep']:
+            OutboxEvent.objects.filter(travel_option_id=travel_option.travel_id).delete()
+            BookingRollup.objects.filter(
+                type=travel_option.type, source_key=travel_option.source_key, destination_key=travel_option.destination_key,
+            ).delete()
+            travel_option.delete()
+            User.objects.filter(username__startswith=prefix).delete()
+
+        if oversold or booked_seats != bookings * seats_per_booking:
+            raise CommandError('Seat inventory does not match bookings')
+        self.stdout.write(self.style.SUCCESS('No oversell detected'))
@@ -0,0 +1,213 @@
+import asyncio
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test.utils import override_settings
+from booking.loading import generate_options, upsert_options
+from booking.models import TravelOption
+from booking.search_cache import search_cache
+from .benchmark_views import percentile
+
+DEFAULT_PATHS = '/,/travel-options/,/travel/{travel_id}/'
+
+
+class Command(BaseCommand):
+    help = 'Compare concurrent-connection throughput of the read views under WSGI and ASGI'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=500, help='Concurrent client connections')
+        parser.add_argument('--requests', type=int, default=4, help='Requests issued by each connection')
+        parser.add_argument('--client-latency', type=float, default=200, help='Milliseconds each client takes to read a response')
+        parser.add_argument('--wsgi-threads', type=int, default=32, help='Worker threads of the simulated WSGI server')
+        parser.add_argument('--paths', default=DEFAULT_PATHS, help='Comma separated paths; {travel_id} picks a random option')
+        parser.add_argument('--options', type=int, default=5000, help='Travel options to seed')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--servers', default='wsgi,asgi')
+        parser.add_argument('--json', dest='json_path', help='Write results as JSON to this path ("-" for stdout)')
+        parser.add_argument('--use-existing-db', action='store_true', help='Benchmark the configured database without seeding')
+
+    def handle(self, *args, **options):
+        if options['connections'] < 1 or options['requests'] < 1 or options['wsgi_threads'] < 1:
+            raise CommandError('--connections, --requests and --wsgi-threads must be positive')
+        servers = [name.strip() for name in options['servers'].split(',')]
+        for name in servers:
+            if not hasattr(self, f'run_{name}'):
+                raise CommandError(f'Unknown server {name!r}')
+
+        old_name = None
+        try:
+            if not options['use_existing_db']:
+                old_name = connection.settings_dict['NAME']
+                connection.creation.create_test_db(verbosity=0, autoclobber=True)
+                upsert_options(generate_options(options['options'], options['seed']), 2000, update=False)
+            travel_ids = list(TravelOption.objects.values_list('travel_id', flat=True)[:1000])
+            if not travel_ids:
+                raise CommandError('No travel options to benchmark; seed a dataset first')
+            # Connections are opened per request by both handlers.
+            connection.close()
+
+            rng = random.Random(options['seed'])
+            paths = [path.strip() for path in options['paths'].split(',')]
+            self.workload = [
+                [rng.choice(paths).format(travel_id=rng.choice(travel_ids)) for _ in range(options['requests'])]
+                for _ in range(options['connections'])
+            ]
+            self.host = next((host for host in settings.ALLOWED_HOSTS if host and '*' not in host), 'localhost')
+
+            results = {}
+            with override_settings(DEBUG=False):
+                for name in servers:
+                    search_cache.clear()
+                    started = time.perf_counter()
+                    latencies, errors = getattr(self, f'run_{name}')(options)
+                    elapsed = time.perf_counter() - started
+                    latencies.sort()
+                    results[name] = {
+                        'requests': len(latencies),
+                        'errors': errors,
+                        'elapsed_s': round(elapsed, 3),
+                        'requests_per_s': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+                        'p50_ms': round(percentile(latencies, 0.50), 2),
+                        'p95_ms': round(percentile(latencies, 0.95), 2),
+                        'p99_ms': round(percentile(latencies, 0.99), 2),
+                        'threads_peak': self.threads_peak,
+                    }
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.stdout.write(
+            f"{'server':<8}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'threads':>9}"
+        )
+        for name, stats in results.items():
+            self.stdout.write(
+                f"{name:<8}{stats['requests']:>10}{stats['errors']:>8}{stats['requests_per_s']:>10.1f}"
+                f"{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats['threads_peak']:>9}"
+            )
+        if options['json_path'] == '-':
+            self.stdout.write(json.dumps(results, indent=2))
+        elif options['json_path']:
+            with open(options['json_path'], 'w') as handle:
+                json.dump(results, handle, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Wrote {options["json_path"]}'))
+
+    def split(self, path):
+        path, _, query = path.partition('?')
+        return path, query
+
+    def run_wsgi(self, options):
+        """A threaded WSGI server: a slow client keeps its worker busy until it has read the response"""
+        application = get_wsgi_application()
+        latency = options['client_latency'] / 1000
+        latencies = []
+        errors = [0]
+        self.threads_peak = options['wsgi_threads']
+
+        def serve(path, queued):
+            path, query = self.split(path)
+            environ = {
+                'REQUEST_METHOD': 'GET',
+                'PATH_INFO': path,
+                'QUERY_STRING': query,
+                'SERVER_NAME': self.host,
+                'SERVER_PORT': '80',
+                'SERVER_PROTOCOL': 'HTTP/1.1',
+                'HTTP_HOST': self.host,
+                'REMOTE_ADDR': '127.0.0.1',
+                'wsgi.version': (1, 0),
+                'wsgi.url_scheme': 'http',
+                'wsgi.input': BytesIO(),
+                'wsgi.errors': BytesIO(),
+                'wsgi.multithread': True,
+                'wsgi.multiprocess': False,
+                'wsgi.run_once': False,
+            }
+            status = []
+            body = application(environ, lambda code, headers, exc_info=None: status.append(code))
+            try:
+                for _ in body:
+                    pass
+            finally:
+                body.close()
+            time.sleep(latency)
+            if not status or not status[0].startswith('200'):
+                errors[0] += 1
+            latencies.append((time.perf_counter() - queued) * 1000)
+
+        with ThreadPoolExecutor(max_workers=options['wsgi_threads']) as pool:
+            def client(paths):
+                for path in paths:
+                    pool.submit(serve, path, time.perf_counter()).result()
+
+            clients = [threading.Thread(target=client, args=(paths,)) for paths in self.workload]
+            for thread in clients:
+                thread.start()
+            for thread in clients:
+                thread.join()
+        return latencies, errors[0]
+
+    def run_asgi(self, options):
+        """An ASGI server: slow clients are awaited on the event loop without holding a thread"""
+        application = get_asgi_application()
+        latency = options['client_latency'] / 1000
+        latencies = []
+        errors = [0]
+        threads_before = threading.active_count()
+        self.threads_peak = 0
+
+        async def serve(path):
+            path, query = self.split(path)
+            scope = {
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': '1.1',
+                'method': 'GET',
+                'scheme': 'http',
+                'path': path,
+                'raw_path': path.encode(),
+                'query_string': query.encode(),
+                'root_path': '',
+                'headers': [(b'host', self.host.encode())],
+                'client': ('127.0.0.1', 0),
+                'server': (self.host, 80),
+            }
+            requested = asyncio.Event()
+            status = []
+
+            async def receive():
+                if requested.is_set():
+                    # Nothing more to send; Django cancels this once it has responded.
+                    await asyncio.Future()
+                requested.set()
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+                elif not message.get('more_body'):
+                    await asyncio.sleep(latency)
+
+            started = time.perf_counter()
+            await application(scope, receive, send)
+            if status != [200]:
+                errors[0] += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+            self.threads_peak = max(self.threads_peak, threading.active_count() - threads_before)
+
+        async def client(paths):
+            for path in paths:
+                await serve(path)
+
+        async def main():
+            await asyncio.gather(*[client(paths) for paths in self.workload])
+
+        asyncio.run(main())
+        return latencies, errors[0]
@@ -0,0 +1,266 @@
+import json
+import math
+import platform
+import random
+import time
+import tracemalloc
+from datetime import datetime, timezone as dt_timezone
+import django
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from booking.loading import batched, generate_bookings, generate_options, iter_option_rows, upsert_options
+from booking.models import TravelOption, Booking
+from booking.search_cache import search_cache
+
+DEFAULT_MIX = 'search=30,search_filtered=20,search_deep=5,travel_detail=20,book_travel=10,cancel_booking=5,my_bookings=10'
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values) - 1, math.ceil(fraction * len(values)) - 1))
+    return values[rank]
+
+
+class Command(BaseCommand):
+    help = 'Seed a dataset and benchmark the booking views through the test client'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--options', type=int, default=20000, help='Travel options to seed')
+        parser.add_argument('--users', type=int, default=200, help='Users to spread seeded bookings over')
+        parser.add_argument('--occupancy', type=float, default=0.35)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--requests', type=int, default=1000, help='Requests to issue across the mix')
+        parser.add_argument('--warmup', type=int, default=50)
+        parser.add_argument('--mix', default=DEFAULT_MIX, help='Comma separated scenario=weight pairs')
+        parser.add_argument('--alloc-samples', type=int, default=20, help='Requests per scenario traced with tracemalloc (0 disables)')
+        parser.add_argument('--json', dest='json_path', help='Write results as JSON to this path ("-" for stdout)')
+        parser.add_argument('--compare', help='Earlier JSON result to compare p50/p95 against')
+        parser.add_argument('--use-existing-db', action='store_true', help='Benchmark the configured database without seeding')
+        parser.add_argument('--keepdb', action='store_true', help='Reuse the seeded benchmark database between runs')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.mix = self.parse_mix(options['mix'])
+
+        try:
+            setup_test_environment()
+            own_environment = True
+        except RuntimeError:
+            # Already inside a test run.
+            own_environment = False
+        old_name = None
+        try:
+            if not options['use_existing_db']:
+                old_name = connection.settings_dict['NAME']
+                connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+                if not TravelOption.objects.exists():
+                    self.seed(options)
+            results = self.run(options)
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            if own_environment:
+                teardown_test_environment()
+
+        self.print_results(results)
+        if options['compare']:
+            self.compare(results, options['compare'])
+        if options['json_path'] == '-':
+            self.stdout.write(json.dumps(results, indent=2))
+        elif options['json_path']:
+            with open(options['json_path'], 'w') as handle:
+                json.dump(results, handle, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Wrote {options["json_path"]}'))
+
+    def parse_mix(self, spec):
+        mix = {}
+        for part in spec.split(','):
+            name, _, weight = part.partition('=')
+            name = name.strip()
+            if not hasattr(self, f'scenario_{name}'):
+                raise CommandError(f'Unknown scenario {name!r}')
+            try:
+                mix[name] = float(weight or 1)
+            except ValueError:
+                raise CommandError(f'Invalid weight in {part!r}')
+        return mix
+
+    def seed(self, options):
+        started = time.perf_counter()
+        upsert_options(generate_options(options['options'], options['seed'], occupancy=options['occupancy']), 2000, update=False)
+        User.objects.bulk_create(User(username=f'bench-{i}') for i in range(options['users']))
+        user_ids = list(User.objects.filter(username__startswith='bench-').values_list('id', flat=True))
+        for batch in batched(generate_bookings(iter_option_rows(), user_ids, options['seed']), 2000):
+            Booking.objects.bulk_create(batch)
+        self.stdout.write(
+            f'Seeded {TravelOption.objects.count()} options and {Booking.objects.count()} bookings '
+            f'in {time.perf_counter() - started:.1f}s'
+        )
+
+    def run(self, options):
+        self.client = Client()
+        self.user = User.objects.filter(booking__isnull=False).order_by('id').first() or User.objects.create(username='bench-solo')
+        self.client.force_login(self.user)
+        self.max_id = TravelOption.objects.aggregate(last=Max('travel_id'))['last'] or 0
+        self.routes = list(
+            TravelOption.objects.order_by('?').values_list('type', 'source', 'destination', 'date_time')[:200]
+        )
+        if not self.routes:
+            raise CommandError('No travel options to benchmark; seed a dataset first')
+        search_cache.clear()
+
+        names = list(self.mix)
+        weights = [self.mix[name] for name in names]
+        for _ in range(options['warmup']):
+            getattr(self, f'scenario_{self.rng.choices(names, weights)[0]}')()()
+
+        samples = {name: {'latency': [], 'queries': [], 'status': {}} for name in names}
+        for _ in range(options['requests']):
+            name = self.rng.choices(names, weights)[0]
+            # Scenarios pick their targets up front so only the request is measured.
+            request = getattr(self, f'scenario_{name}')()
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = request()
+                elapsed = time.perf_counter() - started
+            sample = samples[name]
+            sample['latency'].append(elapsed * 1000)
+            sample['queries'].append(len(queries))
+            sample['status'][response.status_code] = sample['status'].get(response.status_code, 0) + 1
+
+        allocations = {}
+        if options['alloc_samples']:
+            tracemalloc.start()
+            try:
+                for name in names:
+                    peaks = []
+                    for _ in range(options['alloc_samples']):
+                        request = getattr(self, f'scenario_{name}')()
+                        tracemalloc.reset_peak()
+                        baseline = tracemalloc.get_traced_memory()[0]
+                        request()
+                        peaks.append((tracemalloc.get_traced_memory()[1] - baseline) / 1024)
+                    peaks.sort()
+                    allocations[name] = {'peak_kib_p50': round(percentile(peaks, 0.5), 1), 'peak_kib_max': round(peaks[-1], 1)}
+            finally:
+                tracemalloc.stop()
+
+        scenarios = {}
+        for name, sample in samples.items():
+            latency = sorted(sample['latency'])
+            scenarios[name] = {
+                'requests': len(latency),
+                'p50_ms': round(percentile(latency, 0.50), 3),
+                'p95_ms': round(percentile(latency, 0.95), 3),
+                'p99_ms': round(percentile(latency, 0.99), 3),
+                'mean_ms': round(sum(latency) / len(latency), 3) if latency else 0.0,
+                'queries_mean': round(sum(sample['queries']) / len(sample['queries']), 2) if sample['queries'] else 0.0,
+                'queries_max': max(sample['queries'], default=0),
+                'status': {str(code): count for code, count in sorted(sample['status'].items())},
+                **allocations.get(name, {}),
+            }
+
+        return {
+            'timestamp': datetime.now(dt_timezone.utc).isoformat(),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+            },
+            'dataset': {
+                'options': TravelOption.objects.count(),
+                'bookings': Booking.objects.count(),
+                'seed': options['seed'],
+            },
+            'requests': options['requests'],
+            'mix': self.mix,
+            'search_cache': search_cache.stats(),
+            'scenarios': scenarios,
+        }
+
+    def random_route(self):
+        return self.rng.choice(self.routes)
+
+    def scenario_search(self):
+        return lambda: self.client.get(reverse('travel_options'))
+
+    def scenario_search_filtered(self):
+        travel_type, source, destination, date_time = self.random_route()
+        params = {'type': travel_type, 'source': source}
+        if self.rng.random() < 0.7:
+            params['destination'] = destination
+        if self.rng.random() < 0.5:
+            params['date'] = date_time.date().isoformat()
+        return lambda: self.client.get(reverse('travel_options'), params)
+
+    def scenario_search_deep(self):
+        depth = self.rng.randint(3, 10)
+
+        def walk():
+            # One sample covers the whole walk from the first page.
+            response = self.client.get(reverse('travel_options'))
+            for _ in range(depth):
+                next_query = response.context and response.context.get('next_query')
+                if not next_query:
+                    break
+                response = self.client.get(f"{reverse('travel_options')}?{next_query}")
+            return response
+        return walk
+
+    def scenario_travel_detail(self):
+        travel_id = self.rng.randint(1, self.max_id)
+        return lambda: self.client.get(reverse('travel_detail', args=[travel_id]))
+
+    def scenario_book_travel(self):
+        option_id = TravelOption.objects.filter(available_seats__gt=2).values_list('travel_id', flat=True).first()
+        if option_id is None:
+            return self.scenario_search()
+        seats = self.rng.randint(1, 2)
+
+        def checkout():
+            # Hold the seats, then confirm the hold like a browser would.
+            response = self.client.post(reverse('book_travel', args=[option_id]), {'seats': seats})
+            if response.status_code != 302 or not response.url.startswith('/checkout/'):
+                return response
+            return self.client.post(response.url, {'action': 'confirm'})
+        return checkout
+
+    def scenario_cancel_booking(self):
+        booking_id = Booking.objects.filter(user=self.user, status='confirmed').values_list('booking_id', flat=True).last()
+        if booking_id is None:
+            return self.scenario_book_travel()
+        return lambda: self.client.get(reverse('cancel_booking', args=[booking_id]))
+
+    def scenario_my_bookings(self):
+        return lambda: self.client.get(reverse('my_bookings'))
+
+    def print_results(self, results):
+        self.stdout.write(
+            f"{'scenario':<16}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}{'peak KiB':>10}"
+        )
+        for name, stats in results['scenarios'].items():
+            self.stdout.write(
+                f"{name:<16}{stats['requests']:>6}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}"
+                f"{stats['p99_ms']:>10.2f}{stats['queries_mean']:>9.1f}{stats.get('peak_kib_p50', 0):>10.1f}"
+            )
+
+    def compare(self, results, path):
+        with open(path) as handle:
+            baseline = json.load(handle)['scenarios']
+        self.stdout.write(f'Compared with {path}:')
+        for name, stats in results['scenarios'].items():
+            if name not in baseline:
+                continue
+            deltas = []
+            for metric in ('p50_ms', 'p95_ms', 'queries_mean'):
+                before = baseline[name].get(metric) or 0
+                change = (stats[metric] - before) / before * 100 if before else 0.0
+                deltas.append(f'{metric} {change:+.1f}%')
+            self.stdout.write(f'  {name:<16}' + '  '.join(deltas))
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from booking.assets import build
+
+class Command(BaseCommand):
+    help = 'Trim the vendored Bootstrap and Font Awesome stylesheets to the classes the templates use'
+
+    def handle(self, *args, **options):
+        for target, (before, after) in build().items():
+            self.stdout.write(f'{target}: {before // 1024} KiB -> {after // 1024} KiB')
@@ -0,0 +1,122 @@
+import itertools
+import sys
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from booking.loading import (
+    RowError, batched, generate_bookings, generate_options, iter_option_rows,
+    parse_record, read_records, upsert_options,
+)
+from booking.models import TravelOption, Booking
+from booking.analytics import booking_analytics
+
+class Command(BaseCommand):
+    help = 'Stream CSV/JSONL schedules into TravelOption, or generate a synthetic dataset'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help='Schedule files to load ("-" reads stdin)')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='File format (default: from extension)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--max-errors', type=int, default=100, help='Abort after this many bad rows')
+        parser.add_argument('--generate', type=int, metavar='N', help='Generate N synthetic travel options')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--days', type=int, default=90, help='Spread generated departures over this many days')
+        parser.add_argument('--occupancy', type=float, default=0.35, help='Mean share of generated seats already sold')
+        parser.add_argument('--with-bookings', action='store_true', help='Also generate bookings for the sold seats')
+        parser.add_argument('--users', type=int, default=1000, help='Synthetic users to spread bookings over')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        if not options['paths'] and not options['generate']:
+            raise CommandError('Give schedule files to load or --generate N')
+
+        for path in options['paths']:
+            self.load_file(path, options)
+        if options['generate']:
+            self.generate(options)
+
+    def report(self, label, rows, started):
+        elapsed = time.perf_counter() - started
+        rate = rows / elapsed if elapsed else 0
+        self.stdout.write(f'{label}: {rows} rows in {elapsed:.1f}s ({rate:,.0f} rows/sec)')
+
+    def progress(self, label, started, every=50):
+        """Return a per-batch callback that reports throughput every few batches"""
+        batches = itertools.count(1)
+
+        def on_batch(rows):
+            if next(batches) % every == 0:
+                self.report(f'{label} (progress)', rows, started)
+        return on_batch
+
+    def load_file(self, path, options):
+        fmt = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+        handle = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        errors = []
+
+        def valid_options():
+            for number, record in enumerate(read_records(handle, fmt), start=1):
+                try:
+                    yield parse_record(record)
+                except RowError as exc:
+                    errors.append(f'record {number}: {exc}')
+                    if len(errors) > options['max_errors']:
+                        raise CommandError(f'Too many invalid rows in {path}; last: {errors[-1]}')
+
+        started = time.perf_counter()
+        try:
+            written = upsert_options(valid_options(), options['batch_size'], on_batch=self.progress(path, started))
+        except RowError as exc:
+            raise CommandError(f'{path}: {exc}')
+        finally:
+            if handle is not sys.stdin:
+                handle.close()
+
+        for error in errors[:10]:
+            self.stderr.write(error)
+        self.report(path, written, started)
+        self.stdout.write(self.style.SUCCESS(f'Loaded {written} travel options from {path} ({len(errors)} skipped)'))
+
+    def generate(self, options):
+        count = options['generate']
+        first_new_id = TravelOption.objects.aggregate(last=Max('travel_id'))['last'] or 0
+
+        started = time.perf_counter()
+        upsert_options(
+            generate_options(count, options['seed'], days=options['days'], occupancy=options['occupancy']),
+            options['batch_size'],
+            on_batch=self.progress('options', started),
+            update=False,
+        )
+        # Generated departures can repeat a natural key; only the first is stored.
+        written = TravelOption.objects.filter(travel_id__gt=first_new_id).count()
+        self.report('options', written, started)
+        if written < count:
+            self.stdout.write(self.style.WARNING(f'{count - written} generated options repeated a departure and were skipped'))
+
+        if not options['with_bookings']:
+            return
+
+        prefix = f'loadgen-{options["seed"]}-'
+        User.objects.bulk_create(
+            (User(username=f'{prefix}{i}') for i in range(options['users'])),
+            batch_size=options['batch_size'],
+            ignore_conflicts=True,
+        )
+        user_ids = list(User.objects.filter(username__startswith=prefix).values_list('id', flat=True))
+
+        started = time.perf_counter()
+        bookings = generate_bookings(iter_option_rows(first_new_id, options['batch_size']), user_ids, options['seed'])
+        on_batch = self.progress('bookings', started)
+        total = 0
+        for batch in batched(bookings, options['batch_size']):
+            with transaction.atomic():
+                Booking.objects.bulk_create(batch)
+                booking_analytics.bookings_created(batch)
+            total += len(batch)
+            on_batch(total)
+        self.report('bookings', total, started)
+        self.stdout.write(self.style.SUCCESS(f'Generated {written} travel options and {total} bookings'))
@@ -0,0 +1,23 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from booking.outbox import drain
+
+class Command(BaseCommand):
+    help = 'Run queued booking side effects (rollups, emails) from the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Events claimed per batch')
+        parser.add_argument('--workers', type=int, default=4, help='Threads running travel options in parallel')
+        parser.add_argument('--interval', type=float, default=0, help='Keep polling every N seconds instead of running once')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or options['workers'] < 1:
+            raise CommandError('--batch-size and --workers must be positive')
+
+        while True:
+            done, failed = drain(batch_size=options['batch_size'], workers=options['workers'])
+            if done or failed or not options['interval']:
+                self.stdout.write(f'Processed {done} outbox events, {failed} failed')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,10 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from booking.profiling import HEADER, make_token
+
+class Command(BaseCommand):
+    help = 'Print a signed header that makes ProfilingMiddleware profile the requests carrying it'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{HEADER}: {make_token()}')
+        self.stderr.write(f'Valid for {settings.PROFILING_TOKEN_MAX_AGE} seconds')
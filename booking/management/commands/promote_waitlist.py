@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from booking.models import WaitlistEntry
+from booking.reservations import promote_waitlist
+
+class Command(BaseCommand):
+    help = 'Hand free seats to waitlisted users, e.g. after capacity was raised in the admin'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Options promoted per transaction')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        travel_ids = list(
+            WaitlistEntry.objects.filter(status='waiting', travel_option__available_seats__gt=0)
+            .order_by('travel_option_id').values_list('travel_option_id', flat=True).distinct()
+        )
+        promoted = 0
+        for start in range(0, len(travel_ids), options['batch_size']):
+            with transaction.atomic():
+                promoted += len(promote_waitlist(travel_ids[start:start + options['batch_size']]))
+        self.stdout.write(f'Promoted {promoted} waitlist entries on {len(travel_ids)} travel options')
@@ -0,0 +1,17 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from booking.price_calendar import price_calendar
+
+class Command(BaseCommand):
+    help = 'Recompute the price calendar summary table from every travel option'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Calendar rows written per INSERT')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        started = time.perf_counter()
+        cells = price_calendar.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(f'Rebuilt {cells} price calendar days in {time.perf_counter() - started:.2f}s')
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from booking.reconcile import find_drift, repair
+
+class Command(BaseCommand):
+    help = 'Compare available_seats with capacity minus confirmed bookings and holds, optionally repairing drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Travel options checked per query and repaired per UPDATE')
+        parser.add_argument('--fix', action='store_true', help='Reset drifted options to the expected seat count')
+        parser.add_argument('--show', type=int, default=20, help='Discrepancies listed individually')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+
+        checked = drifted = oversold = repaired = 0
+        pending = []
+
+        def on_chunk(last, rows):
+            nonlocal checked
+            checked += rows
+
+        for row in find_drift(chunk_size=options['chunk_size'], on_chunk=on_chunk):
+            drifted += 1
+            oversold += row['expected'] < 0
+            if drifted <= options['show']:
+                self.stdout.write(
+                    f"  travel {row['travel_id']}: {row['available_seats']} available, expected {row['expected']} "
+                    f"(capacity {row['capacity']}, booked {row['booked']}, held {row['held']})"
+                )
+            if options['fix']:
+                pending.append(row['travel_id'])
+                if len(pending) >= options['chunk_size']:
+                    repaired += len(repair(pending))
+                    pending = []
+        if pending:
+            repaired += len(repair(pending))
+
+        summary = f'Checked {checked} travel options: {drifted} drifted ({oversold} oversold)'
+        if options['fix']:
+            summary += f', repaired {repaired}'
+        self.stdout.write(summary)
@@ -0,0 +1,22 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from booking.reservations import release_expired_holds
+
+class Command(BaseCommand):
+    help = 'Return the seats of expired checkout holds to inventory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Holds released per transaction')
+        parser.add_argument('--interval', type=float, default=0, help='Keep sweeping every N seconds instead of running once')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        while True:
+            holds, seats = release_expired_holds(batch_size=options['batch_size'])
+            if holds or not options['interval']:
+                self.stdout.write(f'Released {seats} seats from {holds} expired holds')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+def populate_city_keys(apps, schema_editor):
+    TravelOption = apps.get_model('booking', 'TravelOption')
+    batch = []
+    for option in TravelOption.objects.only('travel_id', 'source', 'destination').iterator(chunk_size=2000):
+        option.source_key = ' '.join(option.source.split()).casefold()
+        option.destination_key = ' '.join(option.destination.split()).casefold()
+        batch.append(option)
+        if len(batch) >= 2000:
+            TravelOption.objects.bulk_update(batch, ['source_key', 'destination_key'])
+            batch = []
+    if batch:
+        TravelOption.objects.bulk_update(batch, ['source_key', 'destination_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="traveloption",
+            name="source_key",
+            field=models.CharField(default="", editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name="traveloption",
+            name="destination_key",
+            field=models.CharField(default="", editable=False, max_length=100),
+        ),
+        migrations.RunPython(populate_city_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="traveloption",
+            index=models.Index(
+                fields=["type", "source_key", "destination_key", "date_time"],
+                name="travel_route_type_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="traveloption",
+            index=models.Index(
+                fields=["source_key", "destination_key", "date_time"],
+                name="travel_route_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="traveloption",
+            index=models.Index(fields=["date_time"], name="travel_date_idx"),
+        ),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:20
+
+import django.core.validators
+import django.db.models.expressions
+import django.db.models.functions.comparison
+from django.db import migrations, models
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+
+
+DEFAULT_CAPACITY = {
+    "flight": 150,
+    "train": 200,
+    "bus": 50,
+}
+
+
+def backfill_capacity(apps, schema_editor):
+    TravelOption = apps.get_model("booking", "TravelOption")
+    for travel_type, capacity in DEFAULT_CAPACITY.items():
+        TravelOption.objects.filter(type=travel_type).update(
+            capacity=Greatest(Value(capacity), F("available_seats"))
+        )
+    TravelOption.objects.exclude(type__in=DEFAULT_CAPACITY).update(
+        capacity=Greatest(Value(100), F("available_seats"))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0003_booking_user_date_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="traveloption",
+            name="capacity",
+            field=models.PositiveIntegerField(
+                blank=True,
+                default=0,
+                help_text="Total seats; defaults from the travel type",
+                validators=[django.core.validators.MinValueValidator(1)],
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_capacity, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="traveloption",
+            index=models.Index(
+                fields=["available_seats", "date_time"], name="travel_seats_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="traveloption",
+            name="occupancy",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=django.db.models.functions.comparison.Coalesce(
+                    django.db.models.expressions.CombinedExpression(
+                        django.db.models.expressions.CombinedExpression(
+                            django.db.models.expressions.CombinedExpression(
+                                django.db.models.functions.comparison.Cast(
+                                    "capacity", models.FloatField()
+                                ),
+                                "-",
+                                django.db.models.functions.comparison.Cast(
+                                    "available_seats", models.FloatField()
+                                ),
+                            ),
+                            "*",
+                            models.Value(100.0),
+                        ),
+                        "/",
+                        django.db.models.functions.comparison.NullIf(
+                            django.db.models.functions.comparison.Cast(
+                                "capacity", models.FloatField()
+                            ),
+                            models.Value(0.0),
+                        ),
+                    ),
+                    models.Value(0.0),
+                ),
+                output_field=models.FloatField(),
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="traveloption",
+            index=models.Index(
+                fields=["-occupancy", "date_time", "travel_id"],
+                name="travel_occupancy_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:52
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+NATURAL_KEY = ["type", "source_key", "destination_key", "date_time"]
+
+
+def merge_duplicates(apps, schema_editor):
+    """Fold options sharing a natural key into the oldest one so the constraint can be added.
+
+    Bookings of the extra rows move to the kept option, and the seats they
+    had sold come off its ``available_seats``.
+    """
+    TravelOption = apps.get_model("booking", "TravelOption")
+    Booking = apps.get_model("booking", "Booking")
+    duplicated = (
+        TravelOption.objects.order_by()
+        .values(*NATURAL_KEY)
+        .annotate(rows=Count("travel_id"), kept=Min("travel_id"))
+        .filter(rows__gt=1)
+    )
+    for group in list(duplicated):
+        extra = list(
+            TravelOption.objects.filter(**{name: group[name] for name in NATURAL_KEY})
+            .exclude(travel_id=group["kept"])
+            .values_list("travel_id", "capacity", "available_seats")
+        )
+        sold = sum(max(capacity - available_seats, 0) for _, capacity, available_seats in extra)
+        extra_ids = [travel_id for travel_id, _, _ in extra]
+        Booking.objects.filter(travel_option_id__in=extra_ids).update(travel_option_id=group["kept"])
+        TravelOption.objects.filter(travel_id__in=extra_ids).delete()
+        kept = TravelOption.objects.get(travel_id=group["kept"])
+        kept.available_seats = max(kept.available_seats - sold, 0)
+        kept.save(update_fields=["available_seats"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0004_traveloption_capacity"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="traveloption",
+            constraint=models.UniqueConstraint(
+                fields=("type", "source_key", "destination_key", "date_time"),
+                name="travel_natural_key",
+            ),
+        ),
+        migrations.RemoveIndex(
+            model_name="traveloption",
+            name="travel_route_type_idx",
+        ),
+    ]
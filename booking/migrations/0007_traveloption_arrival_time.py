@@ -0,0 +1,48 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:10
+
+from datetime import timedelta
+from django.db import migrations, models
+from django.db.models import F
+
+
+DEFAULT_DURATION = {
+    "flight": timedelta(hours=3),
+    "train": timedelta(hours=6),
+    "bus": timedelta(hours=8),
+}
+
+
+def backfill_arrival_time(apps, schema_editor):
+    TravelOption = apps.get_model("booking", "TravelOption")
+    for travel_type, duration in DEFAULT_DURATION.items():
+        TravelOption.objects.filter(type=travel_type).update(
+            arrival_time=F("date_time") + duration
+        )
+    TravelOption.objects.exclude(type__in=DEFAULT_DURATION).update(
+        arrival_time=F("date_time") + timedelta(hours=4)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0006_seathold"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="traveloption",
+            name="arrival_time",
+            field=models.DateTimeField(
+                blank=True, help_text="Defaults from the travel type", null=True
+            ),
+        ),
+        migrations.RunPython(backfill_arrival_time, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="traveloption",
+            name="arrival_time",
+            field=models.DateTimeField(
+                blank=True, help_text="Defaults from the travel type"
+            ),
+        ),
+    ]
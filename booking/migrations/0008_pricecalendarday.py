@@ -0,0 +1,77 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:25
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+from django.db.models.functions import TruncDate
+
+
+def populate_price_calendar(apps, schema_editor):
+    TravelOption = apps.get_model("booking", "TravelOption")
+    PriceCalendarDay = apps.get_model("booking", "PriceCalendarDay")
+    rows = (
+        TravelOption.objects.annotate(day=TruncDate("date_time"))
+        .values("source_key", "destination_key", "type", "day")
+        .annotate(
+            min_price=Min("price"),
+            available_seats=Sum("available_seats"),
+            options=Count("travel_id"),
+        )
+        .order_by()
+    )
+    batch = []
+    for row in rows.iterator(chunk_size=1000):
+        batch.append(PriceCalendarDay(**row))
+        if len(batch) >= 1000:
+            PriceCalendarDay.objects.bulk_create(batch)
+            batch = []
+    PriceCalendarDay.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0007_traveloption_arrival_time"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PriceCalendarDay",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "type",
+                    models.CharField(
+                        choices=[
+                            ("flight", "Flight"),
+                            ("train", "Train"),
+                            ("bus", "Bus"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("source_key", models.CharField(max_length=100)),
+                ("destination_key", models.CharField(max_length=100)),
+                ("day", models.DateField()),
+                ("min_price", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("available_seats", models.PositiveIntegerField()),
+                ("options", models.PositiveIntegerField()),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("source_key", "destination_key", "day", "type"),
+                        name="calendar_cell_key",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(populate_price_calendar, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0008_pricecalendarday"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BookingRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                (
+                    "type",
+                    models.CharField(
+                        choices=[
+                            ("flight", "Flight"),
+                            ("train", "Train"),
+                            ("bus", "Bus"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("source_key", models.CharField(max_length=100)),
+                ("destination_key", models.CharField(max_length=100)),
+                ("source", models.CharField(max_length=100)),
+                ("destination", models.CharField(max_length=100)),
+                ("bookings", models.PositiveIntegerField(default=0)),
+                ("seats", models.PositiveIntegerField(default=0)),
+                (
+                    "revenue",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("cancellations", models.PositiveIntegerField(default=0)),
+                ("cancelled_seats", models.PositiveIntegerField(default=0)),
+                (
+                    "cancelled_revenue",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("day", "source_key", "destination_key", "type"),
+                        name="rollup_cell_key",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-18 20:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0009_bookingrollup"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(fields=["booking_date"], name="booking_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="traveloption",
+            index=models.Index(
+                fields=["destination_key", "date_time"], name="travel_destination_idx"
+            ),
+        ),
+    ]
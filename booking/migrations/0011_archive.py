@@ -0,0 +1,93 @@
+# Generated by Django 5.2.5 on 2026-10-18 21:30
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0010_admin_changelist_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedTravelOption",
+            fields=[
+                ("travel_id", models.IntegerField(primary_key=True, serialize=False)),
+                (
+                    "type",
+                    models.CharField(
+                        choices=[
+                            ("flight", "Flight"),
+                            ("train", "Train"),
+                            ("bus", "Bus"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("source", models.CharField(max_length=100)),
+                ("destination", models.CharField(max_length=100)),
+                ("source_key", models.CharField(max_length=100)),
+                ("destination_key", models.CharField(max_length=100)),
+                ("date_time", models.DateTimeField()),
+                ("arrival_time", models.DateTimeField()),
+                ("price", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("available_seats", models.PositiveIntegerField()),
+                ("capacity", models.PositiveIntegerField()),
+                (
+                    "archived_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["date_time"], name="archived_travel_date_idx")
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="ArchivedBooking",
+            fields=[
+                ("booking_id", models.IntegerField(primary_key=True, serialize=False)),
+                ("number_of_seats", models.PositiveIntegerField()),
+                ("total_price", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("booking_date", models.DateTimeField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("confirmed", "Confirmed"), ("cancelled", "Cancelled")],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "archived_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "travel_option",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="booking.archivedtraveloption",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["user", "booking_date"], name="archived_booking_user_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:29
+
+import django.core.validators
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0011_archive"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WaitlistEntry",
+            fields=[
+                ("entry_id", models.AutoField(primary_key=True, serialize=False)),
+                (
+                    "number_of_seats",
+                    models.PositiveIntegerField(
+                        validators=[django.core.validators.MinValueValidator(1)]
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("waiting", "Waiting"),
+                            ("promoted", "Promoted"),
+                            ("left", "Left"),
+                        ],
+                        default="waiting",
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("promoted_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "hold",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="booking.seathold",
+                    ),
+                ),
+                (
+                    "travel_option",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="booking.traveloption",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "waitlist entries",
+                "indexes": [
+                    models.Index(
+                        fields=["travel_option", "status", "created_at"],
+                        name="waitlist_queue_idx",
+                    ),
+                    models.Index(
+                        fields=["user", "created_at"], name="waitlist_user_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0013_outboxevent"),
+    ]
+
+    # Existing options get their seat map laid out the next time a booking locks them.
+    operations = [
+        migrations.AddField(
+            model_name="booking",
+            name="seat_numbers",
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name="seathold",
+            name="seat_numbers",
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name="traveloption",
+            name="seat_map",
+            field=models.BinaryField(blank=True, default=b""),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:19
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Q, Sum
+from django.db.models.functions import TruncDate
+
+
+def rebuild_price_calendar(apps, bookable_only):
+    TravelOption = apps.get_model("booking", "TravelOption")
+    PriceCalendarDay = apps.get_model("booking", "PriceCalendarDay")
+    rows = (
+        TravelOption.objects.annotate(day=TruncDate("date_time"))
+        .values("source_key", "destination_key", "type", "day")
+        .annotate(
+            min_price=Min("price", filter=Q(available_seats__gt=0) if bookable_only else None),
+            available_seats=Sum("available_seats"),
+            options=Count("travel_id"),
+        )
+        .order_by()
+    )
+    PriceCalendarDay.objects.all().delete()
+    batch = []
+    for row in rows.iterator(chunk_size=1000):
+        batch.append(PriceCalendarDay(**row))
+        if len(batch) >= 1000:
+            PriceCalendarDay.objects.bulk_create(batch)
+            batch = []
+    PriceCalendarDay.objects.bulk_create(batch)
+
+
+def bookable_min_price(apps, schema_editor):
+    """Recompute ``min_price`` over options with seats left, as ``price_calendar.aggregate`` does"""
+    rebuild_price_calendar(apps, bookable_only=True)
+
+
+def any_min_price(apps, schema_editor):
+    rebuild_price_calendar(apps, bookable_only=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0016_requestprofile"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="pricecalendarday",
+            name="min_price",
+            field=models.DecimalField(decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.RunPython(bookable_min_price, any_min_price),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0017_pricecalendarday_bookable_min_price"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="archivedbooking",
+            name="seat_numbers",
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
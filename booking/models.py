@@ -1,6 +1,122 @@
 from django.db import models
+from django.db.models import Case, FloatField, Value, When
+from django.db.models.functions import Cast, Coalesce, NullIf
+from django.core.validators import MinValueValidator
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from datetime import timedelta
 from django.utils import timezone
+from .search_cache import search_cache
+from .seatmap import SEATS_PER_ROW, SeatMap
+
+def normalize_city(value):
+    """Case-fold a city name and collapse whitespace for indexed lookups"""
+    return ' '.join((value or '').split()).casefold()
+
+LOW_STOCK_THRESHOLD = 10
+
+# Upper bound of available seats for each urgency level, checked in order.
+URGENCY_LEVELS = [
+    (0, 'sold-out'),
+    (5, 'critical'),
+    (15, 'low'),
+    (50, 'medium'),
+]
+
+def occupancy_expression():
+    """SQL expression for the percentage of capacity already booked"""
+    capacity = Cast('capacity', FloatField())
+    booked = capacity - Cast('available_seats', FloatField())
+    return Coalesce(booked * Value(100.0) / NullIf(capacity, Value(0.0)), Value(0.0))
+
+def get_city_index():
+    # Imported lazily: the in-memory indexes themselves read these models.
+    from .autocomplete import city_index
+    return city_index
+
+def get_route_graph():
+    from .routes import route_graph
+    return route_graph
+
+def get_price_calendar():
+    from .price_calendar import price_calendar
+    return price_calendar
+
+# Fields that place an option in a price calendar cell, and those that feed its totals.
+CALENDAR_CELL_FIELDS = {'type', 'source', 'destination', 'date_time'}
+CALENDAR_FIELDS = CALENDAR_CELL_FIELDS | {'price', 'available_seats'}
+
+class TravelOptionQuerySet(models.QuerySet):
+    def with_urgency(self):
+        """Annotate ``urgency`` with the same levels as ``TravelOption.urgency_level``"""
+        return self.annotate(urgency=Case(
+            *[When(available_seats__lte=limit, then=Value(level)) for limit, level in URGENCY_LEVELS],
+            default=Value('high'),
+            output_field=models.CharField(),
+        ))
+    
+    def low_stock(self):
+        return self.filter(available_seats__gt=0, available_seats__lte=LOW_STOCK_THRESHOLD)
+    
+    def sold_out(self):
+        return self.filter(available_seats=0)
+    
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.populate_derived_fields()
+        with transaction.atomic(using=self.db):
+            created = super().bulk_create(objs, *args, **kwargs)
+            # Natural-key conflicts stay within a cell, so these cover updated rows too.
+            get_price_calendar().refresh(get_price_calendar().cells_of(objs))
+        search_cache.catalogue_changed()
+        if kwargs.get('ignore_conflicts') or kwargs.get('update_conflicts'):
+            # Which rows were inserted rather than skipped or updated is unknown.
+            get_city_index().invalidate()
+            get_route_graph().invalidate()
+        else:
+            get_city_index().add([name for obj in objs for name in (obj.source, obj.destination)])
+            if all(obj.pk is not None for obj in objs):
+                get_route_graph().options_saved(objs)
+            else:
+                get_route_graph().invalidate()
+        return created
+    
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        fields = list(fields)
+        if {'source', 'destination'} & set(fields):
+            for obj in objs:
+                obj.populate_derived_fields()
+            fields = list(dict.fromkeys(fields + ['source_key', 'destination_key']))
+        # ``bulk_update`` skips ``auto_now``, so stamp the rows here.
+        now = timezone.now()
+        for obj in objs:
+            obj.updated_at = now
+        fields = list(dict.fromkeys(fields + ['updated_at']))
+        with transaction.atomic(using=self.db):
+            cells = set()
+            if CALENDAR_CELL_FIELDS & set(fields):
+                cells |= get_price_calendar().cells_of_ids([obj.pk for obj in objs])
+            updated = super().bulk_update(objs, fields, *args, **kwargs)
+            if CALENDAR_FIELDS & set(fields):
+                get_price_calendar().refresh(cells | get_price_calendar().cells_of(objs))
+        search_cache.catalogue_changed()
+        if {'source', 'destination'} & set(fields):
+            get_city_index().invalidate()
+        get_route_graph().options_saved(objs)
+        return updated
+    
+    def delete(self):
+        with transaction.atomic(using=self.db):
+            cells = get_price_calendar().cells_of_queryset(self)
+            deleted = super().delete()
+            get_price_calendar().refresh(cells)
+        search_cache.catalogue_changed()
+        get_city_index().invalidate()
+        get_route_graph().invalidate()
+        return deleted
 
 class TravelOption(models.Model):
     TRAVEL_TYPES = [
@@ -9,21 +125,136 @@ class TravelOption(models.Model):
         ('bus', 'Bus'),
     ]
     
+    DEFAULT_CAPACITY = {
+        'flight': 150,
+        'train': 200,
+        'bus': 50,
+    }
+    
+    DEFAULT_DURATION = {
+        'flight': timedelta(hours=3),
+        'train': timedelta(hours=6),
+        'bus': timedelta(hours=8),
+    }
+    
     travel_id = models.AutoField(primary_key=True)
     type = models.CharField(max_length=10, choices=TRAVEL_TYPES)
     source = models.CharField(max_length=100)
     destination = models.CharField(max_length=100)
     date_time = models.DateTimeField()
+    arrival_time = models.DateTimeField(
+        blank=True,
+        help_text='Defaults from the travel type',
+    )
     price = models.DecimalField(max_digits=10, decimal_places=2)
     available_seats = models.PositiveIntegerField()
+    capacity = models.PositiveIntegerField(
+        blank=True,
+        validators=[MinValueValidator(1)],
+        help_text='Total seats; defaults from the travel type',
+    )
+    occupancy = models.GeneratedField(
+        expression=occupancy_expression(),
+        output_field=FloatField(),
+        db_persist=True,
+    )
+    source_key = models.CharField(max_length=100, editable=False, default='')
+    destination_key = models.CharField(max_length=100, editable=False, default='')
+    # Bitset of taken seats, see ``booking.seatmap``; written with the seat count by ``booking.reservations``.
+    seat_map = models.BinaryField(editable=False, blank=True, default=b'')
+    # Validator for conditional GETs; seat writers in ``booking.reservations`` bump it with their UPDATEs.
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    objects = TravelOptionQuerySet.as_manager()
+    
+    NATURAL_KEY = ['type', 'source_key', 'destination_key', 'date_time']
+    
+    class Meta:
+        constraints = [
+            # Natural key for schedule upserts; also serves type-filtered route searches.
+            models.UniqueConstraint(fields=['type', 'source_key', 'destination_key', 'date_time'], name='travel_natural_key'),
+        ]
+        indexes = [
+            models.Index(fields=['source_key', 'destination_key', 'date_time'], name='travel_route_idx'),
+            # Destination-only filters and searches, e.g. in the admin.
+            models.Index(fields=['destination_key', 'date_time'], name='travel_destination_idx'),
+            models.Index(fields=['date_time'], name='travel_date_idx'),
+            models.Index(fields=['available_seats', 'date_time'], name='travel_seats_idx'),
+            models.Index(fields=['-occupancy', 'date_time', 'travel_id'], name='travel_occupancy_idx'),
+        ]
     
     def __str__(self):
         return f"{self.type} from {self.source} to {self.destination}"
     
+    def populate_derived_fields(self):
+        """Refresh the case-folded city keys and fill in a missing capacity or arrival time"""
+        self.source_key = normalize_city(self.source)
+        self.destination_key = normalize_city(self.destination)
+        if self.capacity is None:
+            self.capacity = max(self.DEFAULT_CAPACITY.get(self.type, 100), self.available_seats or 0)
+        if self.arrival_time is None and self.date_time is not None:
+            self.arrival_time = self.date_time + self.DEFAULT_DURATION.get(self.type, timedelta(hours=4))
+        if self._state.adding and not self.seat_map and self.available_seats is not None:
+            self.seat_map = SeatMap.laid_out(self.capacity, self.capacity - self.available_seats).to_bytes()
+    
+    def clean(self):
+        if self.capacity is not None and self.available_seats is not None and self.available_seats > self.capacity:
+            raise ValidationError({'available_seats': 'Available seats cannot exceed capacity.'})
+        if self.arrival_time is not None and self.date_time is not None and self.arrival_time <= self.date_time:
+            raise ValidationError({'arrival_time': 'Arrival must be after departure.'})
+    
+    def validate_constraints(self, exclude=None):
+        # Forms never include the city keys, so derive them here and check
+        # the natural key whenever the cities it is built from are validated.
+        self.populate_derived_fields()
+        if exclude and not {'source', 'destination'} & set(exclude):
+            exclude = set(exclude) - {'source_key', 'destination_key'}
+        super().validate_constraints(exclude=exclude)
+    
+    def save(self, *args, **kwargs):
+        self.populate_derived_fields()
+        update_fields = kwargs.get('update_fields')
+        cities_changed = update_fields is None or bool({'source', 'destination'} & set(update_fields))
+        if update_fields is not None:
+            derived = {'source_key', 'destination_key'} if cities_changed else set()
+            kwargs['update_fields'] = set(update_fields) | derived | {'updated_at'}
+        cell_changed = update_fields is None or bool(CALENDAR_CELL_FIELDS & set(update_fields))
+        totals_changed = update_fields is None or bool(CALENDAR_FIELDS & set(update_fields))
+        previous = None
+        if cell_changed and not self._state.adding:
+            previous = TravelOption.objects.filter(pk=self.pk).values(
+                'source', 'destination', 'type', 'source_key', 'destination_key', 'date_time',
+            ).first()
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+            if totals_changed:
+                cells = get_price_calendar().cells_of([self])
+                if previous:
+                    cells |= get_price_calendar().cells_of([previous])
+                get_price_calendar().refresh(cells)
+        # Edits can move an option between result pages, so retire them all.
+        search_cache.catalogue_changed()
+        if previous and cities_changed:
+            get_city_index().discard([previous['source'], previous['destination']])
+        if cities_changed:
+            get_city_index().add([self.source, self.destination])
+        get_route_graph().options_saved([self])
+    
+    def delete(self, *args, **kwargs):
+        cities = [self.source, self.destination]
+        travel_id = self.travel_id
+        with transaction.atomic(using=kwargs.get('using')):
+            deleted = super().delete(*args, **kwargs)
+            get_price_calendar().refresh(get_price_calendar().cells_of([self]))
+        search_cache.catalogue_changed()
+        get_city_index().discard(cities)
+        get_route_graph().options_removed([travel_id])
+        return deleted
+    
     @property
     def is_low_stock(self):
         """Check if seats are running low (less than or equal to 10)"""
-        return self.available_seats <= 10 and self.available_seats > 0
+        return 0 < self.available_seats <= LOW_STOCK_THRESHOLD
     
     @property
     def is_sold_out(self):
@@ -33,32 +264,29 @@ class TravelOption(models.Model):
     @property
     def urgency_level(self):
         """Return urgency level based on available seats"""
-        if self.available_seats == 0:
-            return 'sold-out'
-        elif self.available_seats <= 5:
-            return 'critical'
-        elif self.available_seats <= 15:
-            return 'low'
-        elif self.available_seats <= 50:
-            return 'medium'
-        else:
-            return 'high'
+        for limit, level in URGENCY_LEVELS:
+            if self.available_seats <= limit:
+                return level
+        return 'high'
+    
+    @property
+    def seat_layout(self):
+        """The seat map as it will be once a booking next fits it to ``available_seats``"""
+        layout = SeatMap.from_bytes(self.seat_map, self.capacity, SEATS_PER_ROW.get(self.type))
+        return layout.fit(self.capacity - self.available_seats)
     
     @property
     def estimated_capacity(self):
-        """Estimate original capacity based on travel type"""
-        capacity_map = {
-            'flight': 150,
-            'train': 200,
-            'bus': 50
-        }
-        return capacity_map.get(self.type, 100)
+        """Capacity of the transport, kept for templates written before the column existed"""
+        return self.capacity
     
     @property
     def occupancy_percentage(self):
         """Calculate how full the transport is"""
-        booked_seats = self.estimated_capacity - self.available_seats
-        return (booked_seats / self.estimated_capacity) * 100
+        if not self.capacity:
+            return 0
+        booked_seats = self.capacity - self.available_seats
+        return (booked_seats / self.capacity) * 100
 
 class Booking(models.Model):
     STATUS_CHOICES = [
@@ -70,9 +298,224 @@ class Booking(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     travel_option = models.ForeignKey(TravelOption, on_delete=models.CASCADE)
     number_of_seats = models.PositiveIntegerField()
+    # Empty for bookings made before seats were numbered.
+    seat_numbers = models.JSONField(default=list, blank=True)
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     booking_date = models.DateTimeField(default=timezone.now)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='confirmed')
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'booking_date'], name='booking_user_date_idx'),
+            # Newest-first admin changelist.
+            models.Index(fields=['booking_date'], name='booking_date_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Booking {self.booking_id} by {self.user.username}"
+
+class SeatHold(models.Model):
+    """Seats taken from a travel option for a checkout that has not been confirmed yet"""
+    hold_id = models.AutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    travel_option = models.ForeignKey(TravelOption, on_delete=models.CASCADE)
+    number_of_seats = models.PositiveIntegerField()
+    seat_numbers = models.JSONField(default=list, blank=True)
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at'], name='seathold_expiry_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Hold {self.hold_id} by {self.user.username}"
+    
+    @property
+    def is_expired(self):
+        return self.expires_at <= timezone.now()
+    
+    @property
+    def seconds_left(self):
+        return max(0, int((self.expires_at - timezone.now()).total_seconds()))
+
+class PriceCalendarDay(models.Model):
+    """Cheapest fare and seats left per route, travel type and local departure day.
+
+    A summary of ``TravelOption`` kept current by ``booking.price_calendar``
+    as options and seats change, so calendars never aggregate the catalogue.
+    """
+    type = models.CharField(max_length=10, choices=TravelOption.TRAVEL_TYPES)
+    source_key = models.CharField(max_length=100)
+    destination_key = models.CharField(max_length=100)
+    day = models.DateField()
+    # Null when every option of the cell is sold out.
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    available_seats = models.PositiveIntegerField()
+    options = models.PositiveIntegerField()
+    
+    class Meta:
+        constraints = [
+            # Leading route columns and the day serve the calendar range read.
+            models.UniqueConstraint(fields=['source_key', 'destination_key', 'day', 'type'], name='calendar_cell_key'),
+        ]
+    
+    def __str__(self):
+        return f"{self.type} {self.source_key} to {self.destination_key} on {self.day}"
+
+class BookingRollup(models.Model):
+    """Booking and cancellation totals per booking day, route and travel type.
+
+    Incremented by ``booking.analytics`` as bookings are made and cancelled,
+    so reporting never scans ``Booking``. Cancellations count against the day
+    the booking was made, which keeps each day's cancellation rate a share of
+    that day's bookings.
+    """
+    day = models.DateField()
+    type = models.CharField(max_length=10, choices=TravelOption.TRAVEL_TYPES)
+    source_key = models.CharField(max_length=100)
+    destination_key = models.CharField(max_length=100)
+    source = models.CharField(max_length=100)
+    destination = models.CharField(max_length=100)
+    bookings = models.PositiveIntegerField(default=0)
+    seats = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cancellations = models.PositiveIntegerField(default=0)
+    cancelled_seats = models.PositiveIntegerField(default=0)
+    cancelled_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        constraints = [
+            # Leading day column serves the dashboard's date range reads.
+            models.UniqueConstraint(fields=['day', 'source_key', 'destination_key', 'type'], name='rollup_cell_key'),
+        ]
+    
+    def __str__(self):
+        return f"{self.type} {self.source} to {self.destination} booked on {self.day}"
+
+class WaitlistEntry(models.Model):
+    """A user queued for seats on a sold-out travel option, served first come first served"""
+    STATUS_CHOICES = [
+        ('waiting', 'Waiting'),
+        ('promoted', 'Promoted'),
+        ('left', 'Left'),
+    ]
+    
+    entry_id = models.AutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    travel_option = models.ForeignKey(TravelOption, on_delete=models.CASCADE)
+    number_of_seats = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='waiting')
+    created_at = models.DateTimeField(default=timezone.now)
+    promoted_at = models.DateTimeField(null=True, blank=True)
+    # The checkout hold seats were assigned through; cleared once it is confirmed or released.
+    hold = models.OneToOneField(SeatHold, null=True, blank=True, on_delete=models.SET_NULL)
+    
+    class Meta:
+        verbose_name_plural = 'waitlist entries'
+        indexes = [
+            models.Index(fields=['travel_option', 'status', 'created_at'], name='waitlist_queue_idx'),
+            models.Index(fields=['user', 'created_at'], name='waitlist_user_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Waitlist {self.entry_id} by {self.user.username}"
+
+class OutboxEvent(models.Model):
+    """A side effect of a booking, written in the booking's transaction and run later by ``process_outbox``"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    event_id = models.BigAutoField(primary_key=True)
+    topic = models.CharField(max_length=50)
+    # Events of one travel option are processed in event id order; not a foreign key so archiving keeps them.
+    travel_option_id = models.IntegerField()
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'event_id'], name='outbox_pending_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.topic} {self.event_id} for option {self.travel_option_id}"
+
+class ArchivedTravelOption(models.Model):
+    """A departed travel option moved out of the live table by ``archive_departed``"""
+    travel_id = models.IntegerField(primary_key=True)
+    type = models.CharField(max_length=10, choices=TravelOption.TRAVEL_TYPES)
+    source = models.CharField(max_length=100)
+    destination = models.CharField(max_length=100)
+    source_key = models.CharField(max_length=100)
+    destination_key = models.CharField(max_length=100)
+    date_time = models.DateTimeField()
+    arrival_time = models.DateTimeField()
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    available_seats = models.PositiveIntegerField()
+    capacity = models.PositiveIntegerField()
+    archived_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['date_time'], name='archived_travel_date_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.type} from {self.source} to {self.destination}"
+
+class ArchivedBooking(models.Model):
+    """A booking of an archived travel option, kept for history"""
+    booking_id = models.IntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    travel_option = models.ForeignKey(ArchivedTravelOption, on_delete=models.CASCADE)
+    number_of_seats = models.PositiveIntegerField()
+    seat_numbers = models.JSONField(default=list, blank=True)
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    booking_date = models.DateTimeField()
+    status = models.CharField(max_length=10, choices=Booking.STATUS_CHOICES)
+    archived_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'booking_date'], name='archived_booking_user_idx'),
+        ]
+    
     def __str__(self):
         return f"Booking {self.booking_id} by {self.user.username}"
+
+class RequestProfile(models.Model):
+    """cProfile stats and SQL log of one request profiled by ``booking.profiling``"""
+    profile_id = models.BigAutoField(primary_key=True)
+    view_name = models.CharField(max_length=200)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=2000)
+    status_code = models.PositiveSmallIntegerField()
+    user = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
+    duration_ms = models.FloatField()
+    db_queries = models.PositiveIntegerField()
+    db_ms = models.FloatField()
+    # ``marshal`` dump of the pstats table, as ``pstats.Stats.dump_stats`` writes it.
+    stats = models.BinaryField()
+    # ``[{"sql", "duration_ms", "caller"}]`` in execution order.
+    queries = models.JSONField(default=list)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-profile_id'], name='profile_recent_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.urls import reverse
+from .models import Booking, WaitlistEntry
+from .outbox import BOOKING_CONFIRMED, WAITLIST_PROMOTED, handler
+
+
+def site_url(name, *args):
+    return settings.SITE_URL.rstrip('/') + reverse(name, args=args)
+
+
+def send(messages):
+    """Send ``messages`` over one connection; failures raise so the outbox retries them"""
+    if messages:
+        get_connection().send_messages(messages)
+    return len(messages)
+
+
+def notify_booked(booking_ids):
+    """Email users the confirmation of their new bookings"""
+    bookings = Booking.objects.filter(booking_id__in=booking_ids).select_related('user', 'travel_option')
+    messages = []
+    for booking in bookings:
+        if not booking.user.email:
+            continue
+        option = booking.travel_option
+        messages.append(EmailMessage(
+            subject=f'Booking confirmed: {option.source} to {option.destination}',
+            body=(
+                f'Your booking #{booking.booking_id} for {booking.number_of_seats} seat(s) on the {option.type} '
+                f'from {option.source} to {option.destination} on {option.date_time:%b %d, %Y %H:%M} is confirmed. '
+                f'Total paid: ${booking.total_price}.\n\nManage your bookings: {site_url("my_bookings")}\n'
+            ),
+            to=[booking.user.email],
+        ))
+    return send(messages)
+
+
+def notify_promoted(entry_ids):
+    """Email users whose waitlist entries were just turned into seat holds"""
+    entries = WaitlistEntry.objects.filter(entry_id__in=entry_ids).select_related('user', 'travel_option', 'hold')
+    messages = []
+    for entry in entries:
+        if not entry.user.email or entry.hold is None:
+            continue
+        option = entry.travel_option
+        messages.append(EmailMessage(
+            subject=f'Seats available: {option.source} to {option.destination}',
+            body=(
+                f'Good news! {entry.number_of_seats} seat(s) on the {option.type} from {option.source} '
+                f'to {option.destination} on {option.date_time:%b %d, %Y %H:%M} are being held for you '
+                f'until {entry.hold.expires_at:%b %d, %Y %H:%M}.\n\n'
+                f'Confirm your booking: {site_url("checkout", entry.hold.hold_id)}\n'
+            ),
+            to=[entry.user.email],
+        ))
+    return send(messages)
+
+
+@handler(BOOKING_CONFIRMED)
+def send_booking_confirmations(events):
+    notify_booked([event['booking_id'] for event in events])
+
+
+@handler(WAITLIST_PROMOTED)
+def send_waitlist_promotions(events):
+    notify_promoted([entry_id for event in events for entry_id in event['entry_ids']])
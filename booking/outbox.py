@@ -0,0 +1,141 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import groupby
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import OutboxEvent
+
+ROLLUP = 'booking_rollup'
+BOOKING_CONFIRMED = 'booking_confirmed'
+WAITLIST_PROMOTED = 'waitlist_promoted'
+
+# Topic -> function called with the payloads of consecutive events of one travel option.
+HANDLERS = {}
+
+
+def handler(topic):
+    """Register the function that runs ``topic`` events"""
+    def register(func):
+        HANDLERS[topic] = func
+        return func
+    return register
+
+
+def publish(events):
+    """Queue ``[(topic, travel_option_id, payload)]`` in the caller's transaction"""
+    now = timezone.now()
+    OutboxEvent.objects.bulk_create([
+        OutboxEvent(topic=topic, travel_option_id=travel_id, payload=payload, created_at=now, available_at=now)
+        for topic, travel_id, payload in events
+    ])
+
+
+def retry_delay(attempts):
+    """Exponential backoff after ``attempts`` failures, capped at an hour"""
+    return timedelta(seconds=min(settings.OUTBOX_RETRY_DELAY * 2 ** (attempts - 1), 3600))
+
+
+def claim(batch_size, now=None):
+    """Lease the next ready events, grouped by travel option in event id order.
+
+    Pending events are read oldest first. An option with an event waiting
+    for a retry or leased by another worker is skipped entirely, so an event
+    never overtakes an earlier one of its option, and stuck options do not
+    crowd the others out of the batch.
+    """
+    now = now or timezone.now()
+    held = OutboxEvent.objects.filter(status='pending').filter(Q(available_at__gt=now) | Q(locked_until__gt=now))
+    with transaction.atomic():
+        window = (
+            OutboxEvent.objects.select_for_update()
+            .filter(status='pending')
+            .exclude(travel_option_id__in=held.values('travel_option_id'))
+            .order_by('event_id')[:batch_size]
+        )
+        groups = {}
+        for event in window:
+            groups.setdefault(event.travel_option_id, []).append(event)
+        if groups:
+            OutboxEvent.objects.filter(
+                event_id__in=[event.event_id for events in groups.values() for event in events],
+            ).update(locked_until=now + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS))
+    return groups
+
+
+def run_events(events):
+    """Run one option's leased events in order, stopping at the first failure.
+
+    Each run of same-topic events is handled in one transaction together
+    with marking it done, so database side effects happen exactly once even
+    if an expired lease lets a second worker pick the events up. Returns
+    ``(done, failed)``.
+    """
+    done = 0
+    runs = [list(run) for _, run in groupby(events, key=lambda event: event.topic)]
+    for index, run in enumerate(runs):
+        try:
+            with transaction.atomic():
+                pending = list(
+                    OutboxEvent.objects.select_for_update()
+                    .filter(event_id__in=[event.event_id for event in run], status='pending')
+                    .order_by('event_id')
+                )
+                if pending:
+                    HANDLERS[run[0].topic]([event.payload for event in pending])
+                    OutboxEvent.objects.filter(event_id__in=[event.event_id for event in pending]).update(
+                        status='done', processed_at=timezone.now(), locked_until=None,
+                    )
+        except Exception as exc:
+            schedule_retry(run, exc)
+            # Later events of the option stay queued behind the failed one.
+            OutboxEvent.objects.filter(
+                event_id__in=[event.event_id for later in runs[index + 1:] for event in later],
+            ).update(locked_until=None)
+            return done, len(run)
+        done += len(pending)
+    return done, 0
+
+
+def schedule_retry(events, exc):
+    """Schedule a retry of ``events``, or give up on them after ``OUTBOX_MAX_ATTEMPTS``"""
+    now = timezone.now()
+    for event in events:
+        event.attempts += 1
+        event.available_at = now + retry_delay(event.attempts)
+        event.locked_until = None
+        event.last_error = f'{type(exc).__name__}: {exc}'
+        if event.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            event.status = 'failed'
+    OutboxEvent.objects.bulk_update(events, ['attempts', 'available_at', 'locked_until', 'last_error', 'status'])
+
+
+def run_in_thread(events):
+    try:
+        return run_events(events)
+    finally:
+        # Worker threads open their own connections; do not leak one per task.
+        connection.close()
+
+
+def process_batch(batch_size=200, workers=1, now=None):
+    """Claim one batch and run it, one travel option per thread; returns ``(done, failed)``"""
+    groups = list(claim(batch_size, now).values())
+    if workers <= 1 or len(groups) <= 1:
+        results = [run_events(events) for events in groups]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(run_in_thread, groups))
+    return sum(done for done, _ in results), sum(failed for _, failed in results)
+
+
+def drain(batch_size=200, workers=1):
+    """Process batches until no ready event is left; returns ``(done, failed)``"""
+    done = failed = 0
+    while True:
+        batch_done, batch_failed = process_batch(batch_size, workers)
+        if not batch_done and not batch_failed:
+            return done, failed
+        done += batch_done
+        failed += batch_failed
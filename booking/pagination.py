@@ -0,0 +1,260 @@
+import base64
+import json
+from datetime import date
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+class InvalidCursor(Exception):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor=None, previous_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class KeysetPaginator:
+    """Cursor pagination over a unique, indexed ordering.
+
+    Each page is fetched with a ``WHERE (keys) > (cursor) ... LIMIT n+1`` query,
+    so the cost stays proportional to the page size at any depth and no
+    OFFSET or COUNT(*) is ever issued. ``ordering`` is a list of field names,
+    prefixed with ``-`` for descending, whose last entry must be unique.
+    """
+
+    def __init__(self, queryset, ordering, page_size):
+        self.queryset = queryset
+        self.ordering = list(ordering)
+        self.page_size = page_size
+        self.fields = [name.lstrip('-') for name in self.ordering]
+        self.descending = [name.startswith('-') for name in self.ordering]
+
+    def _values(self, item):
+        if isinstance(item, dict):
+            return [item[name] for name in self.fields]
+        return [getattr(item, name) for name in self.fields]
+
+    def encode_cursor(self, item):
+        values = self._values(item)
+        # isoformat keeps microseconds, which the keyset comparison needs.
+        values = [value.isoformat() if isinstance(value, date) else value for value in values]
+        raw = json.dumps(values, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, token):
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+            if not isinstance(values, list) or len(values) != len(self.fields):
+                raise ValueError(token)
+            model = self.queryset.model
+            return [model._meta.get_field(name).to_python(value) for name, value in zip(self.fields, values)]
+        except Exception as exc:
+            raise InvalidCursor(token) from exc
+
+    def _seek(self, values, forward):
+        """Build the predicate selecting rows strictly past ``values``"""
+        condition = Q()
+        for position in reversed(range(len(self.fields))):
+            name = self.fields[position]
+            upward = forward != self.descending[position]
+            step = Q(**{f'{name}__gt' if upward else f'{name}__lt': values[position]})
+            if position < len(self.fields) - 1:
+                step |= Q(**{name: values[position]}) & condition
+            condition = step
+        # Redundant bound on the leading key lets the optimizer use a range scan.
+        leading = self.fields[0]
+        upward = forward != self.descending[0]
+        bound = Q(**{f'{leading}__gte' if upward else f'{leading}__lte': values[0]})
+        return bound & condition
+
+    def _order_by(self, forward):
+        if forward:
+            return self.ordering
+        return [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+
+    def _rows(self, token, forward):
+        queryset = self.queryset
+        if token:
+            queryset = queryset.filter(self._seek(self.decode_cursor(token), forward))
+        return queryset.order_by(*self._order_by(forward))[:self.page_size + 1]
+
+    def _make_page(self, rows, token, forward):
+        more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if not forward:
+            rows.reverse()
+        if not rows:
+            return KeysetPage(rows)
+
+        if forward:
+            has_next, has_previous = more, bool(token)
+        else:
+            has_next, has_previous = True, more
+        return KeysetPage(
+            rows,
+            next_cursor=self.encode_cursor(rows[-1]) if has_next else None,
+            previous_cursor=self.encode_cursor(rows[0]) if has_previous else None,
+        )
+
+    def page(self, after=None, before=None):
+        """Return the page following ``after`` or preceding ``before`` (cursor tokens)"""
+        forward = not before
+        token = after if forward else before
+        return self._make_page(list(self._rows(token, forward)), token, forward)
+
+    async def apage(self, after=None, before=None):
+        """Async variant of ``page`` using the async ORM"""
+        forward = not before
+        token = after if forward else before
+        rows = [row async for row in self._rows(token, forward)]
+        return self._make_page(rows, token, forward)
+
+    def _chunk(self, values, size):
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, True))
+        return queryset.order_by(*self.ordering)[:size]
+
+    def stream(self, after=None, limit=None, chunk_size=1000):
+        """Yield up to ``limit`` rows past the ``after`` cursor, ``chunk_size`` at a time.
+
+        Every chunk is its own keyset query read with ``iterator()``, so memory
+        stays bounded even where the driver buffers whole result sets (MySQL).
+        """
+        values = self.decode_cursor(after) if after else None
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            count = 0
+            for row in self._chunk(values, size).iterator(chunk_size=size):
+                count += 1
+                yield row
+            if count < size:
+                return
+            values = self._values(row)
+            if remaining is not None:
+                remaining -= count
+
+    async def astream(self, after=None, limit=None, chunk_size=1000):
+        """Async variant of ``stream`` using the async ORM"""
+        values = self.decode_cursor(after) if after else None
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            count = 0
+            async for row in self._chunk(values, size).aiterator(chunk_size=size):
+                count += 1
+                yield row
+            if count < size:
+                return
+            values = self._values(row)
+            if remaining is not None:
+                remaining -= count
+
+
+def estimated_row_count(model, using='default'):
+    """Planner statistics row count of ``model``'s table, or None where unavailable"""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s',
+                [table],
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)', [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """``Paginator`` for admin changelists over tables too big to COUNT(*).
+
+    An unfiltered list takes its total from the table statistics once they
+    exceed ``exact_limit``. A filtered list is counted exactly up to
+    ``exact_limit`` rows and reports that bound beyond it, so the count never
+    scans more than ``exact_limit`` rows.
+    """
+
+    exact_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > self.exact_limit:
+                return estimate
+        return queryset.order_by()[:self.exact_limit].count()
+
+
+def get_page_size(request, setting_name, default=20, maximum=100):
+    """Read the requested page size, bounded by the project setting"""
+    size = getattr(settings, setting_name, default)
+    try:
+        size = int(request.GET.get('page_size', size))
+    except (TypeError, ValueError):
+        pass
+    return max(1, min(size, maximum))
+
+
+def fetch_page(request, paginator):
+    """Fetch the page selected by the ``after``/``before`` query parameters"""
+    try:
+        return paginator.page(after=request.GET.get('after'), before=request.GET.get('before'))
+    except InvalidCursor:
+        return paginator.page()
+
+
+async def afetch_page(request, paginator):
+    """Async variant of ``fetch_page``"""
+    try:
+        return await paginator.apage(after=request.GET.get('after'), before=request.GET.get('before'))
+    except InvalidCursor:
+        return await paginator.apage()
+
+
+def page_links(request, page):
+    """Return query strings for the next and previous pages, keeping the current filters"""
+    def link(name, cursor):
+        if cursor is None:
+            return None
+        params = request.GET.copy()
+        params.pop('after', None)
+        params.pop('before', None)
+        params[name] = cursor
+        return params.urlencode()
+
+    return link('after', page.next_cursor), link('before', page.previous_cursor)
+
+
+def paginate_request(request, paginator):
+    """Fetch the requested page together with its next/previous query strings"""
+    page = fetch_page(request, paginator)
+    return (page, *page_links(request, page))
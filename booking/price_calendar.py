@@ -0,0 +1,188 @@
+from collections import defaultdict
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+from django.db import connection, models, transaction
+from django.db.models import Case, Count, F, Min, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import PriceCalendarDay, TravelOption, normalize_city
+from .search import day_range
+
+CELL_COLUMNS = ['type', 'source_key', 'destination_key', 'date_time']
+TOTAL_FIELDS = ['min_price', 'available_seats', 'options']
+# Route spans recomputed per aggregate query.
+SPANS_PER_QUERY = 200
+
+
+def cell_filter(cells):
+    """Q matching the calendar rows of ``(source_key, destination_key, type, day)`` cells"""
+    return reduce(or_, [
+        Q(source_key=source_key, destination_key=destination_key, type=travel_type, day=day)
+        for source_key, destination_key, travel_type, day in cells
+    ])
+
+
+def aggregate(queryset):
+    """Group travel options into calendar totals, one row per cell.
+
+    ``min_price`` only counts options with seats left, so a cell whose
+    options are all sold out has no fare.
+    """
+    return queryset.annotate(day=TruncDate('date_time')).values(
+        'source_key', 'destination_key', 'type', 'day',
+    ).annotate(
+        min_price=Min('price', filter=Q(available_seats__gt=0)),
+        available_seats=Sum('available_seats'),
+        options=Count('travel_id'),
+    ).order_by()
+
+
+class PriceCalendar:
+    """Keeps ``PriceCalendarDay`` in step with the catalogue.
+
+    Catalogue writes recompute just the cells they touch, inside the same
+    transaction. Seat changes from bookings, holds and cancellations only
+    move the seat total, so they are applied as an ``F()`` delta without
+    re-aggregating, unless an option sells out or reopens and the cheapest
+    bookable fare has to be recomputed. ``rebuild`` recomputes every cell
+    for recovery.
+    """
+
+    def cell(self, travel_type, source_key, destination_key, date_time):
+        return (source_key, destination_key, travel_type, timezone.localdate(date_time))
+
+    def cells_of(self, options):
+        """Cells of saved options or of ``CELL_COLUMNS`` value dicts"""
+        cells = set()
+        for option in options:
+            if isinstance(option, dict):
+                cells.add(self.cell(*[option[name] for name in CELL_COLUMNS]))
+            else:
+                cells.add(self.cell(*[getattr(option, name) for name in CELL_COLUMNS]))
+        return cells
+
+    def cells_of_ids(self, travel_ids):
+        return self.cells_of(TravelOption.objects.filter(travel_id__in=travel_ids).values(*CELL_COLUMNS))
+
+    def cells_of_queryset(self, queryset):
+        return self.cells_of(queryset.order_by().values(*CELL_COLUMNS).distinct())
+
+    def refresh(self, cells):
+        """Recompute ``cells`` from the options in them and store the result"""
+        cells = set(cells)
+        if not cells:
+            return
+        # One date range per route and type keeps the aggregate on travel_natural_key.
+        spans = defaultdict(list)
+        for source_key, destination_key, travel_type, day in cells:
+            spans[source_key, destination_key, travel_type].append(day)
+        spans = [(route, min(days), max(days)) for route, days in spans.items()]
+
+        found = []
+        for start in range(0, len(spans), SPANS_PER_QUERY):
+            query = reduce(or_, [
+                Q(
+                    type=travel_type, source_key=source_key, destination_key=destination_key,
+                    date_time__gte=day_range(first)[0], date_time__lt=day_range(last)[1],
+                )
+                for (source_key, destination_key, travel_type), first, last in spans[start:start + SPANS_PER_QUERY]
+            ])
+            found.extend(
+                row for row in aggregate(TravelOption.objects.filter(query))
+                if (row['source_key'], row['destination_key'], row['type'], row['day']) in cells
+            )
+
+        if found:
+            conflict_options = {'update_conflicts': True, 'update_fields': TOTAL_FIELDS}
+            # MySQL upserts on any unique key and rejects a conflict target.
+            if connection.features.supports_update_conflicts_with_target:
+                conflict_options['unique_fields'] = ['source_key', 'destination_key', 'day', 'type']
+            PriceCalendarDay.objects.bulk_create([PriceCalendarDay(**row) for row in found], **conflict_options)
+        emptied = cells - {(row['source_key'], row['destination_key'], row['type'], row['day']) for row in found}
+        if emptied:
+            PriceCalendarDay.objects.filter(cell_filter(emptied)).delete()
+
+    def seats_changed(self, deltas):
+        """Apply ``{travel_id: seat delta}`` to the seat totals of their cells"""
+        by_cell, repriced = defaultdict(int), set()
+        options = TravelOption.objects.filter(travel_id__in=list(deltas)).values('travel_id', 'available_seats', *CELL_COLUMNS)
+        for option in options:
+            cell = self.cell(*[option[name] for name in CELL_COLUMNS])
+            delta = deltas[option['travel_id']]
+            by_cell[cell] += delta
+            # Selling out or reopening an option can move the cheapest bookable fare.
+            if delta and (option['available_seats'] == 0 or option['available_seats'] == delta):
+                repriced.add(cell)
+        if repriced:
+            self.refresh(repriced)
+        by_cell = {cell: delta for cell, delta in by_cell.items() if delta and cell not in repriced}
+        if not by_cell:
+            return
+        if len(by_cell) == 1:
+            (cell, delta), = by_cell.items()
+            change = Value(delta)
+        else:
+            change = Case(
+                *[When(cell_filter([cell]), then=Value(delta)) for cell, delta in by_cell.items()],
+                output_field=models.IntegerField(),
+            )
+        PriceCalendarDay.objects.filter(cell_filter(by_cell)).update(available_seats=F('available_seats') + change)
+
+    def rebuild(self, batch_size=1000):
+        """Replace every cell with totals aggregated from the catalogue; returns the cell count"""
+        with transaction.atomic():
+            PriceCalendarDay.objects.all().delete()
+            batch, cells = [], 0
+            for row in aggregate(TravelOption.objects.all()).iterator(chunk_size=batch_size):
+                batch.append(PriceCalendarDay(**row))
+                if len(batch) >= batch_size:
+                    PriceCalendarDay.objects.bulk_create(batch)
+                    cells += len(batch)
+                    batch = []
+            PriceCalendarDay.objects.bulk_create(batch)
+        return cells + len(batch)
+
+    def queryset(self, source, destination, travel_type=None, start=None, days=60):
+        start = start or timezone.localdate()
+        queryset = PriceCalendarDay.objects.filter(
+            source_key=normalize_city(source),
+            destination_key=normalize_city(destination),
+            day__gte=start,
+            day__lt=start + timedelta(days=days),
+        )
+        if travel_type:
+            queryset = queryset.filter(type=travel_type)
+        return queryset.order_by('day').values('day', 'type', *TOTAL_FIELDS)
+
+    def merge(self, rows):
+        """Fold the per-type rows of each day into one calendar entry"""
+        calendar = {}
+        for row in rows:
+            entry = calendar.get(row['day'])
+            if entry is None:
+                calendar[row['day']] = {
+                    'date': row['day'],
+                    'min_price': row['min_price'],
+                    'available_seats': row['available_seats'],
+                    'options': row['options'],
+                    'types': [row['type']],
+                }
+                continue
+            if entry['min_price'] is None or row['min_price'] is not None and row['min_price'] < entry['min_price']:
+                entry['min_price'] = row['min_price']
+            entry['available_seats'] += row['available_seats']
+            entry['options'] += row['options']
+            entry['types'].append(row['type'])
+        return list(calendar.values())
+
+    def days(self, source, destination, travel_type=None, start=None, days=60):
+        """Cheapest fare per day on a route, read from the summary table"""
+        return self.merge(self.queryset(source, destination, travel_type, start, days))
+
+    async def adays(self, source, destination, travel_type=None, start=None, days=60):
+        queryset = self.queryset(source, destination, travel_type, start, days)
+        return self.merge([row async for row in queryset])
+
+
+price_calendar = PriceCalendar()
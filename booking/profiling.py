@@ -0,0 +1,178 @@
+import cProfile
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from io import StringIO
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from . import instrumentation
+from .instrumentation import AsyncCapableMiddleware, current_capture
+from .models import RequestProfile
+
+HEADER = 'X-Profile'
+META_KEY = 'HTTP_X_PROFILE'
+QUERY_PARAM = '_profile'
+SALT = 'booking.profiling'
+
+PROJECT_DIR = str(settings.BASE_DIR) + os.sep
+# Frames of the hooks themselves are never the interesting caller.
+HOOK_FILES = {os.path.abspath(__file__), os.path.abspath(instrumentation.__file__)}
+
+# The profiler hook is per thread before Python 3.12 and per interpreter after,
+# and in an event loop it is shared by every coroutine: one profile at a time.
+profiler_lock = threading.Lock()
+
+
+def make_token():
+    """Value of the ``X-Profile`` header, valid for ``PROFILING_TOKEN_MAX_AGE`` seconds"""
+    return signing.TimestampSigner(salt=SALT).sign('profile')
+
+
+def token_valid(token):
+    try:
+        return signing.TimestampSigner(salt=SALT).unsign(token, max_age=settings.PROFILING_TOKEN_MAX_AGE) == 'profile'
+    except signing.BadSignature:
+        return False
+
+
+def caller(frame):
+    """``path:line in function`` of the innermost project frame that ran a query"""
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(PROJECT_DIR) and 'site-packages' not in filename and filename not in HOOK_FILES:
+            return f'{filename[len(PROJECT_DIR):]}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+class ProfileCapture:
+    """cProfile and query log of the request being profiled"""
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self.queries = []
+        self.db_seconds = 0.0
+        self.started = time.perf_counter()
+
+    def query(self, sql, many, seconds):
+        self.db_seconds += seconds
+        self.queries.append({
+            'sql': sql,
+            'many': many,
+            'duration_ms': round(seconds * 1000, 3),
+            'caller': caller(sys._getframe(1)),
+        })
+
+    def stats(self):
+        self.profiler.create_stats()
+        return marshal.dumps(self.profiler.stats)
+
+
+class DumpedStats:
+    """Stands in for a profiler so ``pstats.Stats`` can load a stored dump"""
+
+    def __init__(self, data):
+        self.stats = marshal.loads(data)
+
+    def create_stats(self):
+        pass
+
+
+def summary(data, limit=30, sort='cumulative'):
+    """The ``limit`` top functions of a stored dump, as ``pstats`` prints them"""
+    stream = StringIO()
+    pstats.Stats(DumpedStats(bytes(data)), stream=stream).sort_stats(sort).print_stats(limit)
+    return stream.getvalue()
+
+
+class ProfilingMiddleware(AsyncCapableMiddleware):
+    """Profile a request on demand and store the result as a ``RequestProfile``.
+
+    Requests opt in with a signed ``X-Profile`` header (``manage.py
+    profile_token``) or, for staff users, a ``_profile`` query parameter.
+    Everything downstream runs under cProfile while every SQL statement is
+    logged with its duration and calling project frame. The response names
+    the stored profile in ``X-Profile-Id``. Other requests cost one header
+    and one query parameter lookup; list it after ``AuthenticationMiddleware``.
+
+    One request is profiled at a time. Requests asking while the profiler is
+    busy, or while another tool such as a debugger holds the hook, are served
+    unprofiled. Under ASGI the profiler covers the whole event loop thread:
+    other coroutines running while the request awaits are included in its
+    profile, and ORM work an async view hands to ``sync_to_async`` shows up
+    as waiting. The query log only has the request's own statements.
+    """
+
+    def requested(self, request):
+        return META_KEY in request.META or QUERY_PARAM in request.GET
+
+    def signed(self, request):
+        return token_valid(request.META.get(META_KEY, ''))
+
+    def start(self):
+        """A running ``ProfileCapture``, or None when the profiler is taken"""
+        if not profiler_lock.acquire(blocking=False):
+            return None
+        capture = ProfileCapture()
+        try:
+            capture.profiler.enable()
+        except ValueError:
+            # Python 3.12+ refuses a second profiler, e.g. under a debugger.
+            profiler_lock.release()
+            return None
+        return capture
+
+    def stop(self, capture):
+        capture.profiler.disable()
+        profiler_lock.release()
+
+    def handle(self, request):
+        if not self.requested(request) or not (self.signed(request) or request.user.is_staff):
+            return self.get_response(request)
+        capture = self.start()
+        if capture is None:
+            return self.get_response(request)
+        token = current_capture.set(capture)
+        try:
+            response = self.get_response(request)
+        finally:
+            self.stop(capture)
+            current_capture.reset(token)
+        response['X-Profile-Id'] = self.save(request, response, capture).profile_id
+        return response
+
+    async def __acall__(self, request):
+        if not self.requested(request) or not (self.signed(request) or (await request.auser()).is_staff):
+            return await self.get_response(request)
+        capture = self.start()
+        if capture is None:
+            return await self.get_response(request)
+        token = current_capture.set(capture)
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.stop(capture)
+            current_capture.reset(token)
+        profile = await sync_to_async(self.save)(request, response, capture)
+        response['X-Profile-Id'] = profile.profile_id
+        return response
+
+    def save(self, request, response, capture):
+        match = getattr(request, 'resolver_match', None)
+        user = getattr(request, 'user', None)
+        return RequestProfile.objects.create(
+            view_name=(match.view_name if match else None) or 'unmatched',
+            method=request.method,
+            path=request.get_full_path()[:2000],
+            status_code=response.status_code,
+            user=user if user is not None and user.is_authenticated else None,
+            duration_ms=(time.perf_counter() - capture.started) * 1000,
+            db_queries=len(capture.queries),
+            db_ms=capture.db_seconds * 1000,
+            stats=capture.stats(),
+            queries=capture.queries,
+        )
@@ -0,0 +1,69 @@
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from .models import Booking, SeatHold, TravelOption
+from .reservations import lock_seat_maps, promote_waitlist, seats_changed, write_seat_maps
+
+
+def seats_taken(model, **filters):
+    """Seats of ``model`` rows (bookings or holds) per travel option, as a correlated subquery"""
+    return Coalesce(Subquery(
+        model.objects.filter(travel_option=OuterRef('pk'), **filters)
+        .order_by().values('travel_option').annotate(total=Sum('number_of_seats')).values('total')
+    ), Value(0))
+
+
+def expected_seats():
+    """Capacity minus confirmed bookings and live or not yet swept holds"""
+    return F('capacity') - seats_taken(Booking, status='confirmed') - seats_taken(SeatHold)
+
+
+def find_drift(chunk_size=1000, on_chunk=None):
+    """Yield options whose ``available_seats`` disagrees with their bookings and holds.
+
+    Options are read in travel id chunks with one query each, the sums
+    computed by the database, so memory stays bounded by the chunk however
+    many bookings there are. Yields dicts with ``travel_id``,
+    ``available_seats``, ``capacity``, ``booked``, ``held`` and ``expected``.
+    """
+    last = 0
+    while True:
+        rows = list(
+            TravelOption.objects.filter(travel_id__gt=last)
+            .order_by('travel_id')
+            .annotate(booked=seats_taken(Booking, status='confirmed'), held=seats_taken(SeatHold))
+            .values('travel_id', 'available_seats', 'capacity', 'booked', 'held')[:chunk_size]
+        )
+        if not rows:
+            return
+        for row in rows:
+            row['expected'] = row['capacity'] - row['booked'] - row['held']
+            if row['expected'] != row['available_seats']:
+                yield row
+        last = rows[-1]['travel_id']
+        if on_chunk:
+            on_chunk(last, len(rows))
+
+
+def repair(travel_ids):
+    """Reset ``available_seats`` of ``travel_ids`` from their bookings and holds in one UPDATE.
+
+    The options are locked first, in id order like every other seat writer,
+    and the expected count is recomputed inside the UPDATE, so bookings
+    made since ``find_drift`` read them are not undone. Oversold options
+    are floored at zero, and seat maps are refitted around booked and held
+    seats. Returns the ``{travel_id: delta}`` applied.
+    """
+    with transaction.atomic():
+        before = dict(
+            TravelOption.objects.select_for_update().filter(travel_id__in=travel_ids)
+            .order_by('travel_id').values_list('travel_id', 'available_seats')
+        )
+        TravelOption.objects.filter(travel_id__in=list(before)).update(available_seats=Greatest(expected_seats(), 0))
+        after = TravelOption.objects.filter(travel_id__in=list(before)).values_list('travel_id', 'available_seats')
+        deltas = {travel_id: seats - before[travel_id] for travel_id, seats in after if seats != before[travel_id]}
+        if deltas:
+            write_seat_maps(lock_seat_maps(deltas), {})
+            seats_changed(deltas)
+            promote_waitlist([travel_id for travel_id, delta in deltas.items() if delta > 0])
+    return deltas
@@ -0,0 +1,388 @@
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+from .models import TravelOption, Booking, SeatHold, WaitlistEntry
+from .analytics import booking_analytics
+from .outbox import BOOKING_CONFIRMED, ROLLUP, WAITLIST_PROMOTED, publish
+from .price_calendar import price_calendar
+from .routes import route_graph
+from .search_cache import search_cache
+from .seatmap import SEATS_PER_ROW, SeatMap
+
+
+class SeatsUnavailable(Exception):
+    """Raised when a travel option cannot cover the requested seats"""
+
+
+class BookingNotCancellable(Exception):
+    """Raised when a booking is no longer confirmed"""
+
+
+class HoldExpired(Exception):
+    """Raised when a seat hold has expired or was already used"""
+
+
+def seats_changed(deltas):
+    """Propagate ``{travel_id: delta}`` seat moves to the price calendar, search cache and route graph"""
+    price_calendar.seats_changed(deltas)
+    search_cache.invalidate_options(list(deltas))
+    route_graph.seats_changed(deltas)
+
+
+def booked(booking):
+    """Queue the rollup and confirmation email of a new booking; the request does not wait for them"""
+    publish([
+        (ROLLUP, booking.travel_option_id, booking_analytics.events([booking])[0]),
+        (BOOKING_CONFIRMED, booking.travel_option_id, {'booking_id': booking.booking_id}),
+    ])
+
+
+def assigned_seats(travel_id):
+    """Seat numbers of an option's confirmed bookings and holds"""
+    seats = set()
+    for model, filters in ((Booking, {'status': 'confirmed'}), (SeatHold, {})):
+        for numbers in model.objects.filter(travel_option_id=travel_id, **filters).values_list('seat_numbers', flat=True):
+            seats.update(numbers)
+    return seats
+
+
+def lock_seat_maps(travel_ids, fields=(), pending=None):
+    """Lock options in id order and attach their ``SeatMap`` as ``layout``.
+
+    A map not laid out yet, or out of step with ``available_seats`` after an
+    edit, is fitted first; seats it frees are never booked or held ones.
+    ``pending`` counts seats already taken off ``available_seats`` but not
+    yet placed on the map. Returns ``{travel_id: option}``.
+    """
+    pending = pending or {}
+    options = {}
+    for option in (
+        TravelOption.objects.select_for_update().filter(travel_id__in=list(travel_ids))
+        .order_by('travel_id').only('travel_id', 'type', 'capacity', 'available_seats', 'seat_map', *fields)
+    ):
+        option.layout = SeatMap.from_bytes(option.seat_map, option.capacity, SEATS_PER_ROW.get(option.type))
+        taken = option.capacity - option.available_seats - pending.get(option.travel_id, 0)
+        option.layout.fit(taken, keep=assigned_seats(option.travel_id) if option.layout.taken > taken else ())
+        options[option.travel_id] = option
+    return options
+
+
+def write_seat_maps(options, deltas):
+    """Store the maps of locked ``options`` and add ``{travel_id: delta}`` to their seat counts in one UPDATE"""
+    changes = {'updated_at': timezone.now(), 'seat_map': Case(
+        *[When(travel_id=travel_id, then=Value(option.layout.to_bytes())) for travel_id, option in options.items()],
+        output_field=models.BinaryField(),
+    )}
+    if deltas:
+        changes['available_seats'] = F('available_seats') + Case(
+            *[When(travel_id=travel_id, then=Value(deltas.get(travel_id, 0))) for travel_id in options],
+            output_field=models.IntegerField(),
+        )
+    TravelOption.objects.filter(travel_id__in=list(options)).update(**changes)
+
+
+def take_seats(travel_option, seats, seat_numbers=None):
+    """Seat a party on a travel option; returns its seat numbers or raises ``SeatsUnavailable``.
+
+    The count comes off first with a conditional UPDATE guarded by
+    ``available_seats >= seats``, which also locks the row, so sold-out
+    options fail fast and the map is placed while no other booker can
+    touch it. Must run inside the caller's transaction: requested seats
+    that turn out to be taken roll the decrement back. Requesting a seat
+    twice raises ``ValueError`` before anything is written.
+    """
+    if seat_numbers and len(set(seat_numbers)) != len(seat_numbers):
+        raise ValueError('A seat can only be picked once')
+    travel_id = travel_option.travel_id
+    taken = TravelOption.objects.filter(
+        travel_id=travel_id,
+        available_seats__gte=seats,
+    ).update(available_seats=F('available_seats') - seats, updated_at=timezone.now())
+    if not taken:
+        raise SeatsUnavailable(travel_id)
+
+    option = lock_seat_maps([travel_id], pending={travel_id: seats})[travel_id]
+    chosen = option.layout.allocate(seats, seat_numbers)
+    if not chosen:
+        raise SeatsUnavailable(travel_id)
+    option.layout.take(chosen)
+    write_seat_maps({travel_id: option}, {})
+    return chosen
+
+
+def return_seats(released):
+    """Free the seats of cancelled bookings or dropped holds, ``[(travel_id, count, seat_numbers)]``.
+
+    Numbered seats are freed exactly; for rows from before seats were
+    numbered the map is refitted around the seats still booked or held.
+    One UPDATE covers every option. Returns ``{travel_id: seats}``.
+    """
+    counts = Counter()
+    for travel_id, count, _ in released:
+        counts[travel_id] += count
+    options = lock_seat_maps(counts)
+    for travel_id, _, seat_numbers in released:
+        if travel_id in options:
+            options[travel_id].layout.release(seat_numbers)
+    for travel_id, option in options.items():
+        taken = option.capacity - option.available_seats - counts[travel_id]
+        if option.layout.taken > taken:
+            option.layout.fit(taken, keep=assigned_seats(travel_id))
+    if options:
+        write_seat_maps(options, counts)
+    return counts
+
+
+def reserve_seats(user, travel_option, seats, seat_numbers=None):
+    """Seat a party on a travel option and record the booking in one transaction.
+
+    The option row stays locked from the seat decrement until the seats are
+    placed on its seat map, so concurrent bookers queue on that single row
+    and can never oversell or share a seat. Without ``seat_numbers`` the
+    party is seated together where possible.
+    """
+    if seats < 1:
+        raise ValueError('At least one seat must be booked')
+
+    with transaction.atomic():
+        chosen = take_seats(travel_option, seats, seat_numbers)
+        booking = Booking.objects.create(
+            user=user,
+            travel_option=travel_option,
+            number_of_seats=seats,
+            seat_numbers=chosen,
+            total_price=travel_option.price * seats,
+        )
+        booked(booking)
+        seats_changed({travel_option.travel_id: -seats})
+
+    return booking
+
+
+def release_seats(booking):
+    """Cancel a confirmed booking and hand its seats back in one transaction.
+
+    The status flip is conditional on the booking still being confirmed, so
+    two concurrent cancellations only return the seats once.
+    """
+    with transaction.atomic():
+        cancelled = Booking.objects.filter(
+            booking_id=booking.booking_id,
+            status='confirmed',
+        ).update(status='cancelled')
+        if not cancelled:
+            raise BookingNotCancellable(booking.booking_id)
+
+        return_seats([(booking.travel_option_id, booking.number_of_seats, booking.seat_numbers)])
+        publish([(ROLLUP, booking.travel_option_id, booking_analytics.events([booking], cancelled_only=True)[0])])
+        seats_changed({booking.travel_option_id: booking.number_of_seats})
+        promote_waitlist([booking.travel_option_id])
+
+    booking.status = 'cancelled'
+    return booking
+
+
+def hold_seats(user, travel_option, seats, ttl=None, seat_numbers=None):
+    """Seat a party on a travel option and park the seats in a hold for ``ttl`` seconds.
+
+    This is the only step of the checkout that writes the travel option row;
+    ``confirm_hold`` later turns the hold into a booking without touching it.
+    """
+    if seats < 1:
+        raise ValueError('At least one seat must be held')
+    if ttl is None:
+        ttl = settings.SEAT_HOLD_TTL
+
+    with transaction.atomic():
+        chosen = take_seats(travel_option, seats, seat_numbers)
+        now = timezone.now()
+        hold = SeatHold.objects.create(
+            user=user,
+            travel_option=travel_option,
+            number_of_seats=seats,
+            seat_numbers=chosen,
+            total_price=travel_option.price * seats,
+            created_at=now,
+            expires_at=now + timedelta(seconds=ttl),
+        )
+        seats_changed({travel_option.travel_id: -seats})
+
+    return hold
+
+
+def confirm_hold(hold):
+    """Convert a live hold into a confirmed booking.
+
+    The hold row is deleted only while it is still unexpired, so a hold
+    swept by ``release_expired_holds`` can never be confirmed as well.
+    """
+    with transaction.atomic():
+        claimed, _ = SeatHold.objects.filter(
+            hold_id=hold.hold_id,
+            expires_at__gt=timezone.now(),
+        ).delete()
+        if not claimed:
+            raise HoldExpired(hold.hold_id)
+
+        booking = Booking.objects.create(
+            user_id=hold.user_id,
+            travel_option_id=hold.travel_option_id,
+            number_of_seats=hold.number_of_seats,
+            seat_numbers=hold.seat_numbers,
+            total_price=hold.total_price,
+        )
+        booked(booking)
+
+    return booking
+
+
+def release_hold(hold):
+    """Give up a hold and return its seats; returns False if it was already gone"""
+    with transaction.atomic():
+        released, _ = SeatHold.objects.filter(hold_id=hold.hold_id).delete()
+        if not released:
+            return False
+
+        return_seats([(hold.travel_option_id, hold.number_of_seats, hold.seat_numbers)])
+        seats_changed({hold.travel_option_id: hold.number_of_seats})
+        promote_waitlist([hold.travel_option_id])
+
+    return True
+
+
+def release_expired_holds(now=None, batch_size=500):
+    """Return the seats of expired holds to inventory in bulk.
+
+    Each batch locks its holds (skipping any a checkout is busy with), deletes
+    them and hands the seats back with one UPDATE across all affected
+    options. Returns ``(holds, seats)`` released.
+    """
+    now = now or timezone.now()
+    holds_released = seats_released = 0
+    while True:
+        with transaction.atomic():
+            expired = list(
+                SeatHold.objects.select_for_update(skip_locked=True)
+                .filter(expires_at__lte=now)
+                .order_by('expires_at')
+                .values_list('hold_id', 'travel_option_id', 'number_of_seats', 'seat_numbers')[:batch_size]
+            )
+            if not expired:
+                break
+
+            SeatHold.objects.filter(hold_id__in=[hold_id for hold_id, *_ in expired]).delete()
+            seats = return_seats([released for _, *released in expired])
+            seats_changed(seats)
+            promote_waitlist(list(seats))
+
+        holds_released += len(expired)
+        seats_released += sum(seats.values())
+        if len(expired) < batch_size:
+            break
+    return holds_released, seats_released
+
+
+def join_waitlist(user, travel_option, seats):
+    """Queue ``user`` for seats on ``travel_option``; returns the entry.
+
+    A user already waiting for the option keeps their place. Seats free at
+    the time of joining are handed out straight away, so the returned entry
+    may already be promoted. Requests larger than the option's capacity
+    raise ``ValueError``: they could never be served and would block the
+    queue behind them.
+    """
+    if seats < 1:
+        raise ValueError('At least one seat must be requested')
+
+    with transaction.atomic():
+        # Lock the option before touching its queue, in the same order as promote_waitlist.
+        capacity = TravelOption.objects.select_for_update().values_list('capacity', flat=True).get(
+            travel_id=travel_option.travel_id
+        )
+        if seats > capacity:
+            raise ValueError(f'At most {capacity} seats can be requested')
+        entry = WaitlistEntry.objects.filter(user=user, travel_option=travel_option, status='waiting').first()
+        if entry is None:
+            entry = WaitlistEntry.objects.create(user=user, travel_option=travel_option, number_of_seats=seats)
+        promote_waitlist([travel_option.travel_id])
+
+    entry.refresh_from_db()
+    return entry
+
+
+def leave_waitlist(entry):
+    """Drop a waiting entry; returns False if it was promoted or left already"""
+    return bool(WaitlistEntry.objects.filter(entry_id=entry.entry_id, status='waiting').update(status='left'))
+
+
+def promote_waitlist(travel_ids, ttl=None):
+    """Turn free seats of ``travel_ids`` into holds for their waitlists, oldest entry first.
+
+    Runs in the caller's transaction, so seats a cancellation returns reach
+    the queue before any other booker. Options are locked before their
+    entries, in id order, like every other seat writer. The queue is served
+    strictly in order: an entry asking for more seats than are free blocks
+    those behind it. Promoted users are emailed through the outbox. Returns
+    the promoted entries.
+    """
+    if ttl is None:
+        ttl = settings.WAITLIST_HOLD_TTL
+    # Cheap unlocked check first; almost every option has an empty waitlist.
+    queued = set(
+        WaitlistEntry.objects.filter(travel_option_id__in=list(travel_ids), status='waiting')
+        .values_list('travel_option_id', flat=True)
+    )
+    if not queued:
+        return []
+
+    with transaction.atomic():
+        options = {
+            travel_id: option for travel_id, option in lock_seat_maps(queued, fields=['price']).items() if option.available_seats
+        }
+        entries = list(
+            WaitlistEntry.objects.select_for_update()
+            .filter(travel_option_id__in=list(options), status='waiting')
+            .order_by('travel_option_id', 'created_at', 'entry_id')
+        )
+        now = timezone.now()
+        blocked, promoted, taken = set(), [], Counter()
+        for entry in entries:
+            travel_id = entry.travel_option_id
+            layout = options[travel_id].layout
+            chosen = travel_id not in blocked and layout.allocate(entry.number_of_seats)
+            if not chosen:
+                blocked.add(travel_id)
+                continue
+            layout.take(chosen)
+            taken[travel_id] += entry.number_of_seats
+            entry.hold = SeatHold.objects.create(
+                user_id=entry.user_id,
+                travel_option_id=travel_id,
+                number_of_seats=entry.number_of_seats,
+                seat_numbers=chosen,
+                total_price=options[travel_id].price * entry.number_of_seats,
+                created_at=now,
+                expires_at=now + timedelta(seconds=ttl),
+            )
+            entry.status = 'promoted'
+            entry.promoted_at = now
+            promoted.append(entry)
+        if not promoted:
+            return []
+
+        write_seat_maps(
+            {travel_id: options[travel_id] for travel_id in taken},
+            {travel_id: -count for travel_id, count in taken.items()},
+        )
+        WaitlistEntry.objects.bulk_update(promoted, ['status', 'promoted_at', 'hold'])
+        seats_changed({travel_id: -count for travel_id, count in taken.items()})
+        publish([
+            (WAITLIST_PROMOTED, travel_id, {
+                'entry_ids': [entry.entry_id for entry in promoted if entry.travel_option_id == travel_id],
+            })
+            for travel_id in taken
+        ])
+    return promoted
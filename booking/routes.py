@@ -0,0 +1,271 @@
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict, namedtuple
+from datetime import timedelta
+from heapq import heappop, heappush
+from itertools import count, islice
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from .indexes import InMemoryIndex
+from .models import TravelOption, normalize_city
+from .pagination import KeysetPaginator
+from .search import day_range
+
+LEG_COLUMNS = [
+    'travel_id', 'type', 'source', 'destination', 'source_key', 'destination_key',
+    'date_time', 'arrival_time', 'price', 'available_seats',
+]
+
+# Field order makes a leg sort by departure, so per-city lists can be bisected.
+Leg = namedtuple('Leg', [
+    'departure', 'travel_id', 'arrival', 'source_key', 'destination_key', 'cents',
+    'type', 'source', 'destination', 'price', 'departs_at', 'arrives_at',
+])
+
+Itinerary = namedtuple('Itinerary', ['legs', 'price', 'departs_at', 'arrives_at'])
+
+
+class ConnectionQuery(namedtuple('ConnectionQuery', [
+    'origin', 'destination', 'date', 'seats', 'max_legs', 'min_layover', 'max_duration', 'sort', 'limit',
+])):
+    __slots__ = ()
+
+    @property
+    def complete(self):
+        return bool(self.origin and self.destination and self.date)
+
+
+def bounded_int(value, default, low, high):
+    try:
+        return max(low, min(int(value), high))
+    except (TypeError, ValueError):
+        return default
+
+
+def parse_connection_query(params):
+    """Build a connection query from request GET parameters"""
+    try:
+        date = parse_date((params.get('date') or '').strip())
+    except ValueError:
+        date = None
+    sort = (params.get('sort') or '').strip().lower()
+    return ConnectionQuery(
+        origin=normalize_city(params.get('source')) or None,
+        destination=normalize_city(params.get('destination')) or None,
+        date=date,
+        seats=bounded_int(params.get('seats'), 1, 1, 20),
+        max_legs=bounded_int(params.get('max_legs'), 3, 1, 4),
+        min_layover=timedelta(minutes=bounded_int(params.get('min_layover'), 45, 0, 24 * 60)),
+        max_duration=timedelta(hours=bounded_int(params.get('max_duration'), 24, 1, 72)),
+        sort=sort if sort in ('price', 'arrival') else 'price',
+        limit=bounded_int(params.get('limit'), 5, 1, 20),
+    )
+
+
+def make_leg(row):
+    """Build a ``Leg`` from a ``LEG_COLUMNS`` values() row"""
+    return Leg(
+        departure=row['date_time'].timestamp(),
+        travel_id=row['travel_id'],
+        arrival=row['arrival_time'].timestamp(),
+        source_key=row['source_key'],
+        destination_key=row['destination_key'],
+        cents=int(row['price'] * 100),
+        type=row['type'],
+        source=row['source'],
+        destination=row['destination'],
+        price=row['price'],
+        departs_at=row['date_time'],
+        arrives_at=row['arrival_time'],
+    )
+
+
+class RouteGraph(InMemoryIndex):
+    """Time-expanded graph of upcoming departures, kept in process memory.
+
+    Every city holds its departures sorted by time, so the edges leaving an
+    arrival event (the next departures after a minimum layover) are a bisect
+    away and waiting at a city needs no explicit edges. A second index keyed
+    on (source, destination) serves the final leg of a search directly.
+    Catalogue and seat changes made by this process are applied once
+    committed; a full rebuild runs in the background every
+    ``ROUTE_GRAPH_REFRESH_SECONDS``. Searches take no lock: the per-city
+    lists are never edited in place, only replaced by edited copies.
+    """
+
+    refresh_setting = 'ROUTE_GRAPH_REFRESH_SECONDS'
+
+    def __init__(self):
+        super().__init__()
+        # (legs by source, legs by (source, destination), leg by id, seats by id)
+        self.graph = ({}, {}, {}, {})
+
+    def rebuild(self):
+        """Load every option departing within ``ROUTE_GRAPH_HORIZON_DAYS``"""
+        now = timezone.now()
+        queryset = TravelOption.objects.filter(
+            date_time__gte=now,
+            date_time__lt=now + timedelta(days=settings.ROUTE_GRAPH_HORIZON_DAYS),
+        ).values(*LEG_COLUMNS)
+        by_source, by_route, legs, seats = defaultdict(list), defaultdict(list), {}, {}
+        # Rows arrive in departure order, so appending keeps every list sorted.
+        for row in KeysetPaginator(queryset, ['date_time', 'travel_id'], page_size=None).stream(chunk_size=5000):
+            leg = make_leg(row)
+            by_source[leg.source_key].append(leg)
+            by_route[leg.source_key, leg.destination_key].append(leg)
+            legs[leg.travel_id] = leg
+            seats[leg.travel_id] = row['available_seats']
+        with self.lock:
+            self.graph = (dict(by_source), dict(by_route), legs, seats)
+            self.mark_built()
+
+    def _apply(self, removed=(), rows=()):
+        """Drop the ``removed`` legs and add or replace the legs of ``rows``; call with the lock held.
+
+        Each touched list is copied once, edited, and swapped in whole, so a
+        search walking the old list never sees it change. New legs are
+        registered before the lists naming them, and dropped legs after.
+        """
+        by_source, by_route, legs, seats = self.graph
+        sources, routes, current = {}, {}, {}
+
+        def lists(leg):
+            route = (leg.source_key, leg.destination_key)
+            if leg.source_key not in sources:
+                sources[leg.source_key] = list(by_source.get(leg.source_key, ()))
+            if route not in routes:
+                routes[route] = list(by_route.get(route, ()))
+            return sources[leg.source_key], routes[route]
+
+        def drop(travel_id):
+            leg = current[travel_id] if travel_id in current else legs.get(travel_id)
+            current[travel_id] = None
+            if leg is not None:
+                for ordered in lists(leg):
+                    ordered.remove(leg)
+
+        for travel_id in removed:
+            drop(travel_id)
+        for row in rows:
+            drop(row['travel_id'])
+            leg = make_leg(row)
+            for ordered in lists(leg):
+                insort(ordered, leg)
+            current[leg.travel_id] = leg
+
+        for row in rows:
+            seats[row['travel_id']] = row['available_seats']
+        legs.update({travel_id: leg for travel_id, leg in current.items() if leg is not None})
+        by_source.update(sources)
+        by_route.update(routes)
+        for travel_id, leg in current.items():
+            if leg is None:
+                legs.pop(travel_id, None)
+                seats.pop(travel_id, None)
+
+    def _upsert(self, rows):
+        if not self.ready:
+            return
+        with self.lock:
+            self._apply(rows=rows)
+
+    def _discard(self, travel_ids):
+        if not self.ready:
+            return
+        with self.lock:
+            self._apply(removed=travel_ids)
+
+    def _adjust_seats(self, deltas):
+        if not self.ready:
+            return
+        with self.lock:
+            seats = self.graph[3]
+            for travel_id, delta in deltas.items():
+                if travel_id in seats:
+                    seats[travel_id] += delta
+
+    def options_saved(self, options):
+        """Add or replace saved options once committed"""
+        rows = [{name: getattr(option, name) for name in LEG_COLUMNS} for option in options]
+        transaction.on_commit(lambda: self._upsert(rows))
+
+    def options_removed(self, travel_ids):
+        transaction.on_commit(lambda: self._discard(list(travel_ids)))
+
+    def seats_changed(self, deltas):
+        """Apply ``{travel_id: seat delta}`` once committed"""
+        deltas = dict(deltas)
+        transaction.on_commit(lambda: self._adjust_seats(deltas))
+
+    def search(self, query):
+        """Return up to ``query.limit`` itineraries, best first.
+
+        Partial itineraries are expanded best-first from a heap ordered by
+        total price or by arrival time; both only grow as legs are added, so
+        complete itineraries leave the heap in rank order and the search stops
+        after ``limit`` of them. As in k-shortest-path label setting, each
+        leg is extended at most ``limit`` times.
+        """
+        self.refresh_if_stale()
+        by_source, by_route, legs, seats_left = self.graph
+        day_start, day_end = day_range(query.date)
+        start = max(day_start, timezone.now()).timestamp()
+        end = day_end.timestamp()
+        min_layover = query.min_layover.total_seconds()
+        max_duration = query.max_duration.total_seconds()
+        if query.sort == 'arrival':
+            rank = lambda cents, arrival: (arrival, cents)
+        else:
+            rank = lambda cents, arrival: (cents, arrival)
+
+        heap, tie = [], count()
+        first_legs = by_source.get(query.origin, [])
+        for leg in islice(first_legs, bisect_left(first_legs, (start,)), None):
+            if leg.departure >= end:
+                break
+            if leg.arrival - leg.departure <= max_duration and seats_left.get(leg.travel_id, 0) >= query.seats:
+                heappush(heap, (rank(leg.cents, leg.arrival), next(tie), (leg,), leg.cents))
+
+        expanded = Counter()
+        found = []
+        while heap and len(found) < query.limit:
+            _, _, path, cents = heappop(heap)
+            last = path[-1]
+            if last.destination_key == query.destination:
+                found.append(path)
+                continue
+            if len(path) >= query.max_legs:
+                continue
+            expanded[last.travel_id] += 1
+            if expanded[last.travel_id] > query.limit:
+                continue
+
+            deadline = path[0].departure + max_duration
+            if len(path) == query.max_legs - 1:
+                candidates = by_route.get((last.destination_key, query.destination), [])
+            else:
+                candidates = by_source.get(last.destination_key, [])
+            visited = {leg.source_key for leg in path}
+            # Lists are replaced, never edited, so islice can walk the live one without copying its tail.
+            for leg in islice(candidates, bisect_left(candidates, (last.arrival + min_layover,)), None):
+                if leg.departure > deadline:
+                    break
+                if leg.arrival > deadline or leg.destination_key in visited:
+                    continue
+                if seats_left.get(leg.travel_id, 0) < query.seats:
+                    continue
+                heappush(heap, (rank(cents + leg.cents, leg.arrival), next(tie), path + (leg,), cents + leg.cents))
+
+        return [
+            Itinerary(
+                legs=path,
+                price=sum(leg.price for leg in path) * query.seats,
+                departs_at=path[0].departs_at,
+                arrives_at=path[-1].arrives_at,
+            )
+            for path in found
+        ]
+
+
+route_graph = RouteGraph()
@@ -0,0 +1,86 @@
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from .models import TravelOption, normalize_city
+
+# Upper bound for prefix ranges: sorts after every character a city name uses,
+# under binary comparison as well as MySQL/Postgres collations.
+PREFIX_SENTINEL = '\uffff'
+
+SORT_ORDERINGS = {
+    'date': ['date_time', 'travel_id'],
+    'occupancy': ['-occupancy', 'date_time', 'travel_id'],
+}
+
+
+class SearchFilters(namedtuple('SearchFilters', ['type', 'source', 'destination', 'date', 'low_stock', 'sort'])):
+    __slots__ = ()
+
+    @property
+    def depends_on_seats(self):
+        """Whether the result set or its order changes when seats are booked"""
+        return self.low_stock or self.sort == 'occupancy'
+
+    @property
+    def ordering(self):
+        return SORT_ORDERINGS[self.sort]
+
+
+def parse_search_filters(params):
+    """Build normalized search filters from request GET parameters"""
+    travel_type = (params.get('type') or '').strip().lower()
+    try:
+        date = parse_date((params.get('date') or '').strip())
+    except ValueError:
+        date = None
+    sort = (params.get('sort') or '').strip().lower()
+    return SearchFilters(
+        type=travel_type or None,
+        source=normalize_city(params.get('source')) or None,
+        destination=normalize_city(params.get('destination')) or None,
+        date=date,
+        low_stock=(params.get('stock') or '').strip().lower() == 'low',
+        sort=sort if sort in SORT_ORDERINGS else 'date',
+    )
+
+
+def prefix_range(key):
+    """Return the half-open [low, high) range matching every key starting with ``key``"""
+    return key, key + PREFIX_SENTINEL
+
+
+def day_range(date):
+    """Return the aware datetime range covering ``date`` in the current timezone"""
+    start = timezone.make_aware(datetime.combine(date, time.min))
+    return start, start + timedelta(days=1)
+
+
+def search_travel_options(filters, queryset=None):
+    """Filter travel options with index-friendly predicates.
+
+    City filters compare the case-folded key columns by prefix range and the
+    date filter is a datetime range, so every predicate can be served by the
+    composite route indexes instead of a table scan.
+    """
+    options = TravelOption.objects.all() if queryset is None else queryset
+
+    if filters.type:
+        options = options.filter(type=filters.type)
+
+    if filters.source:
+        low, high = prefix_range(filters.source)
+        options = options.filter(source_key__gte=low, source_key__lt=high)
+
+    if filters.destination:
+        low, high = prefix_range(filters.destination)
+        options = options.filter(destination_key__gte=low, destination_key__lt=high)
+
+    if filters.date:
+        start, end = day_range(filters.date)
+        options = options.filter(date_time__gte=start, date_time__lt=end)
+
+    if filters.low_stock:
+        options = options.low_stock()
+
+    return options
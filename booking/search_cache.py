@@ -0,0 +1,181 @@
+import hashlib
+import time
+from django.core.cache import caches
+from django.db import connection, transaction
+
+CACHE_ALIAS = 'search'
+PREFIX = 'travel-search'
+
+
+class SearchResultCache:
+    """Cache of travel option search pages keyed on the normalized filters.
+
+    Entries live in the ``search`` cache alias (a size-bounded LRU with a TTL
+    when backed by LocMemCache). Every entry records the version of each
+    travel option it contains, and a seat change bumps the versions of its
+    options, so only the pages showing them stop matching. Versions change
+    with atomic ``add``/``incr`` calls only, and a page whose version key
+    was evicted no longer matches either. Every bump also moves a versions
+    epoch, and a page fetched while the epoch moved is not stored, since its
+    rows may predate the versions it would be stored under. Creating or
+    deleting options bumps a catalogue generation that is part of every key.
+    Pages whose membership or order depends on seat counts also carry a seat
+    generation that every seat change bumps.
+    """
+
+    def __init__(self, alias=CACHE_ALIAS):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _generation(self, name='generation'):
+        key = f'{PREFIX}:{name}'
+        generation = self.cache.get(key)
+        if generation is None:
+            # Seed from the clock so an evicted counter never reuses old keys.
+            generation = time.time_ns()
+            self.cache.add(key, generation, timeout=None)
+            generation = self.cache.get(key, generation)
+        return generation
+
+    def make_key(self, filters, *page_args):
+        raw = repr((tuple(filters), page_args)).encode()
+        generation = self._generation()
+        if getattr(filters, 'depends_on_seats', False):
+            # Any seat change can move options in or out of these pages.
+            generation = f'{generation}.{self._generation("seats-generation")}'
+        return f'{PREFIX}:{generation}:{hashlib.sha1(raw).hexdigest()}'
+
+    def _count(self, name):
+        key = f'{PREFIX}:stats:{name}'
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            if not self.cache.add(key, 1, timeout=None):
+                self.cache.incr(key)
+
+    def _version_keys(self, travel_ids):
+        return [f'{PREFIX}:option:{travel_id}' for travel_id in travel_ids]
+
+    def _versions(self, travel_ids):
+        """Current ``{version key: version}`` of ``travel_ids``, creating missing ones"""
+        keys = self._version_keys(travel_ids)
+        versions = self.cache.get_many(keys)
+        missing = [key for key in keys if key not in versions]
+        if missing:
+            # Seed from the clock so a re-created key never matches an evicted one.
+            seed = time.time_ns()
+            for key in missing:
+                self.cache.add(key, seed, timeout=None)
+            versions.update(self.cache.get_many(missing))
+        return versions
+
+    def _cached(self, key):
+        """The page stored under ``key``, unless one of its options changed since"""
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        page, versions = entry
+        if versions and self.cache.get_many(list(versions)) != versions:
+            return None
+        return page
+
+    def _lookup(self, filters, page_args):
+        key = self.make_key(filters, *page_args)
+        page = self._cached(key)
+        self._count('misses' if page is None else 'hits')
+        return key, page
+
+    def _store(self, key, page, epoch=None):
+        """Cache ``page``, unless a version was bumped since ``epoch`` was read"""
+        versions = self._versions([option.travel_id for option in page])
+        # Read after the versions: a bump they include has moved the epoch already.
+        if epoch is not None and self._generation('versions-epoch') != epoch:
+            return
+        self.cache.set(key, (page, versions))
+
+    def get_or_fetch(self, filters, page_args, fetch):
+        """Return the cached page for ``filters``/``page_args`` or store ``fetch()``"""
+        key, page = self._lookup(filters, page_args)
+        if page is None:
+            epoch = self._generation('versions-epoch')
+            page = fetch()
+            self._store(key, page, epoch)
+        return page
+
+    async def aget_or_fetch(self, filters, page_args, fetch):
+        """Async variant of ``get_or_fetch`` that awaits ``fetch()`` on a miss.
+
+        Cache calls stay synchronous: the ``search`` alias is an in-process
+        LocMemCache, so they never wait on I/O and a thread hop would cost more.
+        """
+        key, page = self._lookup(filters, page_args)
+        if page is None:
+            epoch = self._generation('versions-epoch')
+            page = await fetch()
+            self._store(key, page, epoch)
+        return page
+
+    def _now_and_on_commit(self, func, *args):
+        # Run immediately so this request never sees its own stale pages, and
+        # again after commit so nothing cached mid-transaction survives.
+        func(*args)
+        if connection.in_atomic_block:
+            transaction.on_commit(lambda: func(*args))
+
+    def invalidate_options(self, travel_ids):
+        """Retire every cached page that shows one of ``travel_ids``"""
+        keys = self._version_keys(travel_ids)
+        if keys:
+            self._now_and_on_commit(self._bump_versions, keys)
+            self._now_and_on_commit(self._bump_generation, 'seats-generation')
+
+    def options_removed(self, travel_ids):
+        """Retire the cached pages showing ``travel_ids``, leaving the generations alone.
+
+        For options leaving the catalogue without anything taking their place,
+        such as departures moved to the archive.
+        """
+        keys = self._version_keys(travel_ids)
+        if keys:
+            self._now_and_on_commit(self._bump_versions, keys)
+
+    def _bump_versions(self, keys):
+        # Epoch first, so a fetch that reads any of the new versions sees it moved.
+        self._bump_generation('versions-epoch')
+        for key in keys:
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                # Never stored or evicted: no cached page can match it any more.
+                pass
+
+    def catalogue_changed(self):
+        """Retire all cached pages after options are added or removed"""
+        self._now_and_on_commit(self._bump_generation)
+
+    def _bump_generation(self, name='generation'):
+        self._generation(name)
+        try:
+            self.cache.incr(f'{PREFIX}:{name}')
+        except ValueError:
+            self.cache.set(f'{PREFIX}:{name}', time.time_ns(), timeout=None)
+
+    def stats(self):
+        counts = self.cache.get_many([f'{PREFIX}:stats:hits', f'{PREFIX}:stats:misses'])
+        hits = counts.get(f'{PREFIX}:stats:hits', 0)
+        misses = counts.get(f'{PREFIX}:stats:misses', 0)
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def clear(self):
+        self.cache.clear()
+
+
+search_cache = SearchResultCache()
@@ -0,0 +1,135 @@
+SEATS_PER_ROW = {
+    'flight': 6,
+    'train': 4,
+    'bus': 4,
+}
+
+
+def mask_of(seats):
+    mask = 0
+    for seat in seats:
+        mask |= 1 << (seat - 1)
+    return mask
+
+
+class SeatMap:
+    """Taken seats of one travel option as a bitset; bit ``n - 1`` is seat ``n``.
+
+    Stored little-endian in ``TravelOption.seat_map``, one bit per seat.
+    Python ints do the bit arithmetic a machine word at a time, so finding
+    free seats or a free block is O(capacity / 64) word operations. With
+    ``seats_per_row`` set, blocks that fit in a row never span two.
+    """
+
+    def __init__(self, bits, capacity, seats_per_row=None):
+        self.capacity = max(capacity or 0, 0)
+        self.seats_per_row = seats_per_row
+        self.bits = bits & self.full
+
+    @classmethod
+    def from_bytes(cls, data, capacity, seats_per_row=None):
+        return cls(int.from_bytes(bytes(data or b''), 'little'), capacity, seats_per_row)
+
+    @classmethod
+    def laid_out(cls, capacity, taken):
+        """A fresh map with the lowest ``taken`` seats marked, for options without a map yet"""
+        return cls(0, capacity).fit(taken)
+
+    def to_bytes(self):
+        return self.bits.to_bytes((self.capacity + 7) // 8, 'little')
+
+    @property
+    def full(self):
+        return (1 << self.capacity) - 1
+
+    @property
+    def taken(self):
+        return self.bits.bit_count()
+
+    def is_free(self, seat):
+        return 1 <= seat <= self.capacity and not self.bits >> (seat - 1) & 1
+
+    def free_seats(self, limit=None):
+        """Lowest free seat numbers, up to ``limit``"""
+        seats, free = [], ~self.bits & self.full
+        while free and (limit is None or len(seats) < limit):
+            lowest = free & -free
+            seats.append(lowest.bit_length())
+            free ^= lowest
+        return seats
+
+    def row_starts(self, count):
+        """Bits of the seats a block of ``count`` can start at without leaving the row"""
+        width = self.seats_per_row
+        rows = -(-self.capacity // width)
+        # Multiplying by a number with a 1 every ``width`` bits copies one row's pattern into all rows.
+        pattern = (1 << (width - count + 1)) - 1
+        return pattern * (((1 << (width * rows)) - 1) // ((1 << width) - 1)) & self.full
+
+    def find_block(self, count):
+        """First seat of the lowest run of ``count`` free seats, or None.
+
+        ``runs`` keeps a bit for each seat starting a free run of ``length``
+        seats; AND-ing it with itself shifted doubles the length, so this
+        takes O(log count) passes over the map. Parties that fit in a row
+        only get runs starting far enough from the row's end.
+        """
+        runs, length = ~self.bits & self.full, 1
+        while length < count and runs:
+            step = min(length, count - length)
+            runs &= runs >> step
+            length += step
+        if self.seats_per_row and count <= self.seats_per_row:
+            runs &= self.row_starts(count)
+        return (runs & -runs).bit_length() or None
+
+    def allocate(self, count, seats=None):
+        """Seat numbers for a party of ``count``, or None if they cannot be seated.
+
+        Requested ``seats`` must all be free and may not repeat a seat, which
+        raises ``ValueError``. Otherwise the party gets the lowest block of
+        adjacent seats, or the lowest free seats when no block is left.
+        """
+        if seats:
+            if len(set(seats)) != len(seats):
+                raise ValueError('A seat can only be picked once')
+            seats = sorted(seats)
+            if len(seats) != count or not all(self.is_free(seat) for seat in seats):
+                return None
+            return seats
+        start = self.find_block(count)
+        if start is not None:
+            return list(range(start, start + count))
+        seats = self.free_seats(limit=count)
+        return seats if len(seats) == count else None
+
+    def take(self, seats):
+        self.bits |= mask_of(seats) & self.full
+
+    def release(self, seats):
+        self.bits &= ~mask_of(seats)
+
+    def fit(self, taken, keep=()):
+        """Mark exactly ``taken`` seats taken.
+
+        Maps out of step with the seat count, after an edit or a release of
+        seats that were never numbered, block their lowest free seats or
+        free their highest taken seats outside ``keep``.
+        """
+        if self.taken < taken:
+            self.take(self.free_seats(limit=taken - self.taken))
+        elif self.taken > taken:
+            spare, extra = self.bits & ~mask_of(keep), self.taken - max(taken, 0)
+            while extra and spare:
+                highest = 1 << (spare.bit_length() - 1)
+                self.bits &= ~highest
+                spare &= ~highest
+                extra -= 1
+        return self
+
+    def rows(self, seats_per_row):
+        """``[[(seat, free), ...], ...]`` for drawing the cabin"""
+        return [
+            [(seat, self.is_free(seat)) for seat in range(start, min(start + seats_per_row, self.capacity + 1))]
+            for start in range(1, self.capacity + 1, seats_per_row)
+        ]
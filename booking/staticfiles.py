@@ -0,0 +1,120 @@
+import gzip
+import mimetypes
+import os
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+from .instrumentation import AsyncCapableMiddleware
+
+try:
+    import brotli
+except ImportError:
+    # Optional; without it only gzip variants are written.
+    brotli = None
+
+# Formats that are compressed already; a second pass only costs CPU.
+INCOMPRESSIBLE = ('.woff', '.woff2', '.png', '.jpg', '.jpeg', '.gif', '.webp', '.ico', '.gz', '.br', '.zip')
+
+# Suffix, Content-Encoding and compressor of each pre-compressed variant, best first.
+ENCODINGS = [
+    ('.br', 'br', lambda data: brotli.compress(data) if brotli else None),
+    ('.gz', 'gzip', lambda data: gzip.compress(data, compresslevel=9, mtime=0)),
+]
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage that also writes ``.gz`` (and with ``brotli`` installed ``.br``) copies.
+
+    Compression happens once, in ``collectstatic``, so ``StaticFilesMiddleware``
+    only picks a file. Variants that save less than 5% are not written.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if not dry_run:
+            for name in set(self.hashed_files.values()):
+                self.compress(name)
+
+    def compress(self, name):
+        if name.lower().endswith(INCOMPRESSIBLE):
+            return
+        with self.open(name) as handle:
+            data = handle.read()
+        for suffix, _, compress in ENCODINGS:
+            compressed = compress(data)
+            if compressed is not None and len(compressed) < len(data) * 0.95:
+                with open(self.path(name + suffix), 'wb') as handle:
+                    handle.write(compressed)
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            # Nothing collected yet (tests, development): link the plain file.
+            return name
+        return super().stored_name(name)
+
+
+class StaticFilesMiddleware(AsyncCapableMiddleware):
+    """Serve collected static files with far-future caching and pre-compressed variants.
+
+    Hashed names from the manifest never change content, so they are cached
+    for a year as immutable; other files are revalidated. The ``.br`` or
+    ``.gz`` copy written by ``collectstatic`` is sent when the client accepts
+    it. With ``DEBUG`` on, uncollected files are found in the apps instead.
+    List it first in ``MIDDLEWARE`` so asset requests skip the rest of the stack.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.prefix = settings.STATIC_URL
+        self.immutable = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+    def handle(self, request):
+        return self.serve(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        response = None
+        if request.path_info.startswith(self.prefix):
+            response = await sync_to_async(self.serve, thread_sensitive=False)(request)
+        return response or await self.get_response(request)
+
+    def find(self, name):
+        try:
+            path = safe_join(settings.STATIC_ROOT, name) if settings.STATIC_ROOT else None
+        except SuspiciousFileOperation:
+            return None
+        if path and os.path.isfile(path):
+            return path
+        return finders.find(name) if settings.DEBUG else None
+
+    def serve(self, request):
+        if request.method not in ('GET', 'HEAD') or not request.path_info.startswith(self.prefix):
+            return None
+        name = request.path_info[len(self.prefix):]
+        path = self.find(name)
+        if path is None:
+            return None
+        accepted = {token.split(';')[0].strip() for token in request.headers.get('Accept-Encoding', '').split(',')}
+        encoding = None
+        for suffix, candidate, _ in ENCODINGS:
+            if candidate in accepted and os.path.isfile(path + suffix):
+                path, encoding = path + suffix, candidate
+                break
+        modified = os.path.getmtime(path)
+        if not was_modified_since(request.headers.get('If-Modified-Since'), modified):
+            return HttpResponseNotModified()
+        with open(path, 'rb') as handle:
+            response = HttpResponse(handle.read(), content_type=mimetypes.guess_type(name)[0] or 'application/octet-stream')
+        if encoding:
+            response['Content-Encoding'] = encoding
+        response['Vary'] = 'Accept-Encoding'
+        response['Last-Modified'] = http_date(modified)
+        response['Cache-Control'] = IMMUTABLE if name in self.immutable else 'public, no-cache'
+        return response
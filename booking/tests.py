@@ -1,10 +1,47 @@
-from django.test import TestCase, Client
+import gzip
+import json
+import os
+import pstats
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import mock
+from django.core import mail
+from django.core.management import call_command
+from asgiref.sync import iscoroutinefunction
+from django.test import TestCase, TransactionTestCase, Client, skipUnlessDBFeature
+from django.db.models import Q, Sum
 from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.http import http_date
 from datetime import timedelta
 from decimal import Decimal
-from .models import TravelOption, Booking
+from . import assets, views
+from .models import (
+    TravelOption, Booking, SeatHold, WaitlistEntry, OutboxEvent, PriceCalendarDay, BookingRollup, ArchivedTravelOption,
+    ArchivedBooking, RequestProfile, normalize_city,
+)
+from .search import parse_search_filters, search_travel_options
+from .pagination import EstimatedCountPaginator, KeysetPaginator
+from .search_cache import search_cache
+from .autocomplete import city_index
+from .analytics import booking_analytics
+from .reconcile import find_drift
+from .archive import archive_batch
+from .loading import generate_options
+from .seatmap import SeatMap
+from .outbox import HANDLERS, ROLLUP, drain
+from .routes import parse_connection_query, route_graph
+from .instrumentation import registry
+from .profiling import make_token, profiler_lock, summary
+from .reservations import (
+    reserve_seats, release_seats, hold_seats, confirm_hold, release_hold, release_expired_holds,
+    join_waitlist, leave_waitlist, promote_waitlist, SeatsUnavailable, BookingNotCancellable, HoldExpired,
+)
 
 class TravelOptionModelTest(TestCase):
     def setUp(self):
@@ -153,7 +190,11 @@ class BookingLogicTest(TestCase):
             'seats': 2
         })
         
-        self.assertEqual(response.status_code, 302)
+        hold = SeatHold.objects.get(user=self.user, travel_option=self.travel_option)
+        self.assertRedirects(response, reverse('checkout', kwargs={'hold_id': hold.hold_id}))
+        
+        response = self.client.post(response.url, {'action': 'confirm'})
+        self.assertRedirects(response, reverse('my_bookings'))
         
         booking = Booking.objects.get(user=self.user, travel_option=self.travel_option)
         self.assertEqual(booking.number_of_seats, 2)
@@ -199,3 +240,1741 @@ class BookingLogicTest(TestCase):
         
         self.travel_option.refresh_from_db()
         self.assertEqual(self.travel_option.available_seats, initial_seats + 2)
+
+    def test_double_cancellation_returns_seats_once(self):
+        booking = reserve_seats(self.user, self.travel_option, 2)
+        
+        self.client.login(username='testuser', password='testpass123')
+        url = reverse('cancel_booking', kwargs={'booking_id': booking.booking_id})
+        self.client.get(url)
+        self.client.get(url)
+        
+        self.travel_option.refresh_from_db()
+        self.assertEqual(self.travel_option.available_seats, 5)
+    
+    def test_booking_rejects_non_positive_seats(self):
+        self.client.login(username='testuser', password='testpass123')
+        
+        for seats in (0, -3, 'abc'):
+            response = self.client.post(reverse('book_travel', kwargs={'travel_id': self.travel_option.travel_id}), {
+                'seats': seats
+            })
+            self.assertEqual(response.status_code, 200)
+        
+        self.assertEqual(Booking.objects.count(), 0)
+        self.travel_option.refresh_from_db()
+        self.assertEqual(self.travel_option.available_seats, 5)
+
+class ReservationEngineTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='booker', password='testpass123')
+        self.travel_option = TravelOption.objects.create(
+            type='train',
+            source='Boston',
+            destination='Washington DC',
+            date_time=timezone.now() + timedelta(days=2),
+            price=Decimal('89.99'),
+            available_seats=3
+        )
+    
+    def test_reserve_seats_decrements_and_books(self):
+        booking = reserve_seats(self.user, self.travel_option, 2)
+        
+        self.assertEqual(booking.total_price, Decimal('179.98'))
+        self.travel_option.refresh_from_db()
+        self.assertEqual(self.travel_option.available_seats, 1)
+    
+    def test_reserve_seats_refuses_to_oversell(self):
+        with self.assertRaises(SeatsUnavailable):
+            reserve_seats(self.user, self.travel_option, 4)
+        
+        self.assertFalse(Booking.objects.exists())
+        self.travel_option.refresh_from_db()
+        self.assertEqual(self.travel_option.available_seats, 3)
+    
+    def test_release_seats_only_once(self):
+        booking = reserve_seats(self.user, self.travel_option, 3)
+        release_seats(booking)
+        
+        with self.assertRaises(BookingNotCancellable):
+            release_seats(booking)
+        
+        self.travel_option.refresh_from_db()
+        self.assertEqual(self.travel_option.available_seats, 3)
+
+class SeatHoldTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='holder', password='testpass123')
+        self.travel_option = TravelOption.objects.create(
+            type='bus',
+            source='Austin',
+            destination='Dallas',
+            date_time=timezone.now() + timedelta(days=2),
+            price=Decimal('19.50'),
+            available_seats=4
+        )
+    
+    def test_confirm_turns_hold_into_booking_without_touching_seats_again(self):
+        hold = hold_seats(self.user, self.travel_option, 3, ttl=60)
+        self.travel_option.refresh_from_db()
+        self.assertEqual(self.travel_option.available_seats, 1)
+        
+        booking = confirm_hold(hold)
+        
+        self.assertEqual(booking.total_price, Decimal('58.50'))
+        self.assertFalse(SeatHold.objects.exists())
+        self.travel_option.refresh_from_db()
+        self.assertEqual(self.travel_option.available_seats, 1)
+        with self.assertRaises(HoldExpired):
+            confirm_hold(hold)
+    
+    def test_expired_hold_cannot_be_confirmed(self):
+        hold = hold_seats(self.user, self.travel_option, 2, ttl=0)
+        
+        with self.assertRaises(HoldExpired):
+            confirm_hold(hold)
+        self.assertTrue(release_hold(hold))
+        self.assertFalse(release_hold(hold))
+        
+        self.assertFalse(Booking.objects.exists())
+        self.travel_option.refresh_from_db()
+        self.assertEqual(self.travel_option.available_seats, 4)
+    
+    def test_sweeper_returns_expired_seats_in_bulk(self):
+        other = TravelOption.objects.create(
+            type='train', source='Austin', destination='Houston',
+            date_time=timezone.now() + timedelta(days=2), price=Decimal('40.00'), available_seats=10
+        )
+        hold_seats(self.user, self.travel_option, 1, ttl=0)
+        hold_seats(self.user, self.travel_option, 2, ttl=0)
+        hold_seats(self.user, other, 5, ttl=0)
+        live = hold_seats(self.user, other, 1, ttl=600)
+        
+        out = StringIO()
+        # Two batches of SELECT, DELETE, locking the seat maps, one UPDATE,
+        # the price calendar's cell lookup and UPDATE, unlinking waitlist
+        # holds and the waitlist check, each inside a savepoint.
+        with self.assertNumQueries(22):
+            call_command('release_expired_holds', batch_size=2, stdout=out)
+        
+        self.assertIn('Released 8 seats from 3 expired holds', out.getvalue())
+        self.assertEqual(list(SeatHold.objects.values_list('hold_id', flat=True)), [live.hold_id])
+        self.travel_option.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.travel_option.available_seats, 4)
+        self.assertEqual(other.available_seats, 9)
+    
+    def test_checkout_views(self):
+        self.client.login(username='holder', password='testpass123')
+        response = self.client.post(reverse('book_travel', kwargs={'travel_id': self.travel_option.travel_id}), {'seats': 2})
+        
+        response = self.client.get(response.url)
+        self.assertContains(response, 'Confirm Booking')
+        self.assertContains(response, '$39.00')
+        
+        response = self.client.post(response.request['PATH_INFO'], {'action': 'release'})
+        self.assertRedirects(response, reverse('travel_detail', kwargs={'travel_id': self.travel_option.travel_id}))
+        self.travel_option.refresh_from_db()
+        self.assertEqual(self.travel_option.available_seats, 4)
+        self.assertFalse(SeatHold.objects.exists())
+
+# Bookers only serialize on row locks; SQLite locks the whole database instead.
+@skipUnlessDBFeature('has_select_for_update')
+class ReservationContentionTest(TransactionTestCase):
+    BOOKERS = 60
+    SEATS = 25
+    
+    def setUp(self):
+        User.objects.bulk_create(User(username=f'racer{i}') for i in range(self.BOOKERS))
+        self.users = list(User.objects.filter(username__startswith='racer'))
+        self.travel_option = TravelOption.objects.create(
+            type='flight',
+            source='New York',
+            destination='Los Angeles',
+            date_time=timezone.now() + timedelta(days=7),
+            price=Decimal('299.99'),
+            available_seats=self.SEATS
+        )
+    
+    def test_concurrent_bookers_never_oversell(self):
+        barrier = threading.Barrier(self.BOOKERS)
+        outcomes, errors = [], []
+        
+        def book(user):
+            try:
+                barrier.wait()
+                try:
+                    reserve_seats(user, self.travel_option, 1)
+                    outcomes.append(True)
+                except SeatsUnavailable:
+                    outcomes.append(False)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+        
+        threads = [threading.Thread(target=book, args=(user,)) for user in self.users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        if errors:
+            raise errors[0]
+        self.assertEqual(len(outcomes), self.BOOKERS)
+        self.assertEqual(outcomes.count(True), self.SEATS)
+        self.travel_option.refresh_from_db()
+        self.assertEqual(self.travel_option.available_seats, 0)
+        self.assertEqual(Booking.objects.filter(travel_option=self.travel_option).count(), self.SEATS)
+
+class RouteSearchTest(TestCase):
+    def setUp(self):
+        base = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0) + timedelta(days=10)
+        self.day = base.date()
+        cities = ['New York', 'Newark', 'Boston', 'Chicago', 'Denver', 'Dallas', 'Houston', 'Seattle']
+        TravelOption.objects.bulk_create(
+            TravelOption(
+                type=['flight', 'train', 'bus'][i % 3],
+                source=cities[i % len(cities)],
+                destination=cities[(i + 3) % len(cities)],
+                date_time=base + timedelta(hours=i),
+                price=Decimal('50.00'),
+                available_seats=40
+            )
+            for i in range(400)
+        )
+    
+    def search(self, **params):
+        return search_travel_options(parse_search_filters(params))
+    
+    def assert_uses_index(self, queryset):
+        if connection.vendor == 'mysql':
+            plan = queryset.explain(format='json')
+            self.assertNotIn('"access_type": "ALL"', plan, plan)
+        elif connection.vendor == 'sqlite':
+            plan = queryset.explain()
+            self.assertNotIn('SCAN booking_traveloption', plan, plan)
+            self.assertIn('USING INDEX', plan, plan)
+        else:
+            self.skipTest(f'No plan check for {connection.vendor}')
+    
+    def test_normalize_city(self):
+        self.assertEqual(normalize_city('  New   YORK '), 'new york')
+        self.assertEqual(normalize_city(None), '')
+    
+    def test_bulk_create_populates_keys(self):
+        self.assertFalse(TravelOption.objects.filter(source_key='').exists())
+        self.assertTrue(TravelOption.objects.filter(source_key='new york').exists())
+    
+    def test_exact_and_prefix_city_match_is_case_insensitive(self):
+        exact = self.search(source='NEW york')
+        self.assertTrue(exact.exists())
+        self.assertEqual(set(exact.values_list('source', flat=True)), {'New York'})
+        
+        prefix = self.search(source='new')
+        self.assertEqual(set(prefix.values_list('source', flat=True)), {'New York', 'Newark'})
+    
+    def test_date_filter_uses_day_range(self):
+        results = self.search(date=self.day.isoformat())
+        self.assertTrue(results.exists())
+        for option in results:
+            self.assertEqual(timezone.localtime(option.date_time).date(), self.day)
+    
+    def test_invalid_date_is_ignored(self):
+        self.assertEqual(self.search(date='2024-02-30').count(), 400)
+        self.assertEqual(self.search(date='tomorrow').count(), 400)
+    
+    def test_route_search_does_not_full_scan(self):
+        self.assert_uses_index(self.search(type='flight', source='new york', destination='den', date=self.day.isoformat()))
+        self.assert_uses_index(self.search(source='boston', destination='seattle'))
+        self.assert_uses_index(self.search(date=self.day.isoformat()))
+
+@override_settings(TRAVEL_OPTIONS_PAGE_SIZE=20)
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        base = timezone.now() + timedelta(days=1)
+        # Pairs of options share a departure time so the travel_id tie-breaker matters.
+        TravelOption.objects.bulk_create(
+            TravelOption(
+                type=['bus', 'train'][i % 2],
+                source='Dallas',
+                destination='Houston',
+                date_time=base + timedelta(hours=i // 2),
+                price=Decimal('25.99'),
+                available_seats=50
+            )
+            for i in range(45)
+        )
+        self.expected = list(TravelOption.objects.order_by('date_time', 'travel_id').values_list('travel_id', flat=True))
+        self.paginator = KeysetPaginator(TravelOption.objects.all(), ['date_time', 'travel_id'], page_size=20)
+    
+    def test_forward_and_backward_walk_is_stable(self):
+        pages = [self.paginator.page()]
+        while pages[-1].has_next:
+            pages.append(self.paginator.page(after=pages[-1].next_cursor))
+        
+        self.assertEqual([len(page) for page in pages], [20, 20, 5])
+        self.assertEqual([o.travel_id for page in pages for o in page], self.expected)
+        self.assertFalse(pages[0].has_previous)
+        
+        back = self.paginator.page(before=pages[2].previous_cursor)
+        self.assertEqual([o.travel_id for o in back], [o.travel_id for o in pages[1]])
+        first = self.paginator.page(before=back.previous_cursor)
+        self.assertEqual([o.travel_id for o in first], self.expected[:20])
+        self.assertFalse(first.has_previous)
+    
+    def test_view_never_counts_or_offsets(self):
+        response = self.client.get(reverse('travel_options'))
+        next_query = response.context['next_query']
+        self.assertIsNone(response.context['previous_query'])
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('travel_options') + '?' + next_query)
+        
+        self.assertEqual(len(response.context['options']), 20)
+        self.assertIsNotNone(response.context['previous_query'])
+        for query in queries.captured_queries:
+            self.assertNotIn('COUNT(', query['sql'].upper())
+            self.assertNotIn('OFFSET', query['sql'].upper())
+    
+    def test_filters_survive_page_links_and_bad_cursor_falls_back(self):
+        response = self.client.get(reverse('travel_options') + '?source=dallas&page_size=10')
+        self.assertIn('source=dallas', response.context['next_query'])
+        self.assertEqual(len(response.context['options']), 10)
+        
+        response = self.client.get(reverse('travel_options') + '?after=not-a-cursor')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([o.travel_id for o in response.context['options']], self.expected[:20])
+
+class SearchCacheTest(TestCase):
+    def setUp(self):
+        search_cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.staff = User.objects.create_user(username='ops', password='testpass123', is_staff=True)
+        when = timezone.now() + timedelta(days=3)
+        self.dallas = TravelOption.objects.create(
+            type='bus', source='Dallas', destination='Houston',
+            date_time=when, price=Decimal('25.99'), available_seats=50
+        )
+        self.denver = TravelOption.objects.create(
+            type='bus', source='Denver', destination='Salt Lake City',
+            date_time=when, price=Decimal('55.99'), available_seats=40
+        )
+    
+    def get_options(self, query=''):
+        return self.client.get(reverse('travel_options') + query)
+    
+    def test_repeated_search_is_served_from_cache(self):
+        self.get_options('?source=dallas')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get_options('?source=DALLAS ')
+        
+        self.assertContains(response, 'Houston')
+        self.assertFalse(any('booking_traveloption' in q['sql'] for q in queries.captured_queries))
+        self.assertEqual(search_cache.stats()['hits'], 1)
+        self.assertEqual(search_cache.stats()['misses'], 1)
+    
+    def test_booking_only_invalidates_pages_showing_the_option(self):
+        self.get_options('?source=dallas')
+        self.get_options('?source=denver')
+        
+        self.client.login(username='testuser', password='testpass123')
+        self.client.post(reverse('book_travel', kwargs={'travel_id': self.dallas.travel_id}), {'seats': 3})
+        
+        dallas_page = self.get_options('?source=dallas')
+        self.get_options('?source=denver')
+        
+        self.assertEqual(dallas_page.context['options'].items[0].available_seats, 47)
+        self.assertEqual(search_cache.stats(), {'hits': 1, 'misses': 3, 'hit_ratio': 0.25})
+    
+    def test_cancellation_invalidates_cached_page(self):
+        booking = reserve_seats(self.user, self.denver, 5)
+        self.get_options('?source=denver')
+        
+        self.client.login(username='testuser', password='testpass123')
+        self.client.get(reverse('cancel_booking', kwargs={'booking_id': booking.booking_id}))
+        
+        response = self.get_options('?source=denver')
+        self.assertEqual(response.context['options'].items[0].available_seats, 40)
+    
+    def test_new_option_appears_in_cached_search(self):
+        self.get_options('?type=bus')
+        TravelOption.objects.create(
+            type='bus', source='Las Vegas', destination='Phoenix',
+            date_time=timezone.now() + timedelta(days=6), price=Decimal('35.99'), available_seats=45
+        )
+        self.assertContains(self.get_options('?type=bus'), 'Las Vegas')
+    
+    def test_pages_sharing_an_option_are_all_retired(self):
+        search_cache._store('travel-search:a', [self.dallas])
+        search_cache._store('travel-search:b', [self.dallas, self.denver])
+        search_cache._store('travel-search:c', [self.denver])
+        search_cache.invalidate_options([self.dallas.travel_id])
+        self.assertEqual(
+            [search_cache._cached(f'travel-search:{name}') for name in 'abc'],
+            [None, None, [self.denver]],
+        )
+        
+        # A version evicted by the LRU retires its pages instead of leaving them untracked.
+        search_cache.cache.delete(f'travel-search:option:{self.denver.travel_id}')
+        self.assertIsNone(search_cache._cached('travel-search:c'))
+        search_cache._store('travel-search:c', [self.denver])
+        self.assertEqual(search_cache._cached('travel-search:c'), [self.denver])
+    
+    def test_page_fetched_during_a_booking_is_not_stored(self):
+        def fetch():
+            page = [self.dallas]
+            # A booking commits after the rows were read but before the page is stored.
+            search_cache.invalidate_options([self.dallas.travel_id])
+            return page
+        
+        fetch = mock.Mock(side_effect=fetch)
+        search_cache.get_or_fetch(['dallas'], (), fetch)
+        search_cache.get_or_fetch(['dallas'], (), fetch)
+        self.assertEqual(fetch.call_count, 2)
+        
+        search_cache.get_or_fetch(['dallas'], (), lambda: [self.dallas])
+        self.assertEqual(search_cache.get_or_fetch(['dallas'], (), fetch), [self.dallas])
+        self.assertEqual(fetch.call_count, 2)
+    
+    def test_stats_endpoint_is_staff_only(self):
+        self.client.login(username='testuser', password='testpass123')
+        self.assertEqual(self.client.get(reverse('search_cache_stats')).status_code, 302)
+        
+        self.client.login(username='ops', password='testpass123')
+        response = self.client.get(reverse('search_cache_stats'))
+        self.assertEqual(response.json(), {'hits': 0, 'misses': 0, 'hit_ratio': 0.0})
+
+@override_settings(MY_BOOKINGS_PAGE_SIZE=100)
+class MyBookingsQueryTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='frequent', password='testpass123')
+        self.client.login(username='frequent', password='testpass123')
+    
+    def add_bookings(self, count):
+        TravelOption.objects.bulk_create(
+            TravelOption(
+                type='train', source='Boston', destination=f'City {i}',
+                date_time=timezone.now() + timedelta(days=i + 1), price=Decimal('10.00'), available_seats=10
+            )
+            for i in range(count)
+        )
+        options = TravelOption.objects.order_by('-travel_id')[:count]
+        Booking.objects.bulk_create(
+            Booking(user=self.user, travel_option=option, number_of_seats=1, total_price=Decimal('10.00'))
+            for option in options
+        )
+    
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('my_bookings'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+    
+    def test_query_count_is_constant_in_number_of_bookings(self):
+        self.add_bookings(3)
+        few = self.count_queries()
+        self.add_bookings(60)
+        many = self.count_queries()
+        
+        self.assertEqual(few, many)
+    
+    @override_settings(MY_BOOKINGS_PAGE_SIZE=10)
+    def test_long_history_is_paged_newest_first(self):
+        self.add_bookings(25)
+        expected = list(Booking.objects.filter(user=self.user).order_by('-booking_date', '-booking_id').values_list('booking_id', flat=True))
+        
+        seen = []
+        query = ''
+        while query is not None:
+            response = self.client.get(reverse('my_bookings') + (f'?{query}' if query else ''))
+            seen += [b.booking_id for b in response.context['bookings']]
+            query = response.context['next_query']
+        
+        self.assertEqual(seen, expected)
+
+class SeatStatisticsTest(TestCase):
+    def setUp(self):
+        search_cache.clear()
+        when = timezone.now() + timedelta(days=2)
+        self.options = {
+            seats: TravelOption.objects.create(
+                type='bus', source='Dallas', destination='Houston',
+                date_time=when + timedelta(minutes=seats), price=Decimal('25.99'),
+                available_seats=seats, capacity=60
+            )
+            for seats in (0, 4, 10, 12, 40, 60)
+        }
+    
+    def test_capacity_defaults_from_type(self):
+        option = TravelOption.objects.create(
+            type='train', source='Boston', destination='Washington DC',
+            date_time=timezone.now(), price=Decimal('89.99'), available_seats=180
+        )
+        self.assertEqual(option.capacity, 200)
+        self.assertEqual(option.occupancy_percentage, 10)
+    
+    def test_sql_annotations_match_python_properties(self):
+        for option in TravelOption.objects.with_urgency():
+            self.assertEqual(option.urgency, option.urgency_level)
+            self.assertAlmostEqual(option.occupancy, option.occupancy_percentage)
+        
+        self.assertEqual(
+            set(TravelOption.objects.low_stock().values_list('available_seats', flat=True)),
+            {seats for seats, option in self.options.items() if option.is_low_stock}
+        )
+        self.assertEqual(list(TravelOption.objects.sold_out().values_list('available_seats', flat=True)), [0])
+    
+    def test_low_stock_and_occupancy_filters_in_view(self):
+        response = self.client.get(reverse('travel_options') + '?stock=low&sort=occupancy')
+        seats = [option.available_seats for option in response.context['options']]
+        self.assertEqual(seats, [4, 10])
+        
+        response = self.client.get(reverse('travel_options') + '?sort=occupancy&page_size=4')
+        first = [option.available_seats for option in response.context['options']]
+        response = self.client.get(reverse('travel_options') + '?' + response.context['next_query'])
+        second = [option.available_seats for option in response.context['options']]
+        self.assertEqual(first + second, [0, 4, 10, 12, 40, 60])
+    
+    def test_seat_dependent_pages_follow_bookings(self):
+        user = User.objects.create_user(username='booker', password='testpass123')
+        url = reverse('travel_options') + '?stock=low'
+        self.assertEqual(len(self.client.get(url).context['options']), 2)
+        
+        reserve_seats(user, self.options[12], 2)
+        
+        self.assertEqual(len(self.client.get(url).context['options']), 3)
+    
+    def test_occupancy_and_low_stock_queries_use_indexes(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Plan assertions are written for SQLite')
+        plan = TravelOption.objects.order_by('-occupancy', 'date_time', 'travel_id')[:20].explain()
+        self.assertIn('travel_occupancy_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+        self.assertIn('travel_seats_idx', TravelOption.objects.low_stock().explain())
+
+class LoadSchedulesCommandTest(TestCase):
+    def write_file(self, suffix, content):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, 'w') as f:
+            f.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+    
+    def load(self, *args):
+        out = StringIO()
+        call_command('load_schedules', *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+    
+    def test_csv_and_jsonl_upsert_on_natural_key(self):
+        csv_path = self.write_file('.csv', (
+            'type,source,destination,date_time,price,available_seats,capacity\n'
+            'flight,New York,Los Angeles,2030-01-05T08:00:00,299.99,150,180\n'
+            'bus,Dallas,Houston,2030-01-05T09:30:00,25.99,50,\n'
+            'boat,Dallas,Houston,2030-01-05T09:30:00,25.99,50,\n'
+        ))
+        output = self.load(csv_path, '--batch-size', '1')
+        self.assertIn('rows/sec', output)
+        self.assertIn('(1 skipped)', output)
+        self.assertEqual(TravelOption.objects.count(), 2)
+        self.assertEqual(TravelOption.objects.get(type='bus').capacity, 50)
+        
+        flight = TravelOption.objects.get(type='flight')
+        TravelOption.objects.filter(pk=flight.pk).update(available_seats=140)
+        jsonl_path = self.write_file('.jsonl', (
+            '{"type": "flight", "source": "new york", "destination": "LOS ANGELES", '
+            '"date_time": "2030-01-05T08:00:00", "price": "319.99", "available_seats": 100, "capacity": 120}\n'
+        ))
+        self.load(jsonl_path)
+        
+        self.assertEqual(TravelOption.objects.count(), 2)
+        flight.refresh_from_db()
+        self.assertEqual(flight.price, Decimal('319.99'))
+        # Seat counts and the capacity they are sized against are left alone.
+        self.assertEqual((flight.available_seats, flight.capacity), (140, 180))
+    
+    def test_generator_is_reproducible_and_bookings_match_sold_seats(self):
+        self.load('--generate', '60', '--with-bookings', '--users', '5', '--seed', '7', '--batch-size', '25')
+        first = list(TravelOption.objects.order_by('travel_id').values_list('type', 'source', 'destination', 'capacity'))
+        self.assertEqual(len(first), 60)
+        
+        for option in TravelOption.objects.annotate(sold=Sum('booking__number_of_seats', filter=Q(booking__status='confirmed'))):
+            self.assertEqual(option.sold or 0, option.capacity - option.available_seats)
+        
+        TravelOption.objects.all().delete()
+        self.load('--generate', '60', '--seed', '7')
+        again = list(TravelOption.objects.order_by('travel_id').values_list('type', 'source', 'destination', 'capacity'))
+        self.assertEqual(again, first)
+    
+    def test_generator_reports_the_options_actually_written(self):
+        def repeating(count, seed, **kwargs):
+            options = list(generate_options(2, seed, **kwargs))
+            return options + [options[0]]
+        
+        with mock.patch('booking.management.commands.load_schedules.generate_options', repeating):
+            output = self.load('--generate', '3', '--batch-size', '1')
+        self.assertIn('options: 2 rows', output)
+        self.assertIn('1 generated options repeated a departure and were skipped', output)
+        self.assertEqual(TravelOption.objects.count(), 2)
+
+class BenchmarkViewsCommandTest(TestCase):
+    def test_reports_every_scenario_as_json(self):
+        call_command('load_schedules', '--generate', '30', '--with-bookings', '--users', '3', stdout=StringIO())
+        out = StringIO()
+        call_command(
+            'benchmark_views', '--use-existing-db', '--requests', '40', '--warmup', '0',
+            '--alloc-samples', '1', '--json', '-', stdout=out
+        )
+        output = out.getvalue()
+        results = json.loads(output[output.index('{'):])
+        
+        self.assertEqual(set(results['scenarios']), {
+            'search', 'search_filtered', 'search_deep', 'travel_detail',
+            'book_travel', 'cancel_booking', 'my_bookings',
+        })
+        for stats in results['scenarios'].values():
+            self.assertLessEqual(stats['p50_ms'], stats['p99_ms'])
+            self.assertIn('queries_mean', stats)
+            self.assertIn('peak_kib_p50', stats)
+
+class AsyncReadViewsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='asyncuser', password='testpass123', first_name='Ada')
+        self.travel_option = TravelOption.objects.create(
+            type='train', source='Chicago', destination='Detroit',
+            date_time=timezone.now() + timedelta(days=6), price=Decimal('55.00'), available_seats=80
+        )
+        search_cache.clear()
+    
+    def test_read_views_are_native_coroutines(self):
+        for view in (views.home, views.travel_options, views.travel_detail):
+            self.assertTrue(iscoroutinefunction(view), view.__name__)
+    
+    async def test_read_views_under_asgi(self):
+        await self.async_client.aforce_login(self.user)
+        
+        response = await self.async_client.get(reverse('home'))
+        self.assertContains(response, 'Welcome back, Ada!')
+        
+        response = await self.async_client.get(reverse('travel_options'), {'source': 'chic'})
+        self.assertContains(response, 'Detroit')
+        self.assertIn('total;dur=', response['Server-Timing'])
+        
+        response = await self.async_client.get(reverse('travel_detail', args=[self.travel_option.travel_id]))
+        self.assertContains(response, '80 seats available')
+        response = await self.async_client.get(reverse('travel_detail', args=[self.travel_option.travel_id + 1]))
+        self.assertEqual(response.status_code, 404)
+
+class JsonSearchApiTest(TestCase):
+    def setUp(self):
+        start = timezone.now() + timedelta(days=1)
+        TravelOption.objects.bulk_create([
+            TravelOption(
+                type='bus' if i % 2 else 'train', source='Denver', destination=f'Boulder {i}',
+                date_time=start + timedelta(hours=i), price=Decimal('10.00') + i, available_seats=40
+            )
+            for i in range(7)
+        ])
+        self.ids = list(TravelOption.objects.order_by('date_time', 'travel_id').values_list('travel_id', flat=True))
+    
+    def read(self, response):
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        return json.loads(b''.join(response.streaming_content))
+    
+    def test_cursor_walk_with_field_selection(self):
+        url = reverse('api_travel_options')
+        params = {'source': 'den', 'fields': 'travel_id,price', 'page_size': 3}
+        seen = []
+        while True:
+            body = self.read(self.client.get(url, params))
+            self.assertTrue(all(set(row) == {'travel_id', 'price'} for row in body['results']))
+            seen += [row['travel_id'] for row in body['results']]
+            if not body['next']:
+                break
+            params['after'] = body['next']
+        
+        self.assertEqual(seen, self.ids)
+        body = self.read(self.client.get(url, {'type': 'bus', 'fields': 'source,date_time'}))
+        self.assertEqual(len(body['results']), 3)
+        self.assertEqual(body['results'][0]['source'], 'Denver')
+    
+    def test_stream_reads_bounded_keyset_chunks(self):
+        paginator = KeysetPaginator(TravelOption.objects.values('travel_id', 'date_time'), ['date_time', 'travel_id'], 3)
+        with self.assertNumQueries(3):
+            rows = list(paginator.stream(limit=5, chunk_size=2))
+        self.assertEqual([row['travel_id'] for row in rows], self.ids[:5])
+    
+    def test_rejects_unknown_fields_and_bad_cursors(self):
+        url = reverse('api_travel_options')
+        response = self.client.get(url, {'fields': 'travel_id,user'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('user', response.json()['error'])
+        self.assertEqual(self.client.get(url, {'after': 'not-a-cursor'}).status_code, 400)
+    
+    async def test_streams_asynchronously_under_asgi(self):
+        response = await self.async_client.get(reverse('api_travel_options'), {'fields': 'travel_id', 'page_size': 4})
+        self.assertTrue(response.is_async)
+        body = json.loads(b''.join([chunk async for chunk in response.streaming_content]))
+        self.assertEqual([row['travel_id'] for row in body['results']], self.ids[:4])
+        self.assertIsNotNone(body['next'])
+
+class CityAutocompleteTest(TestCase):
+    def setUp(self):
+        start = timezone.now() + timedelta(days=1)
+        TravelOption.objects.bulk_create([
+            TravelOption(type='bus', source=source, destination=destination,
+                         date_time=start + timedelta(hours=i), price=Decimal('20.00'), available_seats=30)
+            for i, (source, destination) in enumerate([
+                ('New York', 'Boston'), ('new york', 'Newark'), ('New Orleans', 'Boston'), ('Nashville', 'Memphis'),
+            ])
+        ])
+        city_index.rebuild()
+    
+    def test_prefix_lookup_is_case_insensitive_and_bounded(self):
+        self.assertEqual(city_index.suggest('NEW'), ['New Orleans', 'New York', 'Newark'])
+        self.assertEqual(city_index.suggest('new y'), ['New York'])
+        self.assertEqual(city_index.suggest('n', limit=2), ['Nashville', 'New Orleans'])
+        self.assertEqual(city_index.suggest('  '), [])
+    
+    def test_index_follows_committed_changes_without_queries(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            option = TravelOption.objects.create(
+                type='train', source='Newport', destination='Boston',
+                date_time=timezone.now() + timedelta(days=3), price=Decimal('30.00'), available_seats=10
+            )
+        self.assertIn('Newport', city_index.suggest('newp'))
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            option.source = 'Norfolk'
+            option.save()
+        self.assertEqual(city_index.suggest('newp'), [])
+        self.assertEqual(city_index.suggest('nor'), ['Norfolk'])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            TravelOption.objects.get(source='Nashville').delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(city_index.suggest('nash'), [])
+            self.assertEqual(city_index.suggest('bos'), ['Boston'])
+    
+    def test_uncommitted_options_are_not_indexed(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            TravelOption.objects.create(
+                type='bus', source='Nowhere', destination='Boston',
+                date_time=timezone.now() + timedelta(days=3), price=Decimal('5.00'), available_seats=10
+            )
+        self.assertEqual(city_index.suggest('nowh'), [])
+    
+    def test_endpoint(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('city_suggestions'), {'q': 'mem'})
+        self.assertEqual(response.json(), {'results': ['Memphis']})
+
+class ConnectionSearchTest(TestCase):
+    def setUp(self):
+        morning = timezone.localtime().replace(hour=8, minute=0, second=0, microsecond=0) + timedelta(days=2)
+        self.day = morning.date()
+        
+        def option(type, source, destination, departs, hours, price, seats=30):
+            return TravelOption.objects.create(
+                type=type, source=source, destination=destination,
+                date_time=morning + timedelta(hours=departs), arrival_time=morning + timedelta(hours=departs + hours),
+                price=Decimal(price), available_seats=seats
+            )
+        
+        self.first = option('bus', 'Austin', 'Dallas', 0, 2, '20.00')
+        self.second = option('bus', 'Dallas', 'Denver', 3, 2, '20.00')
+        # Leaves Dallas 15 minutes after the bus arrives; shorter than the layover.
+        option('train', 'Dallas', 'Denver', 2.25, 1, '5.00')
+        option('train', 'Dallas', 'Denver', 4, 2, '1.00', seats=0)
+        self.direct = option('flight', 'Austin', 'Denver', 1, 1, '100.00')
+        route_graph.rebuild()
+    
+    def query(self, **params):
+        return parse_connection_query({'source': 'austin', 'destination': 'DENVER', 'date': self.day.isoformat(), **params})
+    
+    def legs(self, itineraries):
+        return [[leg.travel_id for leg in itinerary.legs] for itinerary in itineraries]
+    
+    def test_ranks_by_price_or_arrival_without_queries(self):
+        with self.assertNumQueries(0):
+            cheapest = route_graph.search(self.query())
+            earliest = route_graph.search(self.query(sort='arrival'))
+        
+        self.assertEqual(self.legs(cheapest), [[self.first.travel_id, self.second.travel_id], [self.direct.travel_id]])
+        self.assertEqual(cheapest[0].price, Decimal('40.00'))
+        self.assertEqual(cheapest[0].arrives_at, self.second.arrival_time)
+        self.assertEqual(self.legs(earliest), [[self.direct.travel_id], [self.first.travel_id, self.second.travel_id]])
+    
+    def test_layover_duration_leg_and_seat_limits(self):
+        self.assertEqual(self.legs(route_graph.search(self.query(max_duration='3'))), [[self.direct.travel_id]])
+        self.assertEqual(self.legs(route_graph.search(self.query(max_legs='1'))), [[self.direct.travel_id]])
+        self.assertEqual(len(self.legs(route_graph.search(self.query(min_layover='10')))), 3)
+        self.assertEqual(route_graph.search(self.query()._replace(seats=31)), [])
+        self.assertEqual(route_graph.search(self.query(limit='1'))[0].price, Decimal('40.00'))
+    
+    def test_graph_follows_committed_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            hold_seats(User.objects.create_user(username='traveller', password='pw'), self.second, 25)
+        self.assertEqual(self.legs(route_graph.search(self.query(seats='10'))), [[self.direct.travel_id]])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.direct.price = Decimal('10.00')
+            self.direct.save()
+        self.assertEqual(self.legs(route_graph.search(self.query()))[0], [self.direct.travel_id])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.direct.delete()
+        self.assertEqual(self.legs(route_graph.search(self.query())), [[self.first.travel_id, self.second.travel_id]])
+    
+    def test_edits_replace_the_lists_searches_walk(self):
+        by_source, by_route = route_graph.graph[:2]
+        walking = by_source['dallas']
+        before = list(walking)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.second.date_time += timedelta(minutes=30)
+            self.second.save()
+        # A search already iterating the old list sees it unchanged.
+        self.assertEqual(walking, before)
+        self.assertIsNot(by_source['dallas'], walking)
+        self.assertEqual([leg.travel_id for leg in by_source['dallas']], [leg.travel_id for leg in before])
+        self.assertEqual(by_route['dallas', 'denver'], sorted(by_route['dallas', 'denver']))
+        
+        route_graph._discard([self.second.travel_id])
+        self.assertNotIn(self.second.travel_id, [leg.travel_id for leg in by_source['dallas']])
+        self.assertNotIn(self.second.travel_id, route_graph.graph[2])
+    
+    def test_view(self):
+        response = self.client.get(reverse('connections'), {
+            'source': 'Austin', 'destination': 'Denver', 'date': self.day.isoformat(),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['itineraries']), 2)
+        self.assertContains(response, reverse('book_travel', args=[self.second.travel_id]))
+    
+    def test_arrival_defaults_from_travel_type(self):
+        option = TravelOption.objects.create(
+            type='train', source='Austin', destination='Houston',
+            date_time=timezone.now() + timedelta(days=1), price=Decimal('15.00'), available_seats=10
+        )
+        self.assertEqual(option.arrival_time - option.date_time, timedelta(hours=6))
+    
+    def test_benchmark_command(self):
+        call_command('load_schedules', '--generate', '200', stdout=StringIO())
+        out = StringIO()
+        call_command('benchmark_connections', '--use-existing-db', '--queries', '5', '--updates', '5', '--json', '-', stdout=out)
+        output = out.getvalue()
+        results = json.loads(output[output.index('{'):])
+        
+        self.assertEqual(results['graph']['legs'], TravelOption.objects.filter(date_time__gte=timezone.now()).count())
+        self.assertEqual(set(results['searches']), {'price', 'arrival'})
+
+class PriceCalendarTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='planner', password='pw')
+        noon = timezone.localtime().replace(hour=12, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        self.day, self.next_day = noon.date(), (noon + timedelta(days=1)).date()
+        
+        def option(type, price, seats, days=0):
+            return TravelOption.objects.create(
+                type=type, source='Austin', destination='Dallas',
+                date_time=noon + timedelta(days=days, minutes=len(self.options)), price=Decimal(price), available_seats=seats
+            )
+        
+        self.options = []
+        for args in [('bus', '20.00', 30), ('bus', '15.00', 10), ('flight', '90.00', 100), ('bus', '25.00', 40, 1)]:
+            self.options.append(option(*args))
+    
+    def cells(self):
+        return list(PriceCalendarDay.objects.order_by('day', 'type').values_list(
+            'day', 'type', 'min_price', 'available_seats', 'options',
+        ))
+    
+    def test_catalogue_writes_update_their_cells(self):
+        self.assertEqual(self.cells(), [
+            (self.day, 'bus', Decimal('15.00'), 40, 2),
+            (self.day, 'flight', Decimal('90.00'), 100, 1),
+            (self.next_day, 'bus', Decimal('25.00'), 40, 1),
+        ])
+        
+        cheap = self.options[1]
+        cheap.price = Decimal('40.00')
+        cheap.save()
+        self.assertEqual(self.cells()[0], (self.day, 'bus', Decimal('20.00'), 40, 2))
+        
+        cheap.date_time += timedelta(days=1)
+        cheap.save()
+        self.assertEqual(self.cells()[0], (self.day, 'bus', Decimal('20.00'), 30, 1))
+        self.assertEqual(self.cells()[2], (self.next_day, 'bus', Decimal('25.00'), 50, 2))
+        
+        self.options[2].delete()
+        TravelOption.objects.filter(date_time__date=self.next_day).delete()
+        self.assertEqual(self.cells(), [(self.day, 'bus', Decimal('20.00'), 30, 1)])
+    
+    def test_seat_changes_adjust_totals_in_place(self):
+        hold = hold_seats(self.user, self.options[0], 4)
+        self.assertEqual(self.cells()[0][3], 36)
+        release_hold(hold)
+        booking = confirm_hold(hold_seats(self.user, self.options[1], 3))
+        self.assertEqual(self.cells()[0][3], 37)
+        release_seats(booking)
+        self.assertEqual(self.cells()[0][3], 40)
+    
+    def test_sold_out_options_have_no_fare(self):
+        booking = reserve_seats(self.user, self.options[1], 10)
+        self.assertEqual(self.cells()[0], (self.day, 'bus', Decimal('20.00'), 30, 2))
+        reserve_seats(self.user, self.options[0], 30)
+        self.assertEqual(self.cells()[0], (self.day, 'bus', None, 0, 2))
+        
+        release_seats(booking)
+        self.assertEqual(self.cells()[0], (self.day, 'bus', Decimal('15.00'), 10, 2))
+        days = self.client.get(reverse('api_price_calendar'), {'source': 'Austin', 'destination': 'Dallas'}).json()['days']
+        self.assertEqual(days[0]['min_price'], '15.00')
+    
+    def test_upsert_omits_conflict_target_where_unsupported(self):
+        for supported in (True, False):
+            with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', supported), \
+                    mock.patch.object(PriceCalendarDay.objects, 'bulk_create') as bulk_create:
+                self.options[0].price = Decimal('12.00')
+                self.options[0].save()
+            self.assertEqual('unique_fields' in bulk_create.call_args.kwargs, supported)
+            self.assertTrue(bulk_create.call_args.kwargs['update_conflicts'])
+    
+    def test_rebuild_command_recovers_drift(self):
+        expected = self.cells()
+        PriceCalendarDay.objects.update(available_seats=0)
+        PriceCalendarDay.objects.filter(type='flight').delete()
+        
+        out = StringIO()
+        call_command('rebuild_price_calendar', stdout=out)
+        self.assertIn('Rebuilt 3 price calendar days', out.getvalue())
+        self.assertEqual(self.cells(), expected)
+    
+    def test_endpoint_reads_the_summary_table_once(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('api_price_calendar'), {'source': 'austin', 'destination': 'DALLAS'})
+        days = response.json()['days']
+        self.assertEqual([day['date'] for day in days], [self.day.isoformat(), self.next_day.isoformat()])
+        self.assertEqual(days[0], {
+            'date': self.day.isoformat(), 'min_price': '15.00', 'available_seats': 140, 'options': 3, 'types': ['bus', 'flight'],
+        })
+        
+        flights = self.client.get(reverse('api_price_calendar'), {'source': 'Austin', 'destination': 'Dallas', 'type': 'flight'})
+        self.assertEqual([day['min_price'] for day in flights.json()['days']], ['90.00'])
+        one_day = self.client.get(reverse('api_price_calendar'), {'source': 'Austin', 'destination': 'Dallas', 'days': '1'})
+        self.assertEqual(one_day.json()['days'], [])
+        self.assertEqual(self.client.get(reverse('api_price_calendar'), {'source': 'Austin'}).status_code, 400)
+
+class BookingAnalyticsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ops', password='pw')
+        self.austin = TravelOption.objects.create(
+            type='bus', source='Austin', destination='Dallas',
+            date_time=timezone.now() + timedelta(days=5), price=Decimal('20.00'), available_seats=40
+        )
+        self.denver = TravelOption.objects.create(
+            type='flight', source='Denver', destination='Boise',
+            date_time=timezone.now() + timedelta(days=6), price=Decimal('120.00'), available_seats=100
+        )
+    
+    def rollups(self):
+        return list(BookingRollup.objects.order_by('day', 'type').values_list(
+            'day', 'type', 'source', 'destination', 'bookings', 'seats', 'revenue',
+            'cancellations', 'cancelled_seats', 'cancelled_revenue',
+        ))
+    
+    def book(self):
+        confirm_hold(hold_seats(self.user, self.austin, 2))
+        cancelled = reserve_seats(self.user, self.austin, 1)
+        release_seats(cancelled)
+        reserve_seats(self.user, self.denver, 3)
+        drain()
+    
+    def test_booking_events_increment_rollups(self):
+        self.book()
+        today = timezone.localdate()
+        self.assertEqual(self.rollups(), [
+            (today, 'bus', 'Austin', 'Dallas', 2, 3, Decimal('60.00'), 1, 1, Decimal('20.00')),
+            (today, 'flight', 'Denver', 'Boise', 1, 3, Decimal('360.00'), 0, 0, Decimal('0.00')),
+        ])
+        
+        totals = booking_analytics.totals(days=1)
+        self.assertEqual((totals['bookings'], totals['net_seats'], totals['net_revenue']), (3, 5, Decimal('400.00')))
+        self.assertAlmostEqual(totals['cancellation_rate'], 100 / 3)
+        self.assertEqual([route['source'] for route in booking_analytics.routes()], ['Denver', 'Austin'])
+    
+    def test_backfill_matches_events_and_covers_bulk_loaded_bookings(self):
+        self.book()
+        expected = self.rollups()
+        Booking.objects.bulk_create([Booking(
+            user=self.user, travel_option=self.denver, number_of_seats=1, total_price=Decimal('120.00'),
+            booking_date=timezone.now() - timedelta(days=3), status='cancelled',
+        )])
+        
+        out = StringIO()
+        call_command('backfill_booking_rollups', '--chunk-size', '2', stdout=out)
+        
+        self.assertIn('Rolled up 4 bookings', out.getvalue())
+        self.assertEqual(self.rollups()[1:], expected)
+        self.assertEqual(self.rollups()[0][4:], (1, 1, Decimal('120.00'), 1, 1, Decimal('120.00')))
+    
+    def test_backfill_counts_cancellations_made_during_the_run_once(self):
+        bookings = [reserve_seats(self.user, self.austin, 1) for _ in range(4)]
+        drain()
+        
+        def on_chunk(last, high_water, read):
+            if last == bookings[1].booking_id:
+                # One cancellation reaches the rollups before its chunk is read, one is still queued.
+                release_seats(bookings[3])
+                drain()
+                release_seats(bookings[2])
+        
+        self.assertEqual(booking_analytics.backfill(chunk_size=1, on_chunk=on_chunk), 4)
+        drain()
+        rollup = BookingRollup.objects.get()
+        self.assertEqual((rollup.bookings, rollup.seats, rollup.cancellations, rollup.cancelled_seats), (4, 4, 2, 2))
+        self.assertEqual(rollup.cancelled_revenue, Decimal('40.00'))
+    
+    def test_backfill_keeps_archived_history(self):
+        self.book()
+        expected = self.rollups()
+        TravelOption.objects.filter(pk=self.austin.pk).update(date_time=timezone.now() - timedelta(days=10))
+        
+        self.assertEqual(archive_batch(timezone.now() - timedelta(days=5)), (1, 2))
+        booking_analytics.backfill(chunk_size=1)
+        
+        self.assertEqual(ArchivedBooking.objects.count(), 2)
+        self.assertEqual(self.rollups(), expected)
+    
+    def test_admin_dashboard_reads_only_rollups(self):
+        self.book()
+        self.client.force_login(User.objects.create_superuser(username='boss', password='pw'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:booking_bookingrollup_changelist'), {'days': '7'})
+        
+        self.assertContains(response, 'Denver &rarr; Boise')
+        self.assertContains(response, '$400.00')
+        self.assertFalse([query['sql'] for query in queries if 'booking_booking"' in query['sql']])
+
+class AdminChangelistTest(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='pw')
+        self.client.force_login(self.admin)
+        self.options = [
+            TravelOption.objects.create(
+                type='bus', source=source, destination='Dallas',
+                date_time=timezone.now() + timedelta(days=i + 1), price=Decimal('20.00'), available_seats=50
+            )
+            for i, source in enumerate(['Austin', 'Houston', 'El Paso'])
+        ]
+        city_index.rebuild()
+    
+    def add_bookings(self, count):
+        users = [User.objects.create_user(username=f'rider{User.objects.count()}-{i}') for i in range(count)]
+        Booking.objects.bulk_create([
+            Booking(user=user, travel_option=self.options[i % 3], number_of_seats=1, total_price=Decimal('20.00'))
+            for i, user in enumerate(users)
+        ])
+    
+    def test_booking_changelist_query_count_is_constant(self):
+        url = reverse('admin:booking_booking_changelist')
+        self.add_bookings(2)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(url)
+        self.add_bookings(12)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url)
+        
+        self.assertContains(response, 'rider')
+        self.assertEqual(len(many), len(few))
+    
+    def test_city_filters_come_from_the_index(self):
+        url = reverse('admin:booking_traveloption_changelist')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'source_key': 'el paso'})
+        
+        self.assertEqual(list(response.context['cl'].result_list), [self.options[2]])
+        self.assertContains(response, '?source_key=houston')
+        self.assertFalse([query['sql'] for query in queries if 'DISTINCT' in query['sql']])
+    
+    def test_duplicate_natural_key_is_a_form_error(self):
+        departure = timezone.localtime(self.options[0].date_time)
+        response = self.client.post(reverse('admin:booking_traveloption_add'), {
+            'type': 'bus', 'source': 'AUSTIN', 'destination': 'dallas',
+            'date_time_0': departure.strftime('%Y-%m-%d'), 'date_time_1': departure.strftime('%H:%M:%S.%f'),
+            'arrival_time_0': '', 'arrival_time_1': '', 'price': '25.00', 'available_seats': '40', 'capacity': '',
+        })
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['adminform'].form.non_field_errors())
+        self.assertEqual(TravelOption.objects.count(), 3)
+    
+    def test_booking_form_uses_autocomplete_widgets(self):
+        response = self.client.get(reverse('admin:booking_booking_add'))
+        self.assertContains(response, 'admin-autocomplete')
+        self.assertNotContains(response, f'<option value="{self.options[1].travel_id}"')
+        
+        autocomplete = self.client.get(reverse('admin:autocomplete'), {
+            'app_label': 'booking', 'model_name': 'booking', 'field_name': 'travel_option', 'term': 'hou',
+        })
+        self.assertEqual([item['id'] for item in autocomplete.json()['results']], [str(self.options[1].travel_id)])
+    
+    def test_estimated_count_replaces_count_star_on_big_tables(self):
+        with mock.patch('booking.pagination.estimated_row_count', return_value=5000000):
+            with self.assertNumQueries(0):
+                self.assertEqual(EstimatedCountPaginator(TravelOption.objects.order_by('travel_id'), 100).count, 5000000)
+            # Filtered lists are counted, but never past the bound.
+            paginator = EstimatedCountPaginator(TravelOption.objects.filter(destination='Dallas').order_by('travel_id'), 100)
+            paginator.exact_limit = 2
+            self.assertEqual(paginator.count, 2)
+        # Without planner statistics (SQLite) small tables are counted exactly.
+        self.assertEqual(EstimatedCountPaginator(TravelOption.objects.order_by('travel_id'), 100).count, 3)
+
+class ArchiveTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='historian', password='pw')
+        self.departed = [
+            TravelOption.objects.create(
+                type='train', source='Austin', destination='Dallas',
+                date_time=timezone.now() - timedelta(days=10 + i), price=Decimal('30.00'), available_seats=50
+            )
+            for i in range(3)
+        ]
+        self.recent = TravelOption.objects.create(
+            type='train', source='Austin', destination='Dallas',
+            date_time=timezone.now() - timedelta(days=1), price=Decimal('30.00'), available_seats=50
+        )
+        self.bookings = [
+            Booking.objects.create(user=self.user, travel_option=option, number_of_seats=2, total_price=Decimal('60.00'))
+            for option in self.departed + [self.recent]
+        ]
+    
+    def test_command_moves_departed_options_in_resumable_batches(self):
+        out = StringIO()
+        call_command('archive_departed', '--batch-size', '2', '--max-batches', '1', stdout=out)
+        self.assertIn('Archived 2 travel options and 2 bookings', out.getvalue())
+        # Oldest departures go first.
+        self.assertEqual(
+            set(ArchivedTravelOption.objects.values_list('travel_id', flat=True)),
+            {self.departed[2].travel_id, self.departed[1].travel_id},
+        )
+        
+        call_command('archive_departed', '--batch-size', '2', stdout=out)
+        self.assertEqual(list(TravelOption.objects.all()), [self.recent])
+        self.assertEqual(list(Booking.objects.all()), [self.bookings[-1]])
+        self.assertEqual(ArchivedTravelOption.objects.count(), 3)
+        archived = ArchivedBooking.objects.get(booking_id=self.bookings[0].booking_id)
+        self.assertEqual((archived.user, archived.travel_option.date_time), (self.user, self.departed[0].date_time))
+    
+    def test_batches_leave_live_caches_alone(self):
+        city_index.rebuild()
+        route_graph.rebuild()
+        built = (city_index.built_at, route_graph.built_at)
+        search_cache.clear()
+        search_cache._store('travel-search:departed', [self.departed[2]])
+        search_cache._store('travel-search:recent', [self.recent])
+        generations = (search_cache._generation(), search_cache._generation('seats-generation'))
+        oldest_day = timezone.localdate(self.departed[2].date_time)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(archive_batch(timezone.now() - timedelta(days=5), batch_size=1), (1, 1))
+        
+        self.assertEqual((search_cache._generation(), search_cache._generation('seats-generation')), generations)
+        self.assertIsNone(search_cache._cached('travel-search:departed'))
+        self.assertEqual(search_cache._cached('travel-search:recent'), [self.recent])
+        self.assertEqual((city_index.built_at, route_graph.built_at), built)
+        self.assertFalse(PriceCalendarDay.objects.filter(day=oldest_day).exists())
+        self.assertEqual(PriceCalendarDay.objects.count(), 3)
+    
+    def test_history_is_shown_on_demand(self):
+        Booking.objects.filter(pk=self.bookings[0].pk).update(seat_numbers=[7, 8])
+        call_command('archive_departed', stdout=StringIO())
+        self.assertEqual(ArchivedBooking.objects.get(pk=self.bookings[0].pk).seat_numbers, [7, 8])
+        self.client.force_login(self.user)
+        
+        current = self.client.get(reverse('my_bookings'))
+        self.assertEqual([booking.booking_id for booking in current.context['bookings']], [self.bookings[-1].booking_id])
+        with self.assertNumQueries(3):
+            past = self.client.get(reverse('my_bookings'), {'archived': '1'})
+        self.assertEqual(len(past.context['bookings']), 3)
+        self.assertContains(past, 'seats 7, 8')
+        self.assertNotContains(past, reverse('cancel_booking', args=[self.bookings[0].booking_id]))
+        
+        self.client.force_login(User.objects.create_superuser(username='keeper', password='pw'))
+        response = self.client.get(reverse('admin:booking_archivedbooking_changelist'), {'q': 'historian'})
+        self.assertEqual(response.context['cl'].result_count, 3)
+
+class WaitlistTest(TestCase):
+    def setUp(self):
+        self.option = TravelOption.objects.create(
+            type='flight', source='Austin', destination='Denver',
+            date_time=timezone.now() + timedelta(days=5), price=Decimal('120.00'), available_seats=4
+        )
+        self.users = [
+            User.objects.create_user(username=f'waiter{i}', password='pw', email=f'waiter{i}@example.com')
+            for i in range(3)
+        ]
+        self.booking = reserve_seats(self.users[0], self.option, 4)
+    
+    def test_cancellation_promotes_queue_in_order(self):
+        first = join_waitlist(self.users[1], self.option, 3)
+        second = join_waitlist(self.users[2], self.option, 1)
+        self.assertEqual((first.status, second.status), ('waiting', 'waiting'))
+        # Joining twice keeps the original place in the queue.
+        self.assertEqual(join_waitlist(self.users[1], self.option, 3).entry_id, first.entry_id)
+        
+        release_seats(self.booking)
+        drain()
+        
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.status, second.status), ('promoted', 'promoted'))
+        self.assertEqual((first.hold.user, first.hold.number_of_seats), (self.users[1], 3))
+        self.assertEqual(first.hold.total_price, Decimal('360.00'))
+        self.option.refresh_from_db()
+        self.assertEqual(self.option.available_seats, 0)
+        promotions = [message for message in mail.outbox if message.subject.startswith('Seats available')]
+        self.assertEqual(sorted(message.to[0] for message in promotions), ['waiter1@example.com', 'waiter2@example.com'])
+        self.assertIn(reverse('checkout', args=[first.hold.hold_id]), promotions[0].body + promotions[1].body)
+    
+    def test_larger_request_blocks_those_behind_it(self):
+        first = join_waitlist(self.users[1], self.option, 3)
+        second = join_waitlist(self.users[2], self.option, 1)
+        self.option.refresh_from_db()
+        self.option.available_seats = 2
+        self.option.save()
+        
+        self.assertEqual(promote_waitlist([self.option.travel_id]), [])
+        second.refresh_from_db()
+        self.assertEqual(second.status, 'waiting')
+        
+        self.assertTrue(leave_waitlist(first))
+        self.assertFalse(leave_waitlist(first))
+        self.assertEqual([entry.entry_id for entry in promote_waitlist([self.option.travel_id])], [second.entry_id])
+    
+    def test_requests_over_capacity_are_rejected(self):
+        with self.assertRaises(ValueError):
+            join_waitlist(self.users[1], self.option, self.option.capacity + 1)
+        self.client.force_login(self.users[1])
+        response = self.client.post(reverse('join_waitlist', args=[self.option.travel_id]), {'seats': '999'}, follow=True)
+        self.assertContains(response, f'This trip only has {self.option.capacity} seats.')
+        self.assertFalse(WaitlistEntry.objects.exists())
+        
+        second = join_waitlist(self.users[2], self.option, 1)
+        release_seats(self.booking)
+        second.refresh_from_db()
+        self.assertEqual(second.status, 'promoted')
+    
+    def test_free_seats_are_granted_on_join_and_expiry(self):
+        spare = TravelOption.objects.create(
+            type='bus', source='Austin', destination='Waco',
+            date_time=timezone.now() + timedelta(days=1), price=Decimal('15.00'), available_seats=2
+        )
+        entry = join_waitlist(self.users[1], spare, 2)
+        self.assertEqual(entry.status, 'promoted')
+        
+        waiting = join_waitlist(self.users[2], spare, 2)
+        SeatHold.objects.filter(pk=entry.hold_id).update(expires_at=timezone.now() - timedelta(seconds=1))
+        release_expired_holds()
+        waiting.refresh_from_db()
+        self.assertEqual(waiting.status, 'promoted')
+        self.assertFalse(SeatHold.objects.filter(pk=entry.hold_id).exists())
+        
+        # Capacity raised by hand is handed out by the sweep command.
+        late = join_waitlist(self.users[0], spare, 1)
+        spare.refresh_from_db()
+        spare.available_seats = 1
+        spare.save()
+        out = StringIO()
+        call_command('promote_waitlist', stdout=out)
+        self.assertIn('Promoted 1 waitlist entries on 1 travel options', out.getvalue())
+        late.refresh_from_db()
+        self.assertEqual(late.status, 'promoted')
+    
+    def test_views(self):
+        self.client.force_login(self.users[1])
+        response = self.client.get(reverse('book_travel', args=[self.option.travel_id]))
+        self.assertContains(response, reverse('join_waitlist', args=[self.option.travel_id]))
+        
+        response = self.client.post(reverse('join_waitlist', args=[self.option.travel_id]), {'seats': 2})
+        self.assertRedirects(response, reverse('my_waitlist'))
+        entry = WaitlistEntry.objects.get(user=self.users[1])
+        self.assertContains(self.client.get(reverse('my_waitlist')), reverse('leave_waitlist', args=[entry.entry_id]))
+        
+        self.client.post(reverse('leave_waitlist', args=[entry.entry_id]))
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, 'left')
+        
+        self.client.force_login(self.users[2])
+        response = self.client.post(reverse('leave_waitlist', args=[entry.entry_id]))
+        self.assertEqual(response.status_code, 404)
+
+class OutboxTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='traveller', password='pw', email='traveller@example.com')
+        self.options = [
+            TravelOption.objects.create(
+                type='train', source='Austin', destination=destination,
+                date_time=timezone.now() + timedelta(days=3), price=Decimal('25.00'), available_seats=20
+            )
+            for destination in ['Dallas', 'Houston']
+        ]
+    
+    def test_booking_queues_side_effects_in_its_transaction(self):
+        with self.assertRaises(SeatsUnavailable):
+            reserve_seats(self.user, self.options[0], 50)
+        self.assertFalse(OutboxEvent.objects.exists())
+        
+        booking = reserve_seats(self.user, self.options[0], 2)
+        self.assertEqual(
+            list(OutboxEvent.objects.order_by('event_id').values_list('topic', 'travel_option_id', 'status')),
+            [(ROLLUP, booking.travel_option_id, 'pending'), ('booking_confirmed', booking.travel_option_id, 'pending')],
+        )
+        self.assertEqual((len(mail.outbox), BookingRollup.objects.count()), (0, 0))
+        
+        out = StringIO()
+        call_command('process_outbox', '--workers', '1', stdout=out)
+        self.assertIn('Processed 2 outbox events, 0 failed', out.getvalue())
+        self.assertEqual(BookingRollup.objects.get().seats, 2)
+        self.assertEqual(mail.outbox[0].to, ['traveller@example.com'])
+        self.assertIn(f'#{booking.booking_id}', mail.outbox[0].body)
+        # Done events are never run twice.
+        self.assertEqual(drain(), (0, 0))
+    
+    @override_settings(OUTBOX_RETRY_DELAY=60, OUTBOX_MAX_ATTEMPTS=2)
+    def test_failures_retry_with_backoff_without_reordering(self):
+        first = reserve_seats(self.user, self.options[0], 1)
+        release_seats(first)
+        reserve_seats(self.user, self.options[1], 1)
+        
+        def flaky(events):
+            if any(event['destination'] == 'Dallas' for event in events):
+                raise RuntimeError('db down')
+            booking_analytics.apply_events(events)
+        
+        with mock.patch.dict(HANDLERS, {ROLLUP: flaky}):
+            self.assertEqual(drain(), (2, 1))
+        # The failed rollup holds back the rest of its option; the other option went through.
+        self.assertEqual(
+            list(OutboxEvent.objects.filter(travel_option_id=self.options[0].travel_id).order_by('event_id').values_list('status', 'attempts')),
+            [('pending', 1), ('pending', 0), ('pending', 0)],
+        )
+        self.assertEqual(len(mail.outbox), 1)
+        event = OutboxEvent.objects.filter(attempts=1).get()
+        self.assertEqual(event.last_error, 'RuntimeError: db down')
+        self.assertEqual(drain(), (0, 0))
+        
+        OutboxEvent.objects.filter(pk=event.pk).update(available_at=timezone.now())
+        self.assertEqual(drain(), (3, 0))
+        rollup = BookingRollup.objects.get(destination='Dallas')
+        self.assertEqual((rollup.bookings, rollup.cancellations), (1, 1))
+        self.assertEqual(len(mail.outbox), 2)
+    
+    def test_backfill_drops_queued_rollups_it_recounts(self):
+        reserve_seats(self.user, self.options[0], 3)
+        booking_analytics.backfill()
+        drain()
+        self.assertEqual(BookingRollup.objects.get().seats, 3)
+
+class ReconcileSeatsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='auditor', password='pw')
+        self.options = [
+            TravelOption.objects.create(
+                type='bus', source='Austin', destination=destination,
+                date_time=timezone.now() + timedelta(days=4), price=Decimal('10.00'), available_seats=10, capacity=10
+            )
+            for destination in ['Dallas', 'Houston', 'Waco', 'Tyler']
+        ]
+        drifted, oversold, consistent, sold_out = self.options
+        reserve_seats(self.user, drifted, 3)
+        hold_seats(self.user, drifted, 2)
+        drifted.refresh_from_db()
+        drifted.available_seats = 9
+        drifted.save()
+        Booking.objects.create(user=self.user, travel_option=oversold, number_of_seats=12, total_price=Decimal('120.00'))
+        release_seats(reserve_seats(self.user, consistent, 4))
+        sold_out.available_seats = 0
+        sold_out.save()
+        self.waiting = join_waitlist(self.user, sold_out, 4)
+    
+    def seats(self):
+        return [option.available_seats for option in TravelOption.objects.order_by('travel_id')]
+    
+    def test_reports_drift_with_one_query_per_chunk(self):
+        with self.assertNumQueries(3):
+            drift = list(find_drift(chunk_size=2))
+        self.assertEqual(
+            [(row['travel_id'], row['available_seats'], row['expected']) for row in drift],
+            [(self.options[0].travel_id, 9, 5), (self.options[1].travel_id, 10, -2), (self.options[3].travel_id, 0, 10)],
+        )
+        
+        out = StringIO()
+        call_command('reconcile_seats', stdout=out)
+        self.assertIn(f'travel {self.options[0].travel_id}: 9 available, expected 5 (capacity 10, booked 3, held 2)', out.getvalue())
+        self.assertIn('Checked 4 travel options: 3 drifted (1 oversold)', out.getvalue())
+        self.assertEqual(self.seats(), [9, 10, 10, 0])
+    
+    def test_fix_repairs_in_bulk_and_propagates(self):
+        out = StringIO()
+        call_command('reconcile_seats', '--fix', '--chunk-size', '2', stdout=out)
+        self.assertIn('3 drifted (1 oversold), repaired 3', out.getvalue())
+        # Freed seats go to the waitlist first.
+        self.assertEqual(self.seats(), [5, 0, 10, 6])
+        self.waiting.refresh_from_db()
+        self.assertEqual(self.waiting.status, 'promoted')
+        self.assertEqual(
+            PriceCalendarDay.objects.get(destination_key='dallas').available_seats, 5,
+        )
+        # Only the oversold option still disagrees; it stays at zero until bookings are cancelled.
+        self.assertEqual([row['expected'] for row in find_drift()], [-2])
+
+class SeatMapTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='seated', password='pw')
+        self.option = TravelOption.objects.create(
+            type='bus', source='Austin', destination='Dallas',
+            date_time=timezone.now() + timedelta(days=2), price=Decimal('10.00'), available_seats=10, capacity=10
+        )
+    
+    def layout(self):
+        self.option.refresh_from_db()
+        return sorted(set(range(1, 11)) - set(self.option.seat_layout.free_seats()))
+    
+    def test_bitset_allocation(self):
+        seat_map = SeatMap(0, 10)
+        seat_map.take([1, 2, 4])
+        self.assertEqual(seat_map.find_block(3), 5)
+        self.assertEqual(seat_map.allocate(2), [5, 6])
+        # No block of seven is left, so the party is spread over the lowest free seats.
+        self.assertEqual(seat_map.allocate(7), [3, 5, 6, 7, 8, 9, 10])
+        self.assertIsNone(seat_map.allocate(8))
+        self.assertIsNone(seat_map.allocate(2, [3, 4]))
+        self.assertEqual(seat_map.allocate(2, [10, 3]), [3, 10])
+        
+        stored = seat_map.to_bytes()
+        self.assertEqual(len(stored), 2)
+        self.assertEqual(SeatMap.from_bytes(stored, 10).bits, seat_map.bits)
+        # Fitting to fewer taken seats frees the highest ones that are not kept.
+        self.assertEqual(SeatMap(seat_map.bits, 10).fit(1, keep={2}).free_seats(), [1] + list(range(3, 11)))
+        self.assertEqual(SeatMap.laid_out(10, 3).free_seats(limit=1), [4])
+    
+    def test_blocks_stay_within_a_row(self):
+        seat_map = SeatMap(0, 12, seats_per_row=4)
+        seat_map.take([1, 2, 6])
+        # Seats 3-5 are adjacent in the bitmap but 5 starts the next row.
+        self.assertEqual(seat_map.find_block(3), 9)
+        self.assertEqual(seat_map.find_block(2), 3)
+        self.assertEqual(SeatMap(seat_map.bits, 12).find_block(3), 3)
+        # Parties wider than a row still get the lowest run.
+        self.assertEqual(seat_map.find_block(6), 7)
+        self.assertEqual(seat_map.allocate(4), [9, 10, 11, 12])
+    
+    def test_repeated_seats_are_rejected(self):
+        with self.assertRaises(ValueError):
+            SeatMap(0, 10).allocate(2, [3, 3])
+        with self.assertRaises(ValueError):
+            reserve_seats(self.user, self.option, 2, seat_numbers=[4, 4])
+        self.option.refresh_from_db()
+        self.assertEqual(self.option.available_seats, 10)
+        
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('book_travel', args=[self.option.travel_id]), {'seat_numbers': ['4', '4']})
+        self.assertContains(response, 'Each seat can only be picked once.')
+    
+    def test_bookings_record_seats_and_cancellations_free_them(self):
+        first = reserve_seats(self.user, self.option, 3)
+        picked = reserve_seats(self.user, self.option, 2, seat_numbers=[9, 10])
+        self.assertEqual((first.seat_numbers, picked.seat_numbers), ([1, 2, 3], [9, 10]))
+        
+        with self.assertRaises(SeatsUnavailable):
+            reserve_seats(self.user, self.option, 1, seat_numbers=[9])
+        # The failed pick left the count alone.
+        self.option.refresh_from_db()
+        self.assertEqual(self.option.available_seats, 5)
+        
+        release_seats(first)
+        self.assertEqual(self.layout(), [9, 10])
+        hold = hold_seats(self.user, self.option, 4)
+        self.assertEqual(hold.seat_numbers, [1, 2, 3, 4])
+        self.assertEqual(confirm_hold(hold).seat_numbers, [1, 2, 3, 4])
+        self.assertEqual(self.layout(), [1, 2, 3, 4, 9, 10])
+    
+    def test_unnumbered_seats_are_laid_out_and_released(self):
+        TravelOption.objects.filter(pk=self.option.pk).update(available_seats=6, seat_map=b'')
+        legacy = Booking.objects.create(user=self.user, travel_option=self.option, number_of_seats=4, total_price=Decimal('40.00'))
+        
+        self.assertEqual(reserve_seats(self.user, self.option, 2).seat_numbers, [5, 6])
+        release_seats(legacy)
+        self.assertEqual(self.layout(), [5, 6])
+        self.assertEqual(self.option.available_seats, 8)
+    
+    def test_seat_selection_view(self):
+        reserve_seats(self.user, self.option, 1)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('book_travel', args=[self.option.travel_id]))
+        self.assertContains(response, 'value="1" id="seat-1" autocomplete="off" onchange="updateSeats()" disabled')
+        
+        response = self.client.post(reverse('book_travel', args=[self.option.travel_id]), {'seats': 1, 'seat_numbers': ['2', '3']})
+        hold = SeatHold.objects.get()
+        self.assertRedirects(response, reverse('checkout', args=[hold.hold_id]))
+        self.assertEqual((hold.number_of_seats, hold.seat_numbers), (2, [2, 3]))
+        self.assertContains(self.client.get(reverse('checkout', args=[hold.hold_id])), 'seats 2, 3')
+        
+        response = self.client.post(reverse('book_travel', args=[self.option.travel_id]), {'seat_numbers': ['3']})
+        self.assertContains(response, 'Some of those seats were just taken')
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        search_cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.dallas = TravelOption.objects.create(
+            type='bus', source='Dallas', destination='Houston',
+            date_time=timezone.now() + timedelta(days=3), price=Decimal('25.99'), available_seats=50
+        )
+        self.detail_url = reverse('travel_detail', kwargs={'travel_id': self.dallas.travel_id})
+        self.search_url = reverse('travel_options') + '?source=dallas'
+    
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+    
+    def test_unchanged_detail_page_is_not_modified(self):
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Last-Modified', response)
+        self.assertIn('no-cache', response['Cache-Control'])
+        
+        not_modified = self.revalidate(self.detail_url, response)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+        
+        last_modified = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(last_modified.status_code, 304)
+    
+    def test_seat_changes_and_edits_touch_the_option(self):
+        response = self.client.get(self.detail_url)
+        reserve_seats(self.user, self.dallas, 2)
+        booked = self.revalidate(self.detail_url, response)
+        self.assertEqual(booked.status_code, 200)
+        self.assertContains(booked, '48 seats available')
+        
+        option = TravelOption.objects.get(pk=self.dallas.pk)
+        option.price = Decimal('19.99')
+        option.save(update_fields=['price'])
+        self.assertEqual(self.revalidate(self.detail_url, booked).status_code, 200)
+    
+    def test_cached_search_page_revalidates_without_querying_options(self):
+        response = self.client.get(self.search_url)
+        self.assertNotIn('Last-Modified', response)
+        far_future = http_date(time.time() + 3600)
+        self.assertEqual(self.client.get(self.search_url, HTTP_IF_MODIFIED_SINCE=far_future).status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            not_modified = self.revalidate(self.search_url, response)
+        
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertFalse(any('booking_traveloption' in q['sql'] for q in queries.captured_queries))
+    
+    def test_search_page_changes_with_its_options(self):
+        response = self.client.get(self.search_url)
+        hold_seats(self.user, self.dallas, 3)
+        self.assertEqual(self.revalidate(self.search_url, response).status_code, 200)
+        
+        response = self.client.get(self.search_url)
+        TravelOption.objects.create(
+            type='train', source='Dallas', destination='Austin',
+            date_time=timezone.now() + timedelta(days=4), price=Decimal('30.00'), available_seats=100
+        )
+        self.assertContains(self.revalidate(self.search_url, response), 'Austin')
+    
+    def test_validators_are_per_user_and_skip_pending_messages(self):
+        anonymous = self.client.get(self.detail_url)
+        self.client.login(username='testuser', password='testpass123')
+        self.assertEqual(self.revalidate(self.detail_url, anonymous).status_code, 200)
+        
+        self.client.post(reverse('profile'), {'first_name': 'Test'})
+        with_message = self.client.get(self.detail_url)
+        self.assertNotIn('ETag', with_message)
+        self.assertContains(with_message, 'Profile updated successfully!')
+
+class StaticAssetsTest(TestCase):
+    def test_trimmed_stylesheets_are_current(self):
+        classes = assets.used_classes()
+        for source, target in assets.BUNDLES.items():
+            trimmed = assets.trim_css((assets.VENDOR_DIR / source).read_text(encoding='utf-8'), classes)
+            self.assertEqual(
+                trimmed, (assets.STATIC_DIR / target).read_text(encoding='utf-8'),
+                f'{target} is stale; run manage.py build_assets',
+            )
+    
+    def test_trim_keeps_only_rules_for_used_classes(self):
+        css = (
+            '/*! banner */@charset "UTF-8";:root{--x:1}.btn,.carousel{a:1}.btn:not(.active){b:2}'
+            '@media (min-width:576px){.carousel{c:3}.btn{d:4}}@media print{.carousel{e:5}}'
+            '@keyframes spin{to{f:6}}@keyframes fade{to{g:7}}.btn-spin{animation:spin 1s}.fade{animation:fade}'
+            '@font-face{font-family:"Used";src:url(a.woff2)}@font-face{font-family:"Unused";src:url(b.woff2)}'
+            '.btn{font-family:"Used"}/*# sourceMappingURL=x.map */'
+        )
+        self.assertEqual(assets.trim_css(css, {'btn', 'btn-spin'}), (
+            '/*! banner */\n@charset "UTF-8";:root{--x:1}.btn{a:1}.btn:not(.active){b:2}'
+            '@media (min-width:576px){.btn{d:4}}@keyframes spin{to{f:6}}.btn-spin{animation:spin 1s}'
+            '@font-face{font-family:"Used";src:url(a.woff2)}.btn{font-family:"Used"}\n'
+        ))
+    
+    def test_pages_link_self_hosted_assets(self):
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, '/static/booking/vendor/bootstrap/bootstrap.min.css')
+        self.assertNotContains(response, 'cdn.jsdelivr.net')
+        self.assertNotContains(response, 'cdnjs.cloudflare.com')
+    
+    def test_collected_assets_are_hashed_compressed_and_cached(self):
+        with tempfile.TemporaryDirectory() as root, override_settings(STATIC_ROOT=root):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            page = self.client.get(reverse('home')).content.decode()
+            url = next(part for part in page.split('"') if 'vendor/bootstrap/bootstrap.min.' in part and part.endswith('.css'))
+            self.assertRegex(url, r'bootstrap\.min\.[0-9a-f]{12}\.css$')
+            
+            compressed = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+            self.assertEqual(compressed['Content-Encoding'], 'gzip')
+            self.assertEqual(compressed['Content-Type'], 'text/css')
+            self.assertIn('immutable', compressed['Cache-Control'])
+            self.assertIn('Accept-Encoding', compressed['Vary'])
+            plain = self.client.get(url)
+            self.assertNotIn('Content-Encoding', plain)
+            self.assertEqual(gzip.decompress(compressed.content), plain.content)
+            
+            unhashed = self.client.get('/static/booking/vendor/bootstrap/bootstrap.min.css')
+            self.assertEqual(unhashed['Cache-Control'], 'public, no-cache')
+            self.assertEqual(self.client.get('/static/../manage.py').status_code, 404)
+
+class ProfilingTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.staff = User.objects.create_superuser(username='ops', password='testpass123', email='ops@example.com')
+        self.option = TravelOption.objects.create(
+            type='bus', source='Dallas', destination='Houston',
+            date_time=timezone.now() + timedelta(days=3), price=Decimal('25.99'), available_seats=50
+        )
+        reserve_seats(self.user, self.option, 2)
+    
+    def test_requests_are_not_profiled_by_default(self):
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.get(reverse('my_bookings') + '?_profile=1')
+        self.assertNotIn('X-Profile-Id', response)
+        response = self.client.get(reverse('my_bookings'), HTTP_X_PROFILE='forged:token')
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertFalse(RequestProfile.objects.exists())
+    
+    def test_signed_header_profiles_view_and_queries(self):
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.get(reverse('my_bookings'), HTTP_X_PROFILE=make_token())
+        
+        profile = RequestProfile.objects.get(profile_id=response['X-Profile-Id'])
+        self.assertEqual((profile.view_name, profile.status_code, profile.user), ('my_bookings', 200, self.user))
+        self.assertEqual(profile.db_queries, len(profile.queries))
+        self.assertTrue(any('booking_booking' in query['sql'] for query in profile.queries))
+        self.assertTrue(all(query['caller'].startswith('booking' + os.sep) for query in profile.queries))
+        self.assertIn('my_bookings', summary(profile.stats))
+    
+    @override_settings(PROFILING_TOKEN_MAX_AGE=-1)
+    def test_expired_token_is_ignored(self):
+        response = self.client.get(reverse('home'), HTTP_X_PROFILE=make_token())
+        self.assertNotIn('X-Profile-Id', response)
+    
+    async def test_staff_can_profile_async_views(self):
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get(reverse('travel_options') + '?source=dallas&_profile=1')
+        
+        profile = await RequestProfile.objects.aget(profile_id=response['X-Profile-Id'])
+        self.assertEqual(profile.view_name, 'travel_options')
+        self.assertTrue(any('booking_traveloption' in query['sql'] for query in profile.queries))
+    
+    def test_busy_or_unavailable_profiler_serves_unprofiled(self):
+        self.client.login(username='testuser', password='testpass123')
+        with profiler_lock:
+            response = self.client.get(reverse('my_bookings'), HTTP_X_PROFILE=make_token())
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        
+        with mock.patch('cProfile.Profile.enable', side_effect=ValueError('Another profiling tool is already active')):
+            response = self.client.get(reverse('my_bookings'), HTTP_X_PROFILE=make_token())
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertFalse(RequestProfile.objects.exists())
+        # The lock was handed back, so the next request is profiled again.
+        self.assertIn('X-Profile-Id', self.client.get(reverse('my_bookings'), HTTP_X_PROFILE=make_token()))
+    
+    def test_admin_downloads_stats_and_query_log(self):
+        self.client.login(username='testuser', password='testpass123')
+        profile_id = self.client.get(reverse('my_bookings'), HTTP_X_PROFILE=make_token())['X-Profile-Id']
+        
+        self.client.login(username='ops', password='testpass123')
+        stats = self.client.get(reverse('admin:booking_requestprofile_stats', args=[profile_id]))
+        self.assertIn('.pstats', stats['Content-Disposition'])
+        with tempfile.NamedTemporaryFile(suffix='.pstats') as dump:
+            dump.write(stats.content)
+            dump.flush()
+            self.assertTrue(pstats.Stats(dump.name).total_calls)
+        
+        queries = self.client.get(reverse('admin:booking_requestprofile_queries', args=[profile_id]))
+        self.assertEqual(len(queries.json()), RequestProfile.objects.get(profile_id=profile_id).db_queries)
+        
+        page = self.client.get(reverse('admin:booking_requestprofile_change', args=[profile_id]))
+        self.assertContains(page, 'Top functions')
+        self.assertContains(page, 'booking_booking')
+
+class BenchmarkServersCommandTest(TransactionTestCase):
+    def test_compares_wsgi_and_asgi(self):
+        call_command('load_schedules', '--generate', '20', stdout=StringIO())
+        out = StringIO()
+        call_command(
+            'benchmark_servers', '--use-existing-db', '--connections', '4', '--requests', '2',
+            '--client-latency', '0', '--wsgi-threads', '2', '--json', '-', stdout=out
+        )
+        output = out.getvalue()
+        results = json.loads(output[output.index('{'):])
+        
+        self.assertEqual(set(results), {'wsgi', 'asgi'})
+        for stats in results.values():
+            self.assertEqual(stats['requests'], 8)
+            self.assertEqual(stats['errors'], 0)
+
+class InstrumentationTest(TestCase):
+    def setUp(self):
+        registry.reset()
+        TravelOption.objects.create(
+            type='bus', source='Dallas', destination='Houston',
+            date_time=timezone.now() + timedelta(days=4), price=Decimal('25.99'), available_seats=50
+        )
+    
+    def test_server_timing_header(self):
+        search_cache.clear()
+        response = self.client.get(reverse('travel_options'))
+        timing = dict(
+            (part.split(';')[0], part) for part in response['Server-Timing'].split(', ')
+        )
+        
+        self.assertEqual(set(timing), {'db', 'tpl', 'view', 'total'})
+        self.assertRegex(timing['db'], r'desc="[1-9]\d* queries";dur=\d+\.\d+')
+        self.assertRegex(timing['tpl'], r'dur=\d+\.\d+')
+    
+    @override_settings(METRICS_ALLOWED_IPS=['127.0.0.1'])
+    def test_metrics_endpoint_exposes_per_view_histograms(self):
+        self.client.get(reverse('travel_options'))
+        self.client.get(reverse('travel_options'))
+        self.client.get(reverse('home'))
+        
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='127.0.0.1')
+        body = response.content.decode()
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn('# TYPE travellykke_request_duration_seconds histogram', body)
+        self.assertIn('travellykke_request_duration_seconds_count{view="travel_options"} 2', body)
+        self.assertIn('travellykke_db_queries_bucket{view="home",le="+Inf"} 1', body)
+        self.assertIn('travellykke_search_cache_lookups_total{result="hit"}', body)
+    
+    def test_metrics_endpoint_rejects_unknown_clients(self):
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='203.0.113.9')
+        self.assertEqual(response.status_code, 403)
+        # Loopback is not trusted by default, since proxied requests come from it.
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='127.0.0.1').status_code, 403)
@@ -10,8 +10,17 @@ urlpatterns = [
     path('logout/', views.logout_view, name='logout'),
     path('profile/', views.profile, name='profile'),
     path('travel-options/', views.travel_options, name='travel_options'),
+    path('travel-options/connections/', views.connections, name='connections'),
+    path('travel-options/cache-stats/', views.search_cache_stats, name='search_cache_stats'),
+    path('api/travel-options/', views.api_travel_options, name='api_travel_options'),
+    path('api/cities/', views.city_suggestions, name='city_suggestions'),
+    path('api/price-calendar/', views.api_price_calendar, name='api_price_calendar'),
     path('travel/<int:travel_id>/', views.travel_detail, name='travel_detail'),
     path('book/<int:travel_id>/', views.book_travel, name='book_travel'),
+    path('checkout/<int:hold_id>/', views.checkout, name='checkout'),
+    path('waitlist/', views.my_waitlist, name='my_waitlist'),
+    path('waitlist/join/<int:travel_id>/', views.join_waitlist_view, name='join_waitlist'),
+    path('waitlist/leave/<int:entry_id>/', views.leave_waitlist_view, name='leave_waitlist'),
     path('my-bookings/', views.my_bookings, name='my_bookings'),
     path('cancel-booking/<int:booking_id>/', views.cancel_booking, name='cancel_booking'),
 ]
@@ -1,13 +1,41 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.contrib.auth import logout
+from asgiref.sync import sync_to_async
 from django.utils import timezone
-from .models import TravelOption, Booking
+from .models import TravelOption, Booking, SeatHold, ArchivedBooking, WaitlistEntry
 from .forms import CustomUserCreationForm
+from .autocomplete import city_index
+from .routes import parse_connection_query, route_graph
+from .price_calendar import price_calendar
+from .api import MAX_PAGE_SIZE, InvalidFields, SearchResultStream, parse_fields
+from .pagination import InvalidCursor, KeysetPaginator, afetch_page, get_page_size, page_links, paginate_request
+from .search_cache import search_cache
+from .conditional import PageValidators
+from .instrumentation import registry
+from .search import parse_search_filters, search_travel_options
+from .seatmap import SEATS_PER_ROW
+from .reservations import (
+    hold_seats, confirm_hold, release_hold, release_seats, join_waitlist, leave_waitlist,
+    SeatsUnavailable, BookingNotCancellable, HoldExpired,
+)
 
-def home(request):
-    return render(request, 'booking/home.html')
+async def arender(request, template_name, context=None):
+    """``render`` for async views.
+
+    Resolving the user loads the session as well, so neither the auth nor the
+    messages context processor issues a blocking query while rendering.
+    """
+    request.user = await request.auser()
+    return render(request, template_name, context)
+
+async def home(request):
+    return await arender(request, 'booking/home.html')
 
 def register(request):
     if request.method == 'POST':
@@ -20,74 +48,237 @@ def register(request):
         form = CustomUserCreationForm()
     return render(request, 'booking/register.html', {'form': form})
 
-def travel_options(request):
-    options = TravelOption.objects.all()
-    
-    travel_type = request.GET.get('type')
-    if travel_type:
-        options = options.filter(type=travel_type)
-    
-    source = request.GET.get('source')
-    if source:
-        options = options.filter(source__icontains=source)
-    
-    destination = request.GET.get('destination')
-    if destination:
-        options = options.filter(destination__icontains=destination)
+async def travel_options(request):
+    filters = parse_search_filters(request.GET)
+    page_size = get_page_size(request, 'TRAVEL_OPTIONS_PAGE_SIZE')
+    paginator = KeysetPaginator(
+        search_travel_options(filters),
+        ordering=filters.ordering,
+        page_size=page_size,
+    )
+    page_args = (request.GET.get('after'), request.GET.get('before'), page_size)
+    options = await search_cache.aget_or_fetch(filters, page_args, lambda: afetch_page(request, paginator))
+    next_query, previous_query = page_links(request, options)
+    # Validated by the rows on the page, so a cached page answers without touching the table.
+    # No Last-Modified: a row dropping off the page can move the newest timestamp back.
+    request.user = await request.auser()
+    validators = PageValidators(
+        request,
+        None,
+        [(option.travel_id, option.updated_at) for option in options], next_query, previous_query,
+    )
+    not_modified = validators.not_modified(request)
+    if not_modified is not None:
+        return not_modified
+    return validators.apply(await arender(request, 'booking/travel_options.html', {
+        'options': options,
+        'next_query': next_query,
+        'previous_query': previous_query,
+    }))
+
+def api_travel_options(request):
+    filters = parse_search_filters(request.GET)
+    try:
+        fields = parse_fields(request.GET.get('fields'))
+    except InvalidFields as exc:
+        return JsonResponse({'error': f'Unknown fields: {exc}'}, status=400)
     
-    date = request.GET.get('date')
-    if date:
-        options = options.filter(date_time__date=date)
+    # Ordering keys ride along in every row so the next cursor can be built.
+    columns = dict.fromkeys(fields + [name.lstrip('-') for name in filters.ordering])
+    paginator = KeysetPaginator(
+        search_travel_options(filters).values(*columns),
+        ordering=filters.ordering,
+        page_size=get_page_size(request, 'API_PAGE_SIZE', default=1000, maximum=MAX_PAGE_SIZE),
+    )
+    after = request.GET.get('after')
+    if after:
+        try:
+            paginator.decode_cursor(after)
+        except InvalidCursor:
+            return JsonResponse({'error': 'Invalid cursor'}, status=400)
     
-    return render(request, 'booking/travel_options.html', {'options': options})
+    results = SearchResultStream(paginator, fields, after=after, limit=paginator.page_size)
+    # Hand ASGI an async iterator; Django would otherwise buffer a sync one.
+    content = results.__aiter__() if isinstance(request, ASGIRequest) else iter(results)
+    return StreamingHttpResponse(content, content_type='application/json')
+
+async def connections(request):
+    query = parse_connection_query(request.GET)
+    itineraries = None
+    if query.complete:
+        if not route_graph.ready:
+            await sync_to_async(route_graph.rebuild)()
+        itineraries = route_graph.search(query)
+    return await arender(request, 'booking/connections.html', {
+        'query': query,
+        'itineraries': itineraries,
+    })
+
+async def city_suggestions(request):
+    if not city_index.ready:
+        # Cold start only; afterwards lookups are served from memory.
+        await sync_to_async(city_index.rebuild)()
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 10)), 25))
+    except ValueError:
+        limit = 10
+    return JsonResponse({'results': city_index.suggest(request.GET.get('q', ''), limit)})
+
+async def api_price_calendar(request):
+    source = request.GET.get('source', '').strip()
+    destination = request.GET.get('destination', '').strip()
+    travel_type = request.GET.get('type', '').strip().lower() or None
+    if not source or not destination:
+        return JsonResponse({'error': 'source and destination are required'}, status=400)
+    if travel_type and travel_type not in dict(TravelOption.TRAVEL_TYPES):
+        return JsonResponse({'error': f'Unknown type: {travel_type}'}, status=400)
+    try:
+        days = max(1, min(int(request.GET.get('days', settings.PRICE_CALENDAR_DAYS)), 366))
+    except ValueError:
+        days = settings.PRICE_CALENDAR_DAYS
+    calendar = await price_calendar.adays(source, destination, travel_type, days=days)
+    return JsonResponse({'source': source, 'destination': destination, 'type': travel_type, 'days': calendar})
 
 @login_required
 def book_travel(request, travel_id):
     travel_option = get_object_or_404(TravelOption, travel_id=travel_id)
     
     if request.method == 'POST':
-        seats = int(request.POST.get('seats', 1))
+        try:
+            seat_numbers = [int(seat) for seat in request.POST.getlist('seat_numbers')]
+            # Picked seats decide the party size.
+            seats = len(seat_numbers) or int(request.POST.get('seats', 1))
+        except (TypeError, ValueError):
+            seat_numbers, seats = [], 0
         
-        if seats <= travel_option.available_seats:
-            total_price = travel_option.price * seats
-            
-            booking = Booking.objects.create(
-                user=request.user,
-                travel_option=travel_option,
-                number_of_seats=seats,
-                total_price=total_price
-            )
-            
-            travel_option.available_seats -= seats
-            travel_option.save()
-            
-            messages.success(request, f'Booking confirmed! Booking ID: {booking.booking_id}')
-            return redirect('my_bookings')
+        if seats < 1:
+            messages.error(request, 'Please choose at least one seat.')
         else:
-            messages.error(request, 'Not enough seats available!')
+            try:
+                hold = hold_seats(request.user, travel_option, seats, seat_numbers=seat_numbers)
+            except ValueError:
+                messages.error(request, 'Each seat can only be picked once.')
+            except SeatsUnavailable:
+                travel_option.refresh_from_db(fields=['available_seats', 'seat_map'])
+                if seat_numbers and travel_option.available_seats >= seats:
+                    messages.error(request, 'Some of those seats were just taken. Please pick again.')
+                else:
+                    messages.error(request, 'Not enough seats available! You can join the waitlist instead.')
+            else:
+                return redirect('checkout', hold_id=hold.hold_id)
     
-    return render(request, 'booking/book_travel.html', {'travel_option': travel_option})
+    return render(request, 'booking/book_travel.html', {
+        'travel_option': travel_option,
+        'seat_rows': travel_option.seat_layout.rows(SEATS_PER_ROW.get(travel_option.type, 4)),
+    })
+
+@login_required
+def join_waitlist_view(request, travel_id):
+    travel_option = get_object_or_404(TravelOption, travel_id=travel_id)
+    if request.method != 'POST':
+        return redirect('book_travel', travel_id=travel_id)
+    try:
+        seats = int(request.POST.get('seats', 1))
+    except (TypeError, ValueError):
+        seats = 0
+    if seats < 1:
+        messages.error(request, 'Please choose at least one seat.')
+        return redirect('book_travel', travel_id=travel_id)
+    
+    try:
+        entry = join_waitlist(request.user, travel_option, seats)
+    except ValueError:
+        messages.error(request, f'This trip only has {travel_option.capacity} seats.')
+        return redirect('book_travel', travel_id=travel_id)
+    if entry.status == 'promoted':
+        return redirect('checkout', hold_id=entry.hold_id)
+    messages.success(request, "You're on the waitlist. We'll email you as soon as seats free up.")
+    return redirect('my_waitlist')
+
+@login_required
+def leave_waitlist_view(request, entry_id):
+    entry = get_object_or_404(WaitlistEntry, entry_id=entry_id, user=request.user)
+    if request.method == 'POST':
+        if leave_waitlist(entry):
+            messages.success(request, 'You have left the waitlist.')
+        else:
+            messages.error(request, 'This waitlist entry is no longer waiting.')
+    return redirect('my_waitlist')
+
+@login_required
+def my_waitlist(request):
+    entries = (
+        WaitlistEntry.objects.filter(user=request.user, status__in=['waiting', 'promoted'])
+        .select_related('travel_option', 'hold')
+        .order_by('-created_at', '-entry_id')[:50]
+    )
+    return render(request, 'booking/waitlist.html', {'entries': entries})
+
+@login_required
+def checkout(request, hold_id):
+    hold = get_object_or_404(SeatHold.objects.select_related('travel_option'), hold_id=hold_id, user=request.user)
+    
+    if request.method == 'POST':
+        if request.POST.get('action') == 'release':
+            release_hold(hold)
+            messages.success(request, 'Your held seats have been released.')
+            return redirect('travel_detail', travel_id=hold.travel_option_id)
+        try:
+            booking = confirm_hold(hold)
+        except HoldExpired:
+            release_hold(hold)
+            messages.error(request, 'Your seat hold expired. Please book again.')
+            return redirect('book_travel', travel_id=hold.travel_option_id)
+        messages.success(request, f'Booking confirmed! Booking ID: {booking.booking_id}')
+        return redirect('my_bookings')
+    
+    return render(request, 'booking/checkout.html', {'hold': hold, 'travel_option': hold.travel_option})
 
 @login_required
 def my_bookings(request):
-    bookings = Booking.objects.filter(user=request.user).order_by('-booking_date')
-    return render(request, 'booking/my_bookings.html', {'bookings': bookings})
+    # Past trips live in the archive and are only read when asked for.
+    archived = request.GET.get('archived') == '1'
+    model = ArchivedBooking if archived else Booking
+    paginator = KeysetPaginator(
+        model.objects.filter(user=request.user).select_related('travel_option'),
+        ordering=['-booking_date', '-booking_id'],
+        page_size=get_page_size(request, 'MY_BOOKINGS_PAGE_SIZE'),
+    )
+    bookings, next_query, previous_query = paginate_request(request, paginator)
+    return render(request, 'booking/my_bookings.html', {
+        'bookings': bookings,
+        'archived': archived,
+        'next_query': next_query,
+        'previous_query': previous_query,
+    })
+
+@staff_member_required
+def search_cache_stats(request):
+    return JsonResponse(search_cache.stats())
+
+def metrics(request):
+    allowed = request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+    if not (allowed or request.user.is_staff):
+        return HttpResponseForbidden()
+    cache_stats = search_cache.stats()
+    extra = [
+        '# HELP travellykke_search_cache_lookups_total Search result cache lookups.',
+        '# TYPE travellykke_search_cache_lookups_total counter',
+        f'travellykke_search_cache_lookups_total{{result="hit"}} {cache_stats["hits"]}',
+        f'travellykke_search_cache_lookups_total{{result="miss"}} {cache_stats["misses"]}',
+    ]
+    return HttpResponse(registry.render(extra), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 @login_required
 def cancel_booking(request, booking_id):
     booking = get_object_or_404(Booking, booking_id=booking_id, user=request.user)
     
-    if booking.status == 'confirmed':
-        booking.status = 'cancelled'
-        booking.save()
-        
-        travel_option = booking.travel_option
-        travel_option.available_seats += booking.number_of_seats
-        travel_option.save()
-        
-        messages.success(request, 'Booking cancelled successfully!')
-    else:
+    try:
+        release_seats(booking)
+    except BookingNotCancellable:
         messages.error(request, 'This booking is already cancelled!')
+    else:
+        messages.success(request, 'Booking cancelled successfully!')
     
     return redirect('my_bookings')
 
@@ -96,9 +287,14 @@ def logout_view(request):
     messages.success(request, 'You have been logged out successfully.')
     return redirect('home')
 
-def travel_detail(request, travel_id):
-    travel_option = get_object_or_404(TravelOption, travel_id=travel_id)
-    return render(request, 'booking/travel_detail.html', {'travel_option': travel_option})
+async def travel_detail(request, travel_id):
+    travel_option = await aget_object_or_404(TravelOption, travel_id=travel_id)
+    request.user = await request.auser()
+    validators = PageValidators(request, travel_option.updated_at)
+    not_modified = validators.not_modified(request)
+    if not_modified is not None:
+        return not_modified
+    return validators.apply(await arender(request, 'booking/travel_detail.html', {'travel_option': travel_option}))
 
 @login_required
 def profile(request):
@@ -45,6 +45,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Answers asset requests before the rest of the stack, timing included.
+    "booking.staticfiles.StaticFilesMiddleware",
+    "booking.instrumentation.PerformanceMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -52,13 +55,15 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "booking.profiling.ProfilingMiddleware",
+    "booking.instrumentation.ViewTimingMiddleware",
 ]
 
 ROOT_URLCONF = "travellykke.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "booking.instrumentation.TimedDjangoTemplates",
         "DIRS": [],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -126,11 +131,75 @@ USE_TZ = True
 STATIC_URL = "static/"
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
+# collectstatic writes content-hashed names plus gzip (and, with ``brotli``
+# installed, brotli) copies; StaticFilesMiddleware serves them for a year.
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "booking.staticfiles.CompressedManifestStaticFilesStorage"},
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Keyset pagination page sizes for the travel options page, booking history and JSON API
+TRAVEL_OPTIONS_PAGE_SIZE = int(os.getenv('TRAVEL_OPTIONS_PAGE_SIZE', '20'))
+MY_BOOKINGS_PAGE_SIZE = int(os.getenv('MY_BOOKINGS_PAGE_SIZE', '25'))
+API_PAGE_SIZE = int(os.getenv('API_PAGE_SIZE', '1000'))
+
+# Caches: "search" holds travel option result pages (LRU bounded by MAX_ENTRIES)
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "search": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "travel-search",
+        "TIMEOUT": int(os.getenv('SEARCH_CACHE_TTL', '60')),
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', '5000')),
+            "CULL_FREQUENCY": 10,
+        },
+    },
+}
+
+# Seconds before the in-process city autocomplete index is rebuilt in the background
+AUTOCOMPLETE_REFRESH_SECONDS = int(os.getenv('AUTOCOMPLETE_REFRESH_SECONDS', '300'))
+
+# In-process connection graph: background rebuild interval and how far ahead it looks
+ROUTE_GRAPH_REFRESH_SECONDS = int(os.getenv('ROUTE_GRAPH_REFRESH_SECONDS', '600'))
+ROUTE_GRAPH_HORIZON_DAYS = int(os.getenv('ROUTE_GRAPH_HORIZON_DAYS', '120'))
+
+# Days the price calendar API returns unless asked for fewer (or more, up to a year)
+PRICE_CALENDAR_DAYS = int(os.getenv('PRICE_CALENDAR_DAYS', '60'))
+
+# Seconds a checkout may hold seats before release_expired_holds returns them
+SEAT_HOLD_TTL = int(os.getenv('SEAT_HOLD_TTL', '600'))
+
+# Seconds a waitlisted user has to confirm the seats a cancellation freed for them
+WAITLIST_HOLD_TTL = int(os.getenv('WAITLIST_HOLD_TTL', '3600'))
+
+# Outgoing mail (waitlist notifications); printed to the console unless configured
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'Travel Lykke <noreply@travellykke.local>')
+# Absolute base URL used for links in emails
+SITE_URL = os.getenv('SITE_URL', 'http://localhost:8000')
+
+# Booking side effects queued in the outbox and run by ``process_outbox``
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '8'))
+# Seconds before the first retry of a failed event; doubles on every further failure
+OUTBOX_RETRY_DELAY = int(os.getenv('OUTBOX_RETRY_DELAY', '30'))
+# Seconds a worker may hold events before another worker can pick them up
+OUTBOX_LEASE_SECONDS = int(os.getenv('OUTBOX_LEASE_SECONDS', '300'))
+
+# Comma separated client addresses allowed to scrape /metrics (staff users always may).
+# Empty by default: behind a reverse proxy every request arrives from loopback.
+METRICS_ALLOWED_IPS = [ip for ip in os.getenv('METRICS_ALLOWED_IPS', '').split(',') if ip]
+
+# Seconds an ``X-Profile`` header from ``manage.py profile_token`` stays valid
+PROFILING_TOKEN_MAX_AGE = int(os.getenv('PROFILING_TOKEN_MAX_AGE', '3600'))
+
 # Login/Logout redirects
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/'
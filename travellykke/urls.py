@@ -18,8 +18,10 @@ Including another URLconf
 
 from django.contrib import admin
 from django.urls import path, include
+from booking import views as booking_views
 
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("metrics", booking_views.metrics, name="metrics"),
     path('', include('booking.urls')),
 ]